@@ -0,0 +1,134 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Optional, Union
+
+from nexa.constants import NEXA_MODELS_HUB_BLOBS_DIR, NEXA_MODELS_HUB_DIR
+from nexa.model_registry import file_lock
+
+
+def file_sha256(path: Union[str, Path], block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _link(blob: Path, dest: Path):
+    """Point `dest` at `blob` with a hardlink, or a symlink where hardlinks are unsupported."""
+    tmp = dest.with_name(dest.name + ".link")
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(blob, tmp)
+    except OSError:
+        os.symlink(blob, tmp)
+    os.replace(tmp, dest)
+
+
+class BlobStore:
+    """Content-addressed storage for model files.
+
+    Every file is stored once as `<root>/sha256-<hex>`; the paths models are
+    registered under (per hub, repo and tag) are hardlinks to it, or symlinks
+    on filesystems without hardlinks. The same GGUF pulled from the Nexa hub,
+    Hugging Face and ModelScope therefore takes its size on disk once, and a
+    pull whose hash is known up front is just a new link.
+
+    A blob is garbage once nothing links to it: its hardlink count is 1 and
+    no symlink below `models_root` resolves to it.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path] = NEXA_MODELS_HUB_BLOBS_DIR,
+        models_root: Union[str, Path] = NEXA_MODELS_HUB_DIR,
+    ):
+        self.root = Path(root)
+        self.models_root = Path(models_root)
+        self.lock_path = self.root / ".lock"
+
+    def path_for(self, sha256: str) -> Path:
+        return self.root / f"sha256-{sha256}"
+
+    def has(self, sha256: Optional[str]) -> bool:
+        return bool(sha256) and self.path_for(sha256).exists()
+
+    def link(self, sha256: str, dest: Union[str, Path]) -> bool:
+        """Make `dest` a link to the blob `sha256` if it is stored; return whether it was."""
+        dest = Path(dest)
+        with file_lock(self.lock_path):
+            blob = self.path_for(sha256)
+            if not blob.exists():
+                return False
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            _link(blob, dest)
+        return True
+
+    def ingest(self, path: Union[str, Path], sha256: Optional[str] = None) -> Path:
+        """Move the file at `path` into the store and leave a link in its place.
+
+        If the same content is already stored, `path` is replaced by a link to
+        the existing blob and its own copy is freed. `sha256` skips hashing
+        the file when the caller already knows it.
+        """
+        path = Path(path)
+        if path.is_symlink():
+            return path.resolve()
+        if sha256 is None:
+            sha256 = file_sha256(path)
+        self.root.mkdir(parents=True, exist_ok=True)
+        with file_lock(self.lock_path):
+            blob = self.path_for(sha256)
+            if blob.exists():
+                if not os.path.samefile(blob, path):
+                    _link(blob, path)
+                return blob
+            try:
+                os.link(path, blob)
+            except OSError:
+                # No hardlinks here, keep the content in the store and
+                # symlink it back, or leave the file alone if that fails too
+                shutil.move(str(path), str(blob))
+                try:
+                    os.symlink(blob, path)
+                except OSError:
+                    shutil.move(str(blob), str(path))
+                    raise
+            return blob
+
+    def gc(self) -> int:
+        """Delete blobs nothing links to any more; return the number of bytes freed."""
+        if not self.root.exists():
+            return 0
+        freed = 0
+        with file_lock(self.lock_path):
+            symlinked = set()
+            for dirpath, dirnames, filenames in os.walk(self.models_root):
+                if Path(dirpath) == self.root:
+                    dirnames[:] = []
+                    continue
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    if os.path.islink(path):
+                        symlinked.add(os.path.realpath(path))
+            for blob in self.root.iterdir():
+                if not re.fullmatch(r"sha256-[0-9a-f]{64}", blob.name):
+                    continue
+                stat = blob.stat()
+                if stat.st_nlink > 1 or os.path.realpath(blob) in symlinked:
+                    continue
+                blob.unlink()
+                freed += stat.st_size
+                logging.info(f"Removed unreferenced blob {blob.name}")
+        return freed
+
+
+blob_store = BlobStore()
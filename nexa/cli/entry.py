@@ -262,7 +262,7 @@ def run_eval_tasks(args):
         model_path = kwargs.pop("model_path")
         
         from nexa.eval.nexa_eval import NexaEval
-        evaluator = NexaEval(model_path, args.tasks, args.limit, args.nctx, args.num_workers)
+        evaluator = NexaEval(model_path, args.tasks, args.limit, args.nctx, args.num_workers, not args.no_cache)
         if not args.tasks:
             evaluator.run_perf_eval(args.device, args.new_tokens)
         else:
@@ -575,6 +575,10 @@ def main():
     server_parser.add_argument("--port", type=int, default=8000, help="Port to bind the server to")
     server_parser.add_argument("--reload", action="store_true", help="Enable automatic reloading on code changes")
     server_parser.add_argument("--nctx", type=int, default=2048, help="Maximum context length of the model you're using")
+    server_parser.add_argument("--n_parallel", type=int, default=1, help="Number of text generation requests decoded together; the context window is split across them")
+    server_parser.add_argument("--max_model_memory", type=float, default=None, help="Memory budget in GiB for resident models; least recently used models are unloaded beyond it (default: half of the system memory)")
+    server_parser.add_argument("--max_queue", type=int, default=32, help="Requests per loaded model allowed to wait for a worker before the server answers 429")
+    server_parser.add_argument("--audio_batch_size", type=int, default=0, help="Batch speech windows of concurrent /v1/audio/processing requests through faster-whisper's batched pipeline (0 disables)")
 
     # Other commands
     pull_parser = subparsers.add_parser("pull", help="Pull a model from official or hub.")
@@ -602,6 +606,7 @@ def main():
     general_eval_group.add_argument("--limit", type=float, help="Limit the number of examples per task. If <1, limit is a percentage of the total number of examples.", default=None)
     general_eval_group.add_argument("--num_workers", type=int, help="Number of workers to use for evaluation", default=1)
     general_eval_group.add_argument("--nctx", type=int, help="Length of context window", default=4096)
+    general_eval_group.add_argument("--no_cache", action="store_true", help="Recompute every request instead of reusing cached responses")
 
     # Performance evaluation options
     perf_eval_group = eval_parser.add_argument_group('Performance evaluation options')
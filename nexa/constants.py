@@ -11,6 +11,8 @@ NEXA_MODELS_HUB_OFFICIAL_DIR = NEXA_MODELS_HUB_DIR / "official"
 NEXA_MODELS_HUB_HF_DIR = NEXA_MODELS_HUB_DIR / "huggingface"
 NEXA_MODELS_HUB_MS_DIR = NEXA_MODELS_HUB_DIR / "modelscope"
 NEXA_MODEL_LIST_PATH = NEXA_MODELS_HUB_DIR / "model_list.json"
+NEXA_MODELS_HUB_BLOBS_DIR = NEXA_MODELS_HUB_DIR / "blobs"
+NEXA_SIGLIP_INDEX_DIR = NEXA_CACHE_ROOT / "siglip"
 
 # URLs and buckets
 NEXA_API_URL = "https://model-hub-backend.nexa4ai.com"
@@ -6,20 +6,26 @@ from collections import defaultdict
 from typing import TYPE_CHECKING, List, Optional, Union
 import multiprocessing
 import queue
+import threading
+import traceback
 import numpy as np
 from tqdm import tqdm
 
 from nexa import __version__
+from nexa.constants import NEXA_MODEL_EVAL_RESULTS_PATH
+from nexa.general import pull_model
 import nexa.eval.nexa_task.metrics
 import nexa.eval.nexa_task.registry
 from nexa.eval.nexa_task.task import Task
 from nexa.eval.nexa_models import GGUFLM
+from nexa.eval.response_cache import ResponseCache
 from nexa.eval.evaluator_utils import (
     consolidate_group_results,
     consolidate_results,
     get_sample_size,
     get_subtask_list,
     get_task_list,
+    plan_requests,
     prepare_print_tasks,
 )
 from nexa.eval.nexa_task.task_manager import (
@@ -35,8 +41,17 @@ from nexa.eval.utils import (
 if TYPE_CHECKING:
     from nexa.eval.nexa_task.task import Task
 
+class WorkerFailure:
+    """Sent by a worker in place of a chunk's responses when the chunk failed."""
+
+    def __init__(self, reqtype: str, error: BaseException):
+        self.reqtype = reqtype
+        self.message = f"{type(error).__name__}: {error}"
+        self.traceback = traceback.format_exc()
+
+
 # Define the worker function at the global scope
-def worker(task_queue, result_queue, stop_event, model_path):
+def worker(task_queue, result_queue, stop_event, model_path, n_threads=None, ready=None):
     # Disable tqdm in worker processes
     import sys
     import os
@@ -46,25 +61,39 @@ def worker(task_queue, result_queue, stop_event, model_path):
     sys.stdout = open(os.devnull, 'w')
     sys.stderr = open(os.devnull, 'w')
 
-    # Initialize the model in each process
-    lm_worker = GGUFLM(model_path)
+    # Initialize the model in each process. The weights are mmapped
+    # read-only, so all workers share the same pages of the model file.
+    try:
+        lm_worker = GGUFLM(model_path, n_threads=n_threads, n_threads_batch=n_threads)
+    except BaseException:
+        if ready is not None:
+            ready.abort()
+        raise
+    if ready is not None:
+        # Wait until every worker has loaded the model
+        ready.wait()
     while not stop_event.is_set():
         try:
             item = task_queue.get(timeout=0.1)
             if item is None:
                 task_queue.task_done()
                 break  # Received sentinel value, exit loop
-            idx, req = item
-            # Process the request
-            reqtype = req.request_type
-            resps = getattr(lm_worker, reqtype)([req])
-            # Put the response in the result queue
-            result_queue.put((idx, resps[0]))
+            reqtype, chunk = item
+            idxs = [idx for idx, _ in chunk]
+            try:
+                # Process the whole chunk in one call
+                resps = getattr(lm_worker, reqtype)([req for _, req in chunk])
+            except Exception as e:
+                eval_logger.error(f"{reqtype} failed on a chunk of {len(chunk)} requests", exc_info=True)
+                # Let the parent fail the run with the real error
+                result_queue.put(WorkerFailure(reqtype, e))
+                task_queue.task_done()
+                continue
+            # Put the responses in the result queue
+            result_queue.put(list(zip(idxs, resps)))
             task_queue.task_done()
         except queue.Empty:
             continue
-        except Exception as e:
-            task_queue.task_done()
 
 def nexa_evaluate(
     model_path,
@@ -78,6 +107,8 @@ def nexa_evaluate(
     numpy_random_seed: int = 1234,
     fewshot_random_seed: int = 1234,
     num_workers: int = 1,
+    use_cache: bool = True,
+    cache_path: Optional[str] = None,
 ):
     eval_logger.setLevel(getattr(logging, f"{verbosity}"))
     start_date = time.time()
@@ -137,20 +168,61 @@ def nexa_evaluate(
         idx_to_req[idx] = req
         indexed_requests.append((idx, req))
 
+    # Answer what we can from the response cache
+    resps_by_idx = {}
+    response_cache = None
+    cache_keys = {}
+    pending_requests = indexed_requests
+    if use_cache:
+        model_file, _ = pull_model(model_path)
+        if model_file:
+            response_cache = ResponseCache(
+                cache_path or NEXA_MODEL_EVAL_RESULTS_PATH / "response_cache.sqlite"
+            )
+            model_hash = response_cache.model_hash(model_file)
+            sampling_params = GGUFLM.sampling_params()
+            pending_requests = []
+            for idx, req in indexed_requests:
+                key = ResponseCache.make_key(
+                    model_hash, req.request_type, req.args, sampling_params
+                )
+                resp = response_cache.get(key)
+                if resp is None:
+                    cache_keys[idx] = key
+                    pending_requests.append((idx, req))
+                else:
+                    resps_by_idx[idx] = resp
+            eval_logger.info(
+                f"Response cache: {response_cache.hits} hits, {response_cache.misses} misses"
+            )
+
+    def store_responses(chunk_resps):
+        for idx, resp in chunk_resps:
+            resps_by_idx[idx] = resp
+        if response_cache is not None:
+            response_cache.put_many(
+                (cache_keys[idx], resp) for idx, resp in chunk_resps
+            )
+
+    # Requests sharing a prompt prefix are run back to back, in chunks
+    chunk_size = max(1, min(64, len(pending_requests) // (4 * num_workers)))
+    planned_chunks = plan_requests(pending_requests, chunk_size=chunk_size)
+
     # Run LM on inputs, get all outputs
-    if num_workers == 1:
+    load_start = inference_start = time.perf_counter()
+    if not pending_requests:
+        eval_logger.info("All responses were found in the cache")
+    elif num_workers == 1:
         # Without multiprocessing
         lm = GGUFLM(model_path)
         eval_logger.info(f"Running requests with a single worker")
-        reqs_by_type = defaultdict(list)
-        for idx, req in indexed_requests:
-            reqs_by_type[req.request_type].append((idx, req))
-        for reqtype, reqs in reqs_by_type.items():
-            idxs, reqs_only = zip(*reqs)
-            resps = getattr(lm, reqtype)(reqs_only)
-            for idx, x in zip(idxs, resps):
-                req = idx_to_req[idx]
-                req.resps.append(x)
+        inference_start = time.perf_counter()
+        pbar = tqdm(total=len(pending_requests))
+        for reqtype, chunk in planned_chunks:
+            resps = getattr(lm, reqtype)([req for _, req in chunk], disable_tqdm=True)
+            store_responses([(idx, x) for (idx, _), x in zip(chunk, resps)])
+            pbar.update(len(chunk))
+        pbar.close()
     else:
         # Multiprocessing logic
         # Define the task queue, result queue, and stop event
@@ -158,43 +230,71 @@ def nexa_evaluate(
         result_queue = multiprocessing.Queue()
         stop_event = multiprocessing.Event()
 
-        # Add all requests to the task queue
-        for item in indexed_requests:
+        # Add all request chunks to the task queue
+        for item in planned_chunks:
             task_queue.put(item)
 
         # Add sentinel values to stop workers
         for _ in range(num_workers):
             task_queue.put(None)
 
+        # Split the cores between the workers instead of letting each of
+        # them start a thread per core
+        n_threads = max(1, multiprocessing.cpu_count() // num_workers)
+        ready = multiprocessing.Barrier(num_workers + 1)
+
         # Start worker processes
         processes = []
         for _ in range(num_workers):
             p = multiprocessing.Process(
                 target=worker,
-                args=(task_queue, result_queue, stop_event, model_path),
+                args=(task_queue, result_queue, stop_event, model_path, n_threads, ready),
             )
             p.start()
             processes.append(p)
 
+        # Requests are only timed once every worker has loaded the model
+        try:
+            ready.wait()
+        except threading.BrokenBarrierError:
+            stop_event.set()
+            for p in processes:
+                p.join()
+            raise RuntimeError("An evaluation worker failed to load the model")
+        inference_start = time.perf_counter()
+        eval_logger.info(
+            f"Running requests with {num_workers} workers, {n_threads} threads each"
+        )
+
         # Create progress bar in the main process
-        pbar = tqdm(total=len(requests))
+        pbar = tqdm(total=len(pending_requests))
 
         # Collect results and update progress bar
         results_received = 0
-        total_results = len(requests)
+        total_results = len(pending_requests)
         while results_received < total_results:
             try:
-                # Get result from result queue
-                idx, resp = result_queue.get(timeout=1)
-                req = idx_to_req[idx]
-                req.resps.append(resp)
-                results_received += 1
-                pbar.update(1)
+                # Get the results of a chunk from result queue
+                chunk_resps = result_queue.get(timeout=1)
             except queue.Empty:
                 continue
-            except Exception:
-                continue
-            
+            if isinstance(chunk_resps, WorkerFailure):
+                pbar.close()
+                stop_event.set()
+                for p in processes:
+                    p.terminate()
+                    p.join()
+                if response_cache is not None:
+                    # Keep the responses of the chunks that did finish
+                    response_cache.close()
+                raise RuntimeError(
+                    f"An evaluation worker failed on {chunk_resps.reqtype} requests: "
+                    f"{chunk_resps.message}\n{chunk_resps.traceback}"
+                )
+            store_responses(chunk_resps)
+            results_received += len(chunk_resps)
+            pbar.update(len(chunk_resps))
+
         pbar.close()
 
         # Ensure all processes have finished
@@ -202,6 +302,14 @@ def nexa_evaluate(
         for p in processes:
             p.join()
 
+    inference_end = time.perf_counter()
+    if response_cache is not None:
+        response_cache.close()
+
+    # Hand the responses back in the original request order
+    for idx in sorted(resps_by_idx):
+        idx_to_req[idx].resps.append(resps_by_idx[idx])
+
     # Postprocess outputs
     for task_output in eval_tasks:
         task = task_output.task
@@ -324,6 +432,12 @@ def nexa_evaluate(
         "numpy_seed": numpy_random_seed,
         "fewshot_seed": fewshot_random_seed,
     }
+    results_dict["timing"] = {
+        "model_load_seconds": inference_start - load_start,
+        "inference_seconds": inference_end - inference_start,
+    }
+    if response_cache is not None:
+        results_dict["cache"] = response_cache.stats()
     results_dict.update({
         "date": start_date,
         "nexa_sdk_version":  __version__,
@@ -3,6 +3,7 @@ import math
 from typing import List, Optional, Tuple, Union
 
 from nexa.eval.nexa_task.group import ConfigurableGroup
+from nexa.eval.nexa_task.instance import Instance
 from nexa.eval.nexa_task.metrics import (
     aggregate_subtask_metrics,
     pooled_sample_stderr,
@@ -194,6 +195,36 @@ def get_sample_size(task, limit: Optional[int]) -> Union[int, None]:
     return limit
 
 
+def plan_requests(
+    indexed_requests: List[Tuple[int, Instance]], chunk_size: int = 64
+) -> List[Tuple[str, List[Tuple[int, Instance]]]]:
+    """Order requests so that those sharing a prompt prefix run back to back.
+
+    Requests are split by type and sorted by prompt text, which puts prompts
+    with long common prefixes (e.g. the same few-shot examples) next to each
+    other so that the KV cache prefix reuse of the model hits. The sorted
+    requests are cut into chunks of about `chunk_size` requests without
+    splitting requests that share a prompt. Returns `(request_type, chunk)`
+    pairs; results are matched back to requests through their index.
+    """
+    by_type = collections.defaultdict(list)
+    for idx, req in indexed_requests:
+        by_type[req.request_type].append((idx, req))
+
+    chunks = []
+    for reqtype, reqs in by_type.items():
+        reqs.sort(key=lambda item: item[1].args[0])
+        chunk = []
+        for idx, req in reqs:
+            if len(chunk) >= chunk_size and req.args[0] != chunk[-1][1].args[0]:
+                chunks.append((reqtype, chunk))
+                chunk = []
+            chunk.append((idx, req))
+        if chunk:
+            chunks.append((reqtype, chunk))
+    return chunks
+
+
 def prepare_print_tasks(
     task_dict: dict,
     results: dict,
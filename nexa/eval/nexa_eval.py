@@ -24,7 +24,7 @@ from nexa.eval.nexa_perf import (
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class NexaEval:
-    def __init__(self, model_path: str, tasks: str = None, limit: float = None, nctx: int = None, num_workers: int = None):
+    def __init__(self, model_path: str, tasks: str = None, limit: float = None, nctx: int = None, num_workers: int = None, use_cache: bool = True):
         model_path = NEXA_RUN_MODEL_MAP.get(model_path, model_path)
         self.model_path = model_path
         
@@ -42,6 +42,7 @@ class NexaEval:
             "tasks": self.tasks,
             "limit": self.limit,
             "num_workers": self.num_workers,
+            "use_cache": use_cache,
             "output_path": str(output_path),
             "include_path": None,
             "verbosity": "INFO",
@@ -67,6 +68,7 @@ class NexaEval:
                 model_path=args.model_path,
                 limit=args.limit,
                 num_workers=args.num_workers,
+                use_cache=args.use_cache,
                 tasks=task_names,
                 task_manager=task_manager
             )
@@ -130,6 +132,9 @@ class NexaEval:
             print(make_table(results))
             if "groups" in results:
                 print(make_table(results, "groups"))
+            if "cache" in results:
+                cache = results["cache"]
+                print(f"Response cache: {cache['hits']} hits, {cache['misses']} misses ({cache['hit_rate']:.1%} hit rate)")
     
 
     def run_evaluation(self):
@@ -1,6 +1,5 @@
 import logging
 import math
-import random
 import re
 import string
 from collections.abc import Iterable
@@ -338,6 +337,17 @@ def _sacreformat(refs, preds):
 # stderr stuff
 
 
+def _bootstrap_indices(rng, n, iters, max_block=1 << 22):
+    """Yield (rows, n) resample index matrices covering `iters` resamples.
+
+    Blocks hold at most `max_block` indices so memory stays bounded for
+    large tasks.
+    """
+    block = max(1, min(iters, max_block // max(n, 1)))
+    for start in range(0, iters, block):
+        yield rng.integers(0, n, size=(min(block, iters - start), n))
+
+
 class _bootstrap_internal:
     def __init__(self, f, n) -> None:
         self.f = f
@@ -345,18 +355,91 @@ class _bootstrap_internal:
 
     def __call__(self, v):
         i, xs = v
-        rnd = random.Random()
-        rnd.seed(i)
+        rng = np.random.default_rng(i)
         res = []
-        for _ in range(self.n):
-            res.append(self.f(rnd.choices(xs, k=len(xs))))
+        for idx in _bootstrap_indices(rng, len(xs), self.n):
+            res.extend(self.f([xs[j] for j in row]) for row in idx)
         return res
 
 
-def bootstrap_stderr(f, xs, iters):
+def _binary_confusion_codes(items):
+    """Per-item confusion cell (2 * gold + pred) for binary 0/1 labels, else None."""
+    if len(items) == 0:
+        return None
+    golds, preds = (np.asarray(a) for a in zip(*items))
+    labels = np.concatenate([golds, preds])
+    if labels.dtype == object or not np.isin(labels, (0, 1)).all():
+        return None
+    return 2 * golds.astype(np.intp) + preds.astype(np.intp)
+
+
+def _confusion_counts(codes, idx):
+    """tn, fp, fn, tp counts of every resample (one row of `idx` each)."""
+    n_rows = idx.shape[0]
+    flat = codes[idx] + 4 * np.arange(n_rows)[:, None]
+    counts = np.bincount(flat.ravel(), minlength=4 * n_rows).reshape(n_rows, 4)
+    return counts[:, 0], counts[:, 1], counts[:, 2], counts[:, 3]
+
+
+def _bootstrap_f1(items):
+    codes = _binary_confusion_codes(items)
+    if codes is None:
+        return None
+
+    def stats(idx):
+        _, fp, fn, tp = _confusion_counts(codes, idx)
+        denom = 2 * tp + fp + fn
+        return np.divide(2 * tp, denom, out=np.zeros(len(denom)), where=denom > 0)
+
+    return stats
+
+
+def _bootstrap_mcc(items):
+    codes = _binary_confusion_codes(items)
+    if codes is None:
+        return None
+
+    def stats(idx):
+        tn, fp, fn, tp = (c.astype(np.float64) for c in _confusion_counts(codes, idx))
+        denom = np.sqrt((tp + fp) * (tp + fn) * (tn + fp) * (tn + fn))
+        return np.divide(
+            tp * tn - fp * fn, denom, out=np.zeros(len(denom)), where=denom > 0
+        )
+
+    return stats
+
+
+# Aggregations whose bootstrap can run as array operations over a whole block
+# of resamples. Each entry prepares the items and returns a function mapping
+# an (n_resamples, n_items) index matrix to the statistic of every resample,
+# or None when the items are not supported (e.g. non-binary labels).
+# `mean` is absent on purpose: its stderr is computed analytically.
+_vectorized_bootstrap = {
+    f1_score: _bootstrap_f1,
+    matthews_corrcoef: _bootstrap_mcc,
+}
+
+
+def vectorized_bootstrap_stderr(stats, n, iters, seed=1234, max_block=1 << 22):
+    """Bootstrap stderr of `stats` over `n` items, `iters` resamples at once."""
+    rng = np.random.default_rng(seed)
+    res = np.empty(iters, dtype=np.float64)
+    start = 0
+    for idx in _bootstrap_indices(rng, n, iters, max_block):
+        res[start : start + len(idx)] = stats(idx)
+        start += len(idx)
+    return float(np.std(res, ddof=1))
+
+
+def pooled_bootstrap_stderr(f, xs, iters):
+    """Bootstrap stderr of an arbitrary aggregation `f` in a process pool.
+
+    Each worker draws its resamples as NumPy index blocks and recomputes `f`
+    on every one, for metrics that cannot be vectorized (e.g. corpus-level
+    BLEU).
+    """
     import multiprocessing as mp
 
-    pool = mp.Pool(mp.cpu_count())
     # this gives a biased estimate of the stderr (i.e w/ the mean, it gives something
     # equivalent to stderr calculated without Bessel's correction in the stddev.
     # Unfortunately, I haven't been able to figure out what the right correction is
@@ -368,20 +451,28 @@ def bootstrap_stderr(f, xs, iters):
     from tqdm import tqdm
 
     print("bootstrapping for stddev:", f.__name__)
-    for bootstrap in tqdm(
-        pool.imap(
-            _bootstrap_internal(f, chunk_size),
-            [(i, xs) for i in range(iters // chunk_size)],
-        ),
-        total=iters // chunk_size,
-    ):
-        # sample w replacement
-        res.extend(bootstrap)
-
-    pool.close()
+    with mp.Pool(mp.cpu_count()) as pool:
+        for bootstrap in tqdm(
+            pool.imap(
+                _bootstrap_internal(f, chunk_size),
+                [(i, xs) for i in range(iters // chunk_size)],
+            ),
+            total=iters // chunk_size,
+        ):
+            # sample w replacement
+            res.extend(bootstrap)
+
     return sample_stddev(res)
 
 
+def bootstrap_stderr(f, xs, iters):
+    vectorized = _vectorized_bootstrap.get(f)
+    stats = vectorized(xs) if vectorized is not None else None
+    if stats is not None:
+        return vectorized_bootstrap_stderr(stats, len(xs), iters)
+    return pooled_bootstrap_stderr(f, xs, iters)
+
+
 def stderr_for_metric(metric, bootstrap_iters: int):
     if bootstrap_iters <= 0:
         # return no function (don't compute stderr) if bootstrap iters = 0
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+from nexa.eval.utils import eval_logger, handle_non_serializable
+
+
+def file_sha256(path: Union[str, Path], block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, or of every file below a directory in path order."""
+    digest = hashlib.sha256()
+    path = Path(path)
+    files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+    for file in files:
+        with open(file, "rb") as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Persistent cache of model responses to eval requests.
+
+    Responses are stored in a SQLite database under a content-addressed key:
+    the SHA-256 of the model file(s), the request type, the request arguments
+    and the sampling parameters. A rerun of the same model and task, or an
+    interrupted run, only computes requests it has not seen yet.
+
+    Hashing a multi-GB model file takes a while, so the model hash is itself
+    cached per (path, size, mtime).
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS model_hashes ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def model_hash(self, model_file: Union[str, Path]) -> str:
+        """Content hash of a model, computed once per file version."""
+        model_file = str(Path(model_file).resolve())
+        stat = os.stat(model_file)
+        row = self._conn.execute(
+            "SELECT size, mtime_ns, sha256 FROM model_hashes WHERE path = ?",
+            (model_file,),
+        ).fetchone()
+        if row is not None and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        eval_logger.info(f"Hashing model file {model_file} for the response cache...")
+        sha256 = file_sha256(model_file)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO model_hashes VALUES (?, ?, ?, ?)",
+            (model_file, stat.st_size, stat.st_mtime_ns, sha256),
+        )
+        self._conn.commit()
+        return sha256
+
+    @staticmethod
+    def make_key(
+        model_hash: str,
+        request_type: str,
+        args: Tuple[Any, ...],
+        sampling_params: Dict[str, Any],
+    ) -> str:
+        payload = json.dumps(
+            [model_hash, request_type, list(args), sampling_params],
+            sort_keys=True,
+            default=handle_non_serializable,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """The cached response for `key`, or None. Counts a hit or a miss."""
+        row = self._conn.execute(
+            "SELECT response FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        response = json.loads(row[0])
+        # loglikelihood responses are (logprob, is_greedy) tuples
+        return tuple(response) if isinstance(response, list) else response
+
+    def put_many(self, items: Iterable[Tuple[str, Any]]):
+        """Store `(key, response)` pairs; None responses (failed requests) are skipped."""
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?)",
+            [
+                (key, json.dumps(response, default=handle_non_serializable))
+                for key, response in items
+                if response is not None
+            ],
+        )
+        self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        self._conn.close()
@@ -7,14 +7,15 @@ import requests
 import concurrent.futures
 import time
 import os
+import base64
+import hashlib
+import re
+import threading
 from tqdm import tqdm
-import platform
-import tempfile
 
 from nexa.constants import (
     NEXA_API_URL,
     NEXA_LOGO,
-    NEXA_MODEL_LIST_PATH,
     NEXA_MODELS_HUB_DIR,
     NEXA_MODELS_HUB_OFFICIAL_DIR,
     NEXA_MODELS_HUB_HF_DIR,
@@ -25,6 +26,8 @@ from nexa.constants import (
     NEXA_OFFICIAL_MODELS_TYPE,
 )
 from nexa.constants import ModelType
+from nexa.blob_store import blob_store
+from nexa.model_registry import model_registry
 
 def login():
     """
@@ -162,6 +165,7 @@ def pull_model_from_hub(model_path, **kwargs):
         result = get_model_presigned_link(model_path, token)
         run_type = result['run_type']
         presigned_links = result['presigned_urls']
+        checksums = result['sha256']
     except Exception as e:
         print(f"Failed to get download models: {e}")
         return {
@@ -191,7 +195,10 @@ def pull_model_from_hub(model_path, **kwargs):
         try:
             # Use custom download path if provided, otherwise use default
             download_path = base_download_dir / file_path
-            download_file_with_progress(presigned_link, download_path, **kwargs)
+            sha256 = checksums.get(file_path)
+            download_file_with_progress(presigned_link, download_path, sha256=sha256, **kwargs)
+            if not local_download_path and download_path.suffix == ".gguf":
+                store_model_blob(download_path, sha256)
 
             if local_path is None:
                 if model_type == "onnx" or model_type == "bin":
@@ -274,7 +281,8 @@ def get_model_presigned_link(full_path, token):
     token (str, optional): The authentication token. Defaults to None.
 
     Returns:
-    dict: A dictionary containing the model type and presigned URLs.
+    dict: A dictionary containing the model type, presigned URLs and, for the
+    files the hub lists a checksum for, their sha256.
     """
 
     url = f"{NEXA_API_URL}/model/download-tag-folder"
@@ -292,10 +300,16 @@ def get_model_presigned_link(full_path, token):
 
         run_type = result.get("type", [])[0] if result.get("type") else None
         presigned_urls = result.get("presigned_urls", {})
+        sha256 = {
+            path: digest.lower()
+            for path, digest in (result.get("sha256") or {}).items()
+            if isinstance(digest, str) and re.fullmatch(r"[0-9a-fA-F]{64}", digest)
+        }
         
         return {
             "run_type": run_type,
-            "presigned_urls": presigned_urls
+            "presigned_urls": presigned_urls,
+            "sha256": sha256
         }
 
     except requests.exceptions.RequestException as e:
@@ -303,36 +317,106 @@ def get_model_presigned_link(full_path, token):
         raise
 
 
-def download_chunk(url, start, end, output_file, chunk_number):
-    headers = {"Range": f"bytes={start}-{end}"}
-    max_retries = 3
+DOWNLOAD_BUFFER_SIZE = 1024 * 1024
+
+
+def _expected_digest(headers):
+    """Return the (algorithm, hex digest) the server advertises for the whole file, or None.
+
+    Only headers that always carry a content digest are trusted. A plain ETag
+    is the MD5 of some S3 objects but not of multipart or KMS-encrypted ones,
+    so it is used to detect a changed file, never as a checksum.
+    """
+    for part in headers.get("x-goog-hash", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name == "md5" and value:
+            return "md5", base64.b64decode(value).hex()
+    if headers.get("Content-MD5"):
+        return "md5", base64.b64decode(headers["Content-MD5"]).hex()
+    return None
+
+
+def _remove_if_exists(path: Path):
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _load_download_state(state_path: Path, meta: dict, n_chunks: int):
+    """Return the completed-chunk bitmap of an interrupted download of the same file, or None."""
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+        if state.get("meta") != meta:
+            return None
+        done = bytearray(base64.b64decode(state["done"]))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if len(done) != (n_chunks + 7) // 8:
+        return None
+    return done
+
+
+def _save_download_state(state_path: Path, meta: dict, done: bytearray):
+    tmp_path = state_path.with_name(state_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump({"meta": meta, "done": base64.b64encode(bytes(done)).decode("ascii")}, f)
+    os.replace(tmp_path, state_path)
+
+
+_seek_write_lock = threading.Lock()
+
+
+def _write_at(fd: int, data: bytes, offset: int):
+    """Write all of `data` at `offset` without moving a shared file position."""
+    view = memoryview(data)
+    while view:
+        if hasattr(os, "pwrite"):
+            written = os.pwrite(fd, view, offset)
+        else:
+            # Windows has no pwrite, serialise seek + write instead
+            with _seek_write_lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                written = os.write(fd, view)
+        view = view[written:]
+        offset += written
+
+
+def download_chunk(session, url, fd, start, end, progress_bar, stop, max_retries=5):
+    """Stream bytes `start`..`end` (inclusive) of `url` into `fd` at the same offsets.
+
+    A retry continues from the last byte written instead of refetching the range.
+    """
+    pos = start
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-            chunk_file = f"{output_file}.part{chunk_number}"
-            with open(chunk_file, "wb") as f:
-                f.write(response.content)
-            return len(response.content), chunk_number
-        except requests.RequestException as e:
+            with session.get(
+                url, headers={"Range": f"bytes={pos}-{end}"}, stream=True, timeout=30
+            ) as response:
+                response.raise_for_status()
+                if response.status_code != 206:
+                    # The server ignored the range and sends the whole file
+                    if start != 0:
+                        raise ValueError("Server does not support range requests")
+                    progress_bar.update(start - pos)
+                    pos = start
+                for data in response.iter_content(DOWNLOAD_BUFFER_SIZE):
+                    if stop.is_set():
+                        raise InterruptedError("Download cancelled")
+                    data = data[: end + 1 - pos]
+                    _write_at(fd, data, pos)
+                    pos += len(data)
+                    progress_bar.update(len(data))
+                    if pos > end:
+                        return
+            raise requests.ConnectionError(
+                f"Connection closed at byte {pos} of range {start}-{end}"
+            )
+        except requests.RequestException:
             if attempt == max_retries - 1:
                 raise
             time.sleep(2 ** attempt)  # Exponential backoff
-            
-            
-def default_use_processes():
-    """
-    Distinct operating systems may have different default behaviors for threading vs multiprocessing.
-    """
-    platform_name = platform.system()
-    if platform_name == "Linux":
-        return True
-    elif platform_name == "Windows":
-        return False
-    elif platform_name == "Darwin":
-        return False
-    else:
-        return False
 
 
 def download_file_with_progress(
@@ -340,92 +424,157 @@ def download_file_with_progress(
     file_path: Path,
     chunk_size: int = 5 * 1024 * 1024,
     max_workers: int = 20,
-    use_processes: bool = default_use_processes(),
     **kwargs
 ):
+    """Download `url` to `file_path` with parallel range requests.
+
+    Ranges are streamed straight into a preallocated `<file>.download` file;
+    which chunks are complete is persisted next to it in
+    `<file>.download.state`, so a rerun after an interruption only fetches
+    the missing chunks. The finished file is checked against its expected
+    size and, when known (`sha256` keyword, which callers take from the hub
+    or a checksum manifest, or an MD5 header from the server), its checksum
+    before it is atomically moved into place.
+    """
+    file_path = Path(file_path)
     file_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    # Create a temporary directory for chunks
-    temp_dir = Path(tempfile.mkdtemp())
+    part_path = file_path.with_name(file_path.name + ".download")
+    state_path = file_path.with_name(file_path.name + ".download.state")
 
+    fd = None
+    sessions = []
     try:
-        response = requests.head(url, timeout=30)
+        response = requests.head(url, timeout=30, allow_redirects=True)
         response.raise_for_status()
         file_size = int(response.headers.get("Content-Length", 0))
         if file_size == 0:
             raise ValueError("File size is 0 or Content-Length header is missing")
+        if response.headers.get("Accept-Ranges", "").lower() != "bytes":
+            chunk_size = file_size
+        if kwargs.get("sha256"):
+            digest = ("sha256", kwargs["sha256"].lower())
+        else:
+            digest = _expected_digest(response.headers)
 
         chunks = [
             (i, min(i + chunk_size - 1, file_size - 1))
             for i in range(0, file_size, chunk_size)
         ]
+        meta = {
+            "size": file_size,
+            "chunk_size": chunk_size,
+            "validator": response.headers.get("ETag") or response.headers.get("Last-Modified"),
+        }
+
+        done = None
+        if part_path.exists() and part_path.stat().st_size == file_size:
+            done = _load_download_state(state_path, meta, len(chunks))
+        fd = os.open(part_path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0))
+        if done is None:
+            done = bytearray((len(chunks) + 7) // 8)
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, file_size)
+            _save_download_state(state_path, meta, done)
+
+        pending = [i for i in range(len(chunks)) if not done[i // 8] & (1 << (i % 8))]
+        downloaded = file_size - sum(chunks[i][1] - chunks[i][0] + 1 for i in pending)
+        if downloaded:
+            print(f"Resuming download of {file_path.name}")
 
         progress_bar = tqdm(
             total=file_size,
+            initial=downloaded,
             unit="B",
             unit_scale=True,
             desc=file_path.name,
             unit_divisor=1024,
         )
 
-        start_time = time.time()
-
-        executor_class = (
-            concurrent.futures.ProcessPoolExecutor
-            if use_processes
-            else concurrent.futures.ThreadPoolExecutor
+        # One keep-alive session per worker thread
+        local = threading.local()
+
+        def fetch(i):
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = requests.Session()
+                sessions.append(session)
+            start, end = chunks[i]
+            download_chunk(session, url, fd, start, end, progress_bar, stop)
+
+        stop = threading.Event()
+        errors = []
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, min(max_workers, len(pending)))
         )
-
-        with executor_class(max_workers=max_workers) as executor:
-            future_to_chunk = {
-                executor.submit(
-                    download_chunk, url, start, end, str(temp_dir / file_path.name), i
-                ): (i, start, end)
-                for i, (start, end) in enumerate(chunks)
-            }
-            
-            completed_chunks = [False] * len(chunks)
+        future_to_chunk = {}
+        try:
+            for i in pending:
+                future_to_chunk[executor.submit(fetch, i)] = i
             for future in concurrent.futures.as_completed(future_to_chunk):
+                chunk_number = future_to_chunk[future]
                 try:
-                    chunk_size, chunk_number = future.result()
-                    completed_chunks[chunk_number] = True
-                    progress_bar.update(chunk_size)
+                    future.result()
                 except Exception as e:
                     print(f"Error downloading chunk {chunk_number}: {e}")
+                    errors.append(e)
+                    continue
+                done[chunk_number // 8] |= 1 << (chunk_number % 8)
+                _save_download_state(state_path, meta, done)
+        finally:
+            stop.set()
+            for future in future_to_chunk:
+                future.cancel()
+            executor.shutdown(wait=True)
+            progress_bar.close()
+
+        if errors:
+            raise Exception(
+                f"{len(errors)} chunk(s) failed to download, rerun to resume: {errors[0]}"
+            )
 
-        progress_bar.close()
-
-        if all(completed_chunks):
-            # Create a new progress bar for combining chunks
-            combine_progress = tqdm(
+        if os.fstat(fd).st_size != file_size:
+            raise ValueError(f"Downloaded file size does not match {file_size} bytes")
+        if digest is not None:
+            algorithm, expected = digest
+            hasher = hashlib.new(algorithm)
+            verify_progress = tqdm(
                 total=file_size,
                 unit='B',
                 unit_scale=True,
                 desc="Verifying download",
                 unit_divisor=1024
             )
-            
-            buffer_size = 1 * 1024 * 1024  # 1MB buffer
-            
-            with open(file_path, "wb") as final_file:
-                for i in range(len(chunks)):
-                    chunk_file = temp_dir / f"{file_path.name}.part{i}"
-                    with open(chunk_file, "rb") as part_file:
-                        shutil.copyfileobj(part_file, final_file, buffer_size)
-                        combine_progress.update(os.path.getsize(chunk_file))
-            
-            combine_progress.close()
-        else:
-            raise Exception("Some chunks failed to download")
+            with open(part_path, "rb") as f:
+                while True:
+                    block = f.read(DOWNLOAD_BUFFER_SIZE)
+                    if not block:
+                        break
+                    hasher.update(block)
+                    verify_progress.update(len(block))
+            verify_progress.close()
+            if hasher.hexdigest() != expected:
+                os.close(fd)
+                fd = None
+                _remove_if_exists(part_path)
+                _remove_if_exists(state_path)
+                raise ValueError(
+                    f"{algorithm} checksum mismatch for {file_path.name}: "
+                    f"expected {expected}, got {hasher.hexdigest()}"
+                )
+
+        os.close(fd)
+        fd = None
+        os.replace(part_path, file_path)
+        _remove_if_exists(state_path)
 
     except Exception as e:
-        # Clean up partial files and final file if it exists
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        # Keep the partial file and its state so that a rerun resumes
         raise Exception(f"An unexpected error occurred: {e}")
     finally:
-        # Clean up temporary directory and all its contents
-        shutil.rmtree(temp_dir)
+        if fd is not None:
+            os.close(fd)
+        for session in sessions:
+            session.close()
 
 
 def download_model_from_official(model_path, model_type, **kwargs):
@@ -449,7 +598,8 @@ def download_model_from_official(model_path, model_type, **kwargs):
         download_url = f"{NEXA_OFFICIAL_BUCKET}{model_name}/{filename}"  # Keep original structure for download URL
 
         full_path.parent.mkdir(parents=True, exist_ok=True)
-        download_file_with_progress(download_url, full_path, **kwargs)
+        sha256 = official_file_sha256(download_url)
+        download_file_with_progress(download_url, full_path, sha256=sha256, **kwargs)
 
         if model_type == "onnx" or model_type == "bin":
             unzipped_folder = full_path.parent / model_version
@@ -463,6 +613,8 @@ def download_model_from_official(model_path, model_type, **kwargs):
             print(f"Successfully downloaded and unzipped {filepath} to {final_path}")
         else:
             final_path = full_path
+            if not local_download_path:
+                store_model_blob(final_path, sha256)
             print(f"Successfully downloaded {filepath} to {final_path}")
 
         return True, str(final_path)
@@ -524,6 +676,51 @@ def download_repo_from_ms(repo_id):
         print(f"Failed to download the repository: {e}")
         return False, None
 
+def store_model_blob(path, sha256=None):
+    """Deduplicate a downloaded model file through the content-addressed blob store."""
+    try:
+        blob_store.ingest(path, sha256)
+    except OSError as e:
+        logging.warning(f"Could not add {path} to the blob store: {e}")
+
+
+def hf_file_sha256(repo_id, filename):
+    """sha256 of a Hugging Face LFS file from its metadata, or None if unavailable."""
+    try:
+        from huggingface_hub import get_hf_file_metadata, hf_hub_url
+        etag = get_hf_file_metadata(hf_hub_url(repo_id, filename)).etag
+    except Exception:
+        return None
+    etag = (etag or "").strip('"')
+    return etag if re.fullmatch(r"[0-9a-f]{64}", etag) else None
+
+
+def official_file_sha256(download_url):
+    """sha256 of an official model file from its `<file>.sha256` manifest, or None if unavailable."""
+    try:
+        response = requests.get(f"{download_url}.sha256", timeout=30)
+        response.raise_for_status()
+    except requests.RequestException:
+        return None
+    # sha256sum format: "<hex>  <filename>"
+    sha256 = (response.text.split() or [""])[0].lower()
+    return sha256 if re.fullmatch(r"[0-9a-f]{64}", sha256) else None
+
+
+def ms_file_sha256(repo_id, filename):
+    """sha256 of a ModelScope file from the repo file listing, or None if unavailable."""
+    try:
+        from modelscope.hub.api import HubApi
+        files = HubApi().get_model_files(repo_id, recursive=True)
+    except Exception:
+        return None
+    for file in files:
+        if file.get("Path") == filename:
+            sha256 = (file.get("Sha256") or "").lower()
+            return sha256 if re.fullmatch(r"[0-9a-f]{64}", sha256) else None
+    return None
+
+
 def download_gguf_from_hf(repo_id, filename, **kwargs):
     try:
         from huggingface_hub import hf_hub_download
@@ -539,6 +736,14 @@ def download_gguf_from_hf(repo_id, filename, **kwargs):
     local_dir = base_download_dir / Path(repo_id)
     local_dir.mkdir(parents=True, exist_ok=True)
 
+    sha256 = None
+    if not local_download_path:
+        sha256 = hf_file_sha256(repo_id, filename)
+        target_path = local_dir / filename
+        if blob_store.has(sha256) and blob_store.link(sha256, target_path):
+            print(f"{filename} is already stored locally, linked it to {target_path}")
+            return True, str(target_path)
+
     # Download the model
     try:
         model_path = hf_hub_download(
@@ -557,7 +762,8 @@ def download_gguf_from_hf(repo_id, filename, **kwargs):
             org_dir = base_download_dir / repo_id.split('/')[0]
             shutil.rmtree(org_dir)
             return True, str(target_path)
-            
+
+        store_model_blob(model_path, sha256)
         return True, model_path
     except Exception as e:
         print(f"Failed to download the model: {e}")
@@ -578,6 +784,14 @@ def download_gguf_from_ms(repo_id, filename, **kwargs):
     local_dir = base_download_dir / Path(repo_id)
     local_dir.mkdir(parents=True, exist_ok=True)
 
+    sha256 = None
+    if not local_download_path:
+        sha256 = ms_file_sha256(repo_id, filename)
+        target_path = local_dir / filename
+        if blob_store.has(sha256) and blob_store.link(sha256, target_path):
+            print(f"{filename} is already stored locally, linked it to {target_path}")
+            return True, str(target_path)
+
     # Download the model
     try:
         model_path = model_file_download(
@@ -596,40 +810,21 @@ def download_gguf_from_ms(repo_id, filename, **kwargs):
             shutil.rmtree(org_dir)
             return True, str(target_path)
 
+        store_model_blob(model_path, sha256)
         return True, model_path
     except Exception as e:
         print(f"Failed to download the model: {e}")
         return False, None
 
 def is_model_exists(model_name):
-    if not NEXA_MODEL_LIST_PATH.exists():
+    model_key = model_registry.find(model_name)
+    if model_key is None:
         return False
-
-    with open(NEXA_MODEL_LIST_PATH, "r") as f:
-        model_list = json.load(f)
-        
-    # For AudioLM and Multimodal models, should check the file location instead of model name
-    if ":" in model_name:
-        model_path_with_slash = model_name.replace(":", "/")
-        model_path_with_backslash = model_name.replace(":", "\\")
-        
-        # Check if model_prefix/model_suffix or model_prefix\model_suffix exists in any location path
-        for model_key, model_info in model_list.items():
-            if model_path_with_slash in model_info["location"] or model_path_with_backslash in model_info["location"]:
-                return model_key
-
-    return model_name in model_list
+    # For AudioLM and Multimodal models, the entry may be found by its file location
+    return True if model_key == model_name else model_key
 
 
 def add_model_to_list(model_name, model_location, model_type, run_type):
-    NEXA_MODEL_LIST_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-    if NEXA_MODEL_LIST_PATH.exists():
-        with open(NEXA_MODEL_LIST_PATH, "r") as f:
-            model_list = json.load(f)
-    else:
-        model_list = {}
-    
     # For AudioLM and Multimodal models, should remove the "model-" prefix from the tag name
     if run_type == "AudioLM" or run_type == "Multimodal":
         tag_name = model_name.split(":")[1]
@@ -637,48 +832,26 @@ def add_model_to_list(model_name, model_location, model_type, run_type):
             tag_name = tag_name[6:]
             model_name = f"{model_name.split(':')[0]}:{tag_name}"
 
-    model_list[model_name] = {
+    model_registry.add(model_name, {
         "type": model_type,
         "location": model_location,
         "run_type": run_type
-    }
-
-    with open(NEXA_MODEL_LIST_PATH, "w") as f:
-        json.dump(model_list, f, indent=2)
+    })
 
 
 def get_model_info(model_name):
-    if not NEXA_MODEL_LIST_PATH.exists():
+    model_data = model_registry.get(model_name)
+    if not model_data:
         return None, None
-
-    with open(NEXA_MODEL_LIST_PATH, "r") as f:
-        model_list = json.load(f)
-
-    # First try direct lookup
-    model_data = model_list.get(model_name, {})
-    if model_data:
-        return model_data.get("location"), model_data.get("run_type")
-
-    # If not found and model_name contains ":", try path-based lookup
-    if ":" in model_name:
-        model_path_with_slash = model_name.replace(":", "/")
-        model_path_with_backslash = model_name.replace(":", "\\")
-        
-        # Check if model_prefix/model_suffix or model_prefix\model_suffix exists in any location path
-        for model_key, model_info in model_list.items():
-            if model_path_with_slash in model_info["location"] or model_path_with_backslash in model_info["location"]:
-                return model_info["location"], model_info["run_type"]
-
-    return None, None
+    return model_data.get("location"), model_data.get("run_type")
 
 
 def list_models():
-    if not NEXA_MODEL_LIST_PATH.exists():
+    if not model_registry.exists():
         print("No models found.")
         return
     try:
-        with open(NEXA_MODEL_LIST_PATH, "r") as f:
-            model_list = json.load(f)
+        model_list = model_registry.models()
 
         filtered_list = {
             model_name: model_info 
@@ -708,40 +881,22 @@ def list_models():
 def remove_model(model_path):
     model_path = NEXA_RUN_MODEL_MAP.get(model_path, model_path)
 
-    if not NEXA_MODEL_LIST_PATH.exists():
+    if not model_registry.exists():
         print("No models found.")
         return
 
     try:
-        with open(NEXA_MODEL_LIST_PATH, "r") as f:
-            model_list = json.load(f)
-
-        # First try direct lookup
-        if model_path not in model_list:
-            # If not found and model_path contains ":", try path-based lookup
-            if ":" in model_path:
-                model_path_with_slash = model_path.replace(":", "/")
-                model_path_with_backslash = model_path.replace(":", "\\")
-                
-                # Find matching model key
-                matching_key = None
-                for model_key, model_info in model_list.items():
-                    if model_path_with_slash in model_info["location"] or model_path_with_backslash in model_info["location"]:
-                        matching_key = model_key
-                        break
-                
-                if matching_key:
-                    model_path = matching_key
-                else:
-                    print(f"Model {model_path} not found.")
-                    return
-            else:
-                print(f"Model {model_path} not found.")
-                return
+        # Direct lookup, or path-based lookup for "name:tag"
+        model_key = model_registry.find(model_path)
+        if model_key is None:
+            print(f"Model {model_path} not found.")
+            return
 
-        model_info = model_list.pop(model_path)
+        model_list = model_registry.models()
+        model_info = model_list.pop(model_key)
         model_location = model_info['location']
         model_path = Path(model_location)
+        removed_keys = [model_key]
 
         # Delete the model files
         model_deleted = False
@@ -770,6 +925,7 @@ def remove_model(model_path):
                 
                 for key in projector_keys:
                     projector_info = model_list.pop(key)
+                    removed_keys.append(key)
                     projector_location = Path(projector_info['location'])
                     if projector_location.exists():
                         if projector_location.is_file():
@@ -779,8 +935,12 @@ def remove_model(model_path):
                         print(f"Deleted projector: {projector_location}")
 
         # Update the model list file
-        with open(NEXA_MODEL_LIST_PATH, "w") as f:
-            json.dump(model_list, f, indent=2)
+        model_registry.remove(*removed_keys)
+
+        # Free the stored files no other model links to
+        freed = blob_store.gc()
+        if freed:
+            print(f"Freed {freed / (1024 ** 3):.2f} GB of unreferenced model files")
 
         print(f"Model {model_path} removed from the list.")
         return model_location
@@ -4,6 +4,7 @@ import os
 import ctypes
 
 from typing import (
+    Any,
     Dict,
     List,
     Optional,
@@ -62,12 +63,67 @@ class _LlamaModel:
 
         self._exit_stack.callback(free_model)
 
+        # Detokenization is a lookup into these tables, built on first use
+        self._bos = self.token_bos()
+        self._pieces: Optional[List[bytes]] = None
+        self._special_pieces: Dict[int, bytes] = {}
+
     def close(self):
         self._exit_stack.close()
 
     def __del__(self):
         self.close()
 
+    def _piece_table(self) -> List[bytes]:
+        """Piece of every token, rendered once on first use."""
+        if self._pieces is None:
+            self._build_piece_table()
+        return self._pieces
+
+    def _build_piece_table(self):
+        """Render every token once, with and without special tokens.
+
+        Only the (few) tokens whose special rendering differs are kept in
+        `_special_pieces`."""
+        assert self.model is not None
+        size = 64
+        buffer = (ctypes.c_char * size)()
+
+        def render(token: int, special: bool) -> bytes:
+            nonlocal size, buffer
+            n = llama_cpp.llama_token_to_piece(
+                self.model, llama_cpp.llama_token(token), buffer, size, 0, special
+            )
+            if n < 0:
+                size = -n
+                buffer = (ctypes.c_char * size)()
+                n = llama_cpp.llama_token_to_piece(
+                    self.model, llama_cpp.llama_token(token), buffer, size, 0, special
+                )
+            return buffer.raw[:n]
+
+        pieces = []
+        special_pieces = {}
+        for token in range(self.n_vocab()):
+            piece = render(token, False)
+            pieces.append(piece)
+            special_piece = render(token, True)
+            if special_piece != piece:
+                special_pieces[token] = special_piece
+        self._special_pieces = special_pieces
+        self._pieces = pieces
+
+    def token_piece(self, token: int, special: bool = False) -> bytes:
+        """The bytes a single token renders to."""
+        pieces = self._piece_table()
+        if not 0 <= token < len(pieces):
+            raise ValueError(f"Invalid token id {token} for a vocabulary of {len(pieces)}")
+        if special:
+            piece = self._special_pieces.get(token)
+            if piece is not None:
+                return piece
+        return pieces[token]
+
     def vocab_type(self) -> int:
         assert self.model is not None
         return llama_cpp.llama_vocab_type(self.model)
@@ -209,27 +265,25 @@ class _LlamaModel:
         return list(tokens[:n_tokens])
 
     def token_to_piece(self, token: int, special: bool = False) -> bytes:
-        assert self.model is not None
-        buf = ctypes.create_string_buffer(32)
-        llama_cpp.llama_token_to_piece(self.model, token, buf, 32, 0, special)
-        return bytes(buf)
+        return self.token_piece(token, special)
 
     def detokenize(self, tokens: List[int], special: bool = False) -> bytes:
-        assert self.model is not None
-        output = b""
-        size = 32
-        buffer = (ctypes.c_char * size)()
-        for token in tokens:
-            n = llama_cpp.llama_token_to_piece(
-                self.model, llama_cpp.llama_token(token), buffer, size, 0, special
+        pieces = self._piece_table()
+        if len(tokens) > 0 and not (0 <= min(tokens) and max(tokens) < len(pieces)):
+            token = next(t for t in tokens if not 0 <= t < len(pieces))
+            raise ValueError(f"Invalid token id {token} for a vocabulary of {len(pieces)}")
+        if special and self._special_pieces:
+            special_pieces = self._special_pieces
+            output = b"".join(
+                [special_pieces.get(token, pieces[token]) for token in tokens]
             )
-            assert n <= size
-            output += bytes(buffer[:n])
+        else:
+            output = b"".join([pieces[token] for token in tokens])
         # NOTE: Llama1 models automatically added a space at the start of the prompt
         # this line removes a leading space if the first token is a beginning of sentence token
         return (
             output[1:]
-            if len(tokens) > 0 and tokens[0] == self.token_bos() and output[0:1] == b" "
+            if len(tokens) > 0 and tokens[0] == self._bos and output[0:1] == b" "
             else output
         )
 
@@ -581,7 +635,17 @@ class _LlamaBatch:
             self.batch.seq_id[j][0] = seq_id
             self.batch.n_seq_id[j] = 1
             self.batch.logits[j] = logits_all
-        self.batch.logits[n_tokens - 1] = True
+        self.batch.logits[n_tokens0 + n_tokens - 1] = True
+
+    def add_token(self, token: int, pos: int, seq_id: int, logits: bool):
+        assert self.batch is not None
+        j = self.batch.n_tokens
+        self.batch.token[j] = token
+        self.batch.pos[j] = pos
+        self.batch.seq_id[j][0] = seq_id
+        self.batch.n_seq_id[j] = 1
+        self.batch.logits[j] = logits
+        self.batch.n_tokens += 1
 
 
 class _LlamaTokenDataArray:
@@ -737,9 +801,19 @@ class _LlamaSamplingContext:
     # NOTE: Missing parsed_grammar
     prev: list[int] = field(default_factory=list)
     cur: list[llama_cpp.llama_token_data] = field(default_factory=list)
+    # Buffers reused across sample() calls: the candidate records and a ring
+    # of the last `penalty_last_n` tokens. Repetition penalties only count
+    # occurrences, so the ring does not need to be kept in order.
+    _token_data_array: Optional[_LlamaTokenDataArray] = field(default=None, repr=False)
+    _last_tokens: Any = field(default=None, repr=False)
+    _n_last: int = field(default=0, repr=False)
+    _last_pos: int = field(default=0, repr=False)
+
+    def __post_init__(self):
+        self.set_prev(self.prev)
 
     def reset(self):
-        self.prev = []
+        self.set_prev([])
         self.cur = []
         if self.grammar is not None:
             self.grammar.reset()
@@ -753,6 +827,31 @@ class _LlamaSamplingContext:
             cur=self.cur.copy(),
         )
 
+    def set_prev(self, prev: list[int]):
+        """Replace the token history and rebuild the penalty window from it."""
+        self.prev = prev
+        n = max(self.params.penalty_last_n, 0)
+        if self._last_tokens is None or len(self._last_tokens) != n:
+            self._last_tokens = (llama_cpp.llama_token * n)()
+        self._n_last = 0
+        self._last_pos = 0
+        for token in prev[max(len(prev) - n, 0) :] if n > 0 else ():
+            self._push_last(token)
+
+    def extend_prev(self, tokens: Sequence[int]):
+        """Append tokens that were evaluated without being sampled."""
+        for token in tokens:
+            self.prev.append(token)
+            self._push_last(token)
+
+    def _push_last(self, token: int):
+        n = len(self._last_tokens)
+        if n == 0:
+            return
+        self._last_tokens[self._last_pos] = token
+        self._last_pos = (self._last_pos + 1) % n
+        self._n_last = min(self._n_last + 1, n)
+
     def last(self) -> Optional[int]:
         if len(self.prev) > 0:
             return self.prev[-1]
@@ -772,33 +871,30 @@ class _LlamaSamplingContext:
         id: int = 0
 
         if logits_array is None:
+            # A view is enough, the logits are copied into the candidates below.
             logits = ctx_main.get_logits_ith(idx)
-            logits_array = np.array(
-                ctypes.cast(logits, ctypes.POINTER(ctypes.c_float * n_vocab)).contents,
-                dtype=np.single,
-            )
+            logits_array = np.ctypeslib.as_array(logits, shape=(n_vocab,))
+
+        token_data_array = self._token_data_array
+        if token_data_array is None or token_data_array.n_vocab != n_vocab:
+            token_data_array = _LlamaTokenDataArray(n_vocab=n_vocab)
+            self._token_data_array = token_data_array
+        token_data_array.copy_logits(logits_array)
+        candidates_logit = token_data_array.candidates_data.logit
 
         # apply logit_bias
         for token, logit_bias in self.params.logit_bias.items():
-            logits_array[token] += logit_bias
-
-        token_data_array = _LlamaTokenDataArray(
-            n_vocab=n_vocab
-        )  # TODO: Only create this once
-        token_data_array.copy_logits(logits_array)
+            candidates_logit[token] += logit_bias
 
         # apply penalties
         if len(self.prev) > 0:
             nl_token = ctx_main.model.token_nl()
-            nl_logit = logits_array[nl_token]
-            last_tokens = self.prev[-self.params.penalty_last_n :]
-            last_tokens_size = min(len(last_tokens), self.params.penalty_last_n)
-            if last_tokens_size > 0:
-                last_tokens_p = (llama_cpp.llama_token * len(last_tokens))(*last_tokens)
+            nl_logit = candidates_logit[nl_token]
+            if self._n_last > 0:
                 ctx_main.sample_repetition_penalties(
                     token_data_array,
-                    last_tokens_p,
-                    last_tokens_size,
+                    self._last_tokens,
+                    self._n_last,
                     self.params.penalty_repeat,
                     self.params.penalty_freq,
                     self.params.penalty_present,
@@ -857,4 +953,5 @@ class _LlamaSamplingContext:
     def accept(self, ctx_main: _LlamaContext, id: int, apply_grammar: bool):
         if apply_grammar and self.grammar is not None:
             ctx_main.grammar_accept_token(self.grammar, id)
-        self.prev.append(id)
\ No newline at end of file
+        self.prev.append(id)
+        self._push_last(id)
\ No newline at end of file
@@ -24,6 +24,7 @@ from typing import (
     Deque,
     Callable,
     Dict,
+    Tuple,
 )
 from collections import deque
 from pathlib import Path
@@ -32,7 +33,12 @@ from pathlib import Path
 from nexa.gguf.llama.llama_types import *
 from nexa.gguf.llama.llama_grammar import LlamaGrammar
 from nexa.gguf.llama.llama_cache import BaseLlamaCache
-from nexa.gguf.llama.llama_tokenizer import BaseLlamaTokenizer, LlamaTokenizer
+from nexa.gguf.llama.llama_logits import KeptRows, LlamaLogits
+from nexa.gguf.llama.llama_tokenizer import (
+    BaseLlamaTokenizer,
+    IncrementalDetokenizer,
+    LlamaTokenizer,
+)
 import nexa.gguf.llama.llama_cpp as llama_cpp
 import nexa.gguf.llama.llama_chat_format as llama_chat_format
 
@@ -77,6 +83,7 @@ class Llama:
         seed: int = llama_cpp.LLAMA_DEFAULT_SEED,
         n_ctx: int = 512,
         n_batch: int = 512,
+        n_seq_max: int = 1,
         n_threads: Optional[int] = None,
         n_threads_batch: Optional[int] = None,
         rope_scaling_type: Optional[
@@ -91,6 +98,8 @@ class Llama:
         yarn_beta_slow: float = 1.0,
         yarn_orig_ctx: int = 0,
         logits_all: bool = True,  # switch
+        logits_storage: Optional[str] = None,
+        logits_storage_size: Optional[int] = None,
         embedding: bool = False,
         offload_kqv: bool = True,
         flash_attn: bool = False,
@@ -158,6 +167,7 @@ class Llama:
             seed: RNG seed, -1 for random
             n_ctx: Text context, 0 = from model
             n_batch: Prompt processing maximum batch size
+            n_seq_max: Maximum number of sequences that can be decoded in parallel in one context
             n_threads: Number of threads to use for generation
             n_threads_batch: Number of threads to use for batch processing
             rope_scaling_type: RoPE scaling type, from `enum llama_rope_scaling_type`. ref: https://github.com/ggerganov/llama.cpp/pull/2054
@@ -170,6 +180,8 @@ class Llama:
             yarn_beta_slow: YaRN high correction dim
             yarn_orig_ctx: YaRN original context size
             logits_all: Return logits for all tokens, not just the last token. Must be True for completion to return logprobs.
+            logits_storage: Which logits to keep between calls: "full" (every position), "topk" (the `logits_storage_size` largest logits of every position, enough for logprobs up to that many), "ring" (the last `logits_storage_size` positions) or "last". Defaults to "full" if `logits_all` else "last". Outside "full", `scores` only has the rows that are still kept.
+            logits_storage_size: Number of logits per position for "topk" (default 20) or of positions for "ring" (default 16).
             embedding: Embedding mode only.
             offload_kqv: Offload K, Q, V to GPU.
             flash_attn: Use flash attention.
@@ -243,7 +255,7 @@ class Llama:
             )  # keep a reference to the array so it is not gc'd
             self.model_params.tensor_split = self._c_tensor_split
         self.model_params.vocab_only = vocab_only
-        self.model_params.use_mmap = use_mmap if lora_path is None else False
+        self.model_params.use_mmap = use_mmap if not lora_path else False
         self.model_params.use_mlock = use_mlock
 
         # kv_overrides is the original python dict
@@ -309,6 +321,7 @@ class Llama:
         self.context_params.seed = seed
         self.context_params.n_ctx = n_ctx
         self.context_params.n_batch = self.n_batch
+        self.context_params.n_seq_max = n_seq_max
         self.context_params.n_threads = self.n_threads
         self.context_params.n_threads_batch = self.n_threads_batch
         self.context_params.rope_scaling_type = (
@@ -440,6 +453,7 @@ class Llama:
         self._chat_handlers: Dict[str, llama_chat_format.LlamaChatCompletionHandler] = (
             {}
         )
+        self._chat_formatters: Dict[str, llama_chat_format.ChatFormatter] = {}
 
         self.draft_model = draft_model
 
@@ -453,14 +467,34 @@ class Llama:
 
         self.n_tokens = 0
         self.input_ids: npt.NDArray[np.intc] = np.ndarray((n_ctx,), dtype=np.intc)
-        self.scores: npt.NDArray[np.single] = np.ndarray(
-            (n_ctx, self._n_vocab), dtype=np.single
+        if logits_storage is None:
+            logits_storage = "full" if logits_all else "last"
+        self.logits_storage = logits_storage
+        self.logits_storage_size = logits_storage_size
+        n_live = (logits_storage_size or 16) if logits_storage == "ring" else 1
+        if draft_model is not None:
+            # Drafted tokens are checked against the rows of the whole eval call
+            n_live = max(n_live, 1 + getattr(draft_model, "num_pred_tokens", self.n_batch))
+        self._logits = LlamaLogits(
+            self._n_ctx,
+            self._n_vocab,
+            mode=logits_storage,
+            top_k=logits_storage_size or 20,
+            n_live=n_live,
         )
 
         self._mirostat_mu = ctypes.c_float(
             2.0 * 5.0
         )  # TODO: Move this to sampling context
 
+        # Sampler reused across sample() calls of one generation, see
+        # _get_sampling_context.
+        self._sampling_context: Optional[_LlamaSamplingContext] = None
+
+        # Scratch rows for _top_logprobs
+        self._logprobs_buffer: Optional[npt.NDArray[np.single]] = None
+        self._exp_buffer: Optional[npt.NDArray[np.single]] = None
+
         try:
             self.metadata = self._model.metadata()
         except Exception as e:
@@ -500,12 +534,13 @@ class Llama:
             )
 
         for name, template in template_choices.items():
-            self._chat_handlers[name] = llama_chat_format.Jinja2ChatFormatter(
+            self._chat_formatters[name] = llama_chat_format.Jinja2ChatFormatter(
                 template=template,
                 eos_token=eos_token,
                 bos_token=bos_token,
                 stop_token_ids=[eos_token_id],
-            ).to_chat_handler()
+            )
+            self._chat_handlers[name] = self._chat_formatters[name].to_chat_handler()
 
         if (
             self.chat_format is None
@@ -553,8 +588,15 @@ class Llama:
         return self.input_ids[: self.n_tokens]
 
     @property
-    def _scores(self) -> npt.NDArray[np.single]:
-        return self.scores[: self.n_tokens, :]
+    def scores(self) -> Union[npt.NDArray[np.single], KeptRows]:
+        """Logits of the evaluated positions, indexed by position.
+
+        With logits_storage="full" this is the array of every row. With the
+        other storages only the most recent rows are kept: `scores[pos]` works
+        for them (e.g. `scores[self.n_tokens - 1]`) and raises ValueError for
+        any other position.
+        """
+        return self._logits.kept_rows()
 
     @property
     def eval_tokens(self) -> Deque[int]:
@@ -563,7 +605,7 @@ class Llama:
     @property
     def eval_logits(self) -> Deque[List[float]]:
         return deque(
-            self.scores[: self.n_tokens, :].tolist(),
+            self._logits.recent(self.n_tokens).tolist(),
             maxlen=self._n_ctx if self.context_params.logits_all else 1,
         )
 
@@ -620,6 +662,7 @@ class Llama:
     def reset(self):
         """Reset the model state."""
         self.n_tokens = 0
+        self._sampling_context = None
 
     def eval(self, tokens: Sequence[int]):
         """Evaluate a list of tokens.
@@ -629,6 +672,14 @@ class Llama:
         """
         assert self._ctx.ctx is not None
         assert self._batch.batch is not None
+        if (
+            len(tokens) > 0
+            and self._logits.missing_next(self.n_tokens - 1, tokens[0])
+            and self.input_ids[self.n_tokens - 1] >= 0
+        ):
+            # Re-evaluate the last token so that its logits can score tokens[0]
+            self.n_tokens -= 1
+            tokens = [int(self.input_ids[self.n_tokens])] + list(tokens)
         self._ctx.kv_cache_seq_rm(-1, self.n_tokens, -1)
         for i in range(0, len(tokens), self.n_batch):
             batch = tokens[i : min(len(tokens), i + self.n_batch)]
@@ -640,21 +691,12 @@ class Llama:
             self._ctx.decode(self._batch)
             # Save tokens
             self.input_ids[n_past : n_past + n_tokens] = batch
-            # Save logits
-            if self.context_params.logits_all:
-                rows = n_tokens
-                cols = self._n_vocab
-                logits = np.ctypeslib.as_array(
-                    self._ctx.get_logits(), shape=(rows * cols,)
-                )
-                self.scores[n_past : n_past + n_tokens, :].reshape(-1)[::] = logits
-            else:
-                rows = 1
-                cols = self._n_vocab
-                logits = np.ctypeslib.as_array(
-                    self._ctx.get_logits(), shape=(rows * cols,)
-                )
-                self.scores[n_past + n_tokens - 1, :].reshape(-1)[::] = logits
+            # Save logits, as far as the storage keeps them
+            rows = n_tokens if self.context_params.logits_all else 1
+            logits = np.ctypeslib.as_array(
+                self._ctx.get_logits(), shape=(rows, self._n_vocab)
+            )
+            self._logits.store(n_past, batch, logits)
             # Update n_tokens
             self.n_tokens += n_tokens
 
@@ -693,10 +735,9 @@ class Llama:
         assert self._ctx is not None
         assert self.n_tokens > 0
 
-        if idx is None:
-            logits: npt.NDArray[np.single] = self._scores[-1, :]
-        else:
-            logits = self._scores[idx, :]
+        logits: npt.NDArray[np.single] = self._logits.row(
+            self.n_tokens - 1 if idx is None else idx
+        )
 
         if logits_processor is not None:
             logits[:] = (
@@ -721,11 +762,7 @@ class Llama:
             mirostat_eta=mirostat_eta,
             penalize_nl=penalize_nl,
         )
-        sampling_context = _LlamaSamplingContext(
-            params=sampling_params,
-            grammar=grammar,
-        )
-        sampling_context.prev = list(self.eval_tokens)
+        sampling_context = self._get_sampling_context(sampling_params, grammar)
         id = sampling_context.sample(ctx_main=self._ctx, logits_array=logits)
         sampling_context.accept(
             ctx_main=self._ctx,
@@ -734,17 +771,13 @@ class Llama:
         )
 
         if logprobs is not None and (top_logprobs is not None and top_logprobs > 0):
-            sampled_logprobs = self.logits_to_logprobs(logits)
+            sampled_logprobs, top_indices = self._top_logprobs(logits, top_logprobs)
             token_logprob = float(sampled_logprobs[id])
 
-            top_logprobs_dict = None
-            if top_logprobs is not None:
-                sorted_indices = sampled_logprobs.argsort()[::-1]
-                top_indices = sorted_indices[:top_logprobs]
-                top_logprobs_dict = {
-                    self.detokenize([i]).decode("utf-8", errors="ignore"): float(sampled_logprobs[i])
-                    for i in top_indices
-                }
+            top_logprobs_dict = {
+                self.detokenize([i]).decode("utf-8", errors="ignore"): float(sampled_logprobs[i])
+                for i in top_indices.tolist()
+            }
 
             return {
                 "token": id,
@@ -754,6 +787,63 @@ class Llama:
         else:
             return id
 
+    def _top_logprobs(
+        self, logits: npt.NDArray[np.single], k: int
+    ) -> Tuple[npt.NDArray[np.single], npt.NDArray[np.intp]]:
+        """Log-softmax of `logits` and the ids of the `k` most likely tokens, best first.
+
+        Only the top `k` entries are sorted. The log-probabilities are written
+        to a buffer reused across calls, so they are only valid until the next
+        call.
+        """
+        buffer = self._logprobs_buffer
+        if buffer is None or buffer.shape != logits.shape:
+            buffer = self._logprobs_buffer = np.empty(logits.shape, dtype=np.single)
+            self._exp_buffer = np.empty(logits.shape, dtype=np.single)
+        logits_max = np.amax(logits)
+        if not np.isfinite(logits_max):
+            logits_max = 0
+        np.subtract(logits, logits_max, out=buffer, dtype=np.single)
+        np.exp(buffer, out=self._exp_buffer)
+        # Suppress warnings about log of zero
+        with np.errstate(divide="ignore"):
+            buffer -= np.log(np.sum(self._exp_buffer))
+        k = min(k, buffer.shape[-1])
+        if k <= 0:
+            return buffer, np.empty((0,), dtype=np.intp)
+        top = np.argpartition(buffer, -k)[-k:]
+        return buffer, top[np.argsort(buffer[top])[::-1]]
+
+    def _get_sampling_context(
+        self, params: _LlamaSamplingParams, grammar: Optional[LlamaGrammar]
+    ) -> _LlamaSamplingContext:
+        """Return a sampling context whose history matches the evaluated tokens.
+
+        The context (with its candidate buffer and penalty window) is kept
+        while the parameters stay the same and tokens are only appended, so a
+        generation step only feeds in the tokens evaluated since the last
+        call instead of copying the whole history.
+        """
+        sampling_context = self._sampling_context
+        if (
+            sampling_context is None
+            or sampling_context.params != params
+            or sampling_context.grammar is not grammar
+            or len(sampling_context.prev) > self.n_tokens
+        ):
+            sampling_context = _LlamaSamplingContext(
+                params=params,
+                mirostat_mu=self._mirostat_mu,
+                grammar=grammar,
+                prev=self._input_ids.tolist(),
+            )
+            self._sampling_context = sampling_context
+        elif len(sampling_context.prev) < self.n_tokens:
+            sampling_context.extend_prev(
+                self.input_ids[len(sampling_context.prev) : self.n_tokens].tolist()
+            )
+        return sampling_context
+
     def generate(
         self,
         tokens: Sequence[int],
@@ -798,6 +888,7 @@ class Llama:
         """
         # Reset mirostat sampling
         self._mirostat_mu = ctypes.c_float(2.0 * mirostat_tau)
+        self._sampling_context = None
 
         # Check for kv cache prefix match
         if reset and self.n_tokens > 0:
@@ -860,7 +951,7 @@ class Llama:
 
                 sample_idx += 1
                 if stopping_criteria is not None and stopping_criteria(
-                    self._input_ids, self._scores[-1, :]
+                    self._input_ids, self._logits.row(self.n_tokens - 1)
                 ):
                     return
                 tokens_or_none = yield token, logprobs_info
@@ -871,6 +962,7 @@ class Llama:
 
                 if sample_idx < self.n_tokens and token != self._input_ids[sample_idx]:
                     self.n_tokens = sample_idx
+                    self._sampling_context = None
                     self._ctx.kv_cache_seq_rm(-1, self.n_tokens, -1)
                     break
 
@@ -962,6 +1054,20 @@ class Llama:
         else:
             inputs = input
 
+        if not logits_all:
+            # Pooled models go through the packed embedding engine
+            from nexa.gguf.llama.llama_embedding import LlamaEmbedder
+
+            embeddings, total_tokens = LlamaEmbedder(self).embed(
+                inputs, normalize=normalize, truncate=truncate, return_count=True
+            )
+            if self.verbose:
+                llama_cpp.llama_print_timings(self._ctx.ctx)
+            output = embeddings[0].tolist() if isinstance(input, str) else embeddings.tolist()
+            if return_count:
+                return output, total_tokens
+            return output
+
         # reset batch
         self._batch.reset()
 
@@ -1047,6 +1153,145 @@ class Llama:
         else:
             return output
 
+    def score_continuations(
+        self,
+        context: Sequence[int],
+        continuations: Sequence[Sequence[int]],
+    ) -> List[Tuple[float, bool]]:
+        """Score several continuations of the same context.
+
+        The context is evaluated once (reusing any matching prefix already in
+        the KV cache) and every continuation is decoded on top of it: on a copy
+        of the context's KV cache under its own sequence id when the context
+        was created with `n_seq_max > 1`, so that several continuations share
+        one decode call, or one after the other on the main sequence otherwise.
+
+        Args:
+            context: The context tokens, must not be empty.
+            continuations: The tokens of each continuation.
+
+        Returns:
+            For each continuation, the sum of its token log-probabilities and
+            whether every token is the most likely one (greedy).
+        """
+        assert self._ctx.ctx is not None
+        if len(context) == 0:
+            raise ValueError("context must contain at least one token")
+        n_context = len(context)
+        if n_context + max((len(c) for c in continuations), default=0) > self._n_ctx:
+            raise ValueError(
+                f"Requested tokens exceed context window of {self._n_ctx}"
+            )
+
+        # Re-evaluate at least the last context token to get its logits
+        prefix = Llama.longest_token_prefix(
+            self._input_ids.tolist(), context[: n_context - 1]
+        )
+        self.n_tokens = prefix
+        self._sampling_context = None
+        self.eval(context[prefix:])
+        first_logprobs = Llama.logits_to_logprobs(self._logits.row(n_context - 1))
+
+        # Forked continuations share the context's KV cells but each needs
+        # cells of its own, so a group is limited by the free context too.
+        n_forks = self.context_params.n_seq_max - 1
+        groups: List[List[Sequence[int]]] = []
+        n_free = 0
+        for tokens in continuations:
+            if (
+                not groups
+                or len(groups[-1]) >= max(n_forks, 1)
+                or len(tokens) > n_free
+            ):
+                groups.append([])
+                n_free = self._n_ctx - n_context
+            groups[-1].append(tokens)
+            n_free -= len(tokens)
+
+        results: List[Tuple[float, bool]] = []
+        batch = self._batch
+        for group in groups:
+            sums = [0.0] * len(group)
+            greedy = [True] * len(group)
+            for j, tokens in enumerate(group):
+                if len(tokens) > 0:
+                    sums[j] += float(first_logprobs[tokens[0]])
+                    greedy[j] = int(np.argmax(first_logprobs)) == tokens[0]
+                if n_forks > 0:
+                    self._ctx.kv_cache_seq_cp(0, j + 1, -1, -1)
+
+            # Feed each continuation but its last token; the logits at
+            # position p score token p + 1.
+            pending = [
+                (j, p)
+                for j, tokens in enumerate(group)
+                for p in range(len(tokens) - 1)
+            ]
+            for start in range(0, len(pending), self.n_batch):
+                chunk = pending[start : start + self.n_batch]
+                batch.reset()
+                for j, p in chunk:
+                    seq_id = j + 1 if n_forks > 0 else 0
+                    batch.add_token(group[j][p], n_context + p, seq_id, True)
+                self._ctx.decode(batch)
+                logprobs = Llama.logits_to_logprobs(
+                    np.ctypeslib.as_array(
+                        self._ctx.get_logits(), shape=(len(chunk), self._n_vocab)
+                    )
+                )
+                targets = np.fromiter(
+                    (group[j][p + 1] for j, p in chunk), dtype=np.intp, count=len(chunk)
+                )
+                rows = np.arange(len(chunk))
+                target_logprobs = logprobs[rows, targets].tolist()
+                is_top = (np.argmax(logprobs, axis=-1) == targets).tolist()
+                for (j, _), logprob, top in zip(chunk, target_logprobs, is_top):
+                    sums[j] += logprob
+                    greedy[j] = greedy[j] and top
+            batch.reset()
+
+            if n_forks > 0:
+                for j in range(len(group)):
+                    self._ctx.kv_cache_seq_rm(j + 1, -1, -1)
+            else:
+                self._ctx.kv_cache_seq_rm(0, n_context, -1)
+            results.extend(zip(sums, greedy))
+        return results
+
+    def _stream_logprobs(
+        self,
+        token: int,
+        token_str: str,
+        text_offset: int,
+        score_index: int,
+        logprobs: int,
+        logprobs_info: Optional[Dict[str, Any]] = None,
+    ) -> CompletionLogprobs:
+        """Logprobs of a single streamed token.
+
+        The values computed by `sample` for the token (`logprobs_info`) are
+        reused when available, otherwise they are looked up for position
+        `score_index` in the logits storage."""
+        if logprobs_info is not None:
+            token_logprob = logprobs_info["token_logprob"]
+            top_logprob = dict(logprobs_info["top_logprobs"])
+        else:
+            token_logprobs, top_ids, top_values = self._logits.logprobs(
+                score_index, [int(token)], logprobs
+            )
+            token_logprob = token_logprobs[0]
+            top_logprob = {
+                self.detokenize([i]).decode("utf-8", errors="ignore"): value
+                for i, value in zip(top_ids[0], top_values[0])
+            }
+        top_logprob.update({token_str: token_logprob})
+        return {
+            "tokens": [token_str],
+            "text_offset": [text_offset],
+            "token_logprobs": [token_logprob],
+            "top_logprobs": [top_logprob],
+        }
+
     def _create_completion(
         self,
         prompt: Union[str, List[int]],
@@ -1218,9 +1463,17 @@ class Llama:
         else:
             stop_sequences = []
 
-        if logprobs is not None and self.context_params.logits_all is False:
+        if logprobs is not None and not self._logits.has_logprobs:
+            raise ValueError(
+                f"logprobs is not supported for models created with logits_storage={self.logits_storage!r}"
+            )
+        if (
+            logprobs is not None
+            and self.logits_storage == "topk"
+            and logprobs > self._logits.top_k
+        ):
             raise ValueError(
-                "logprobs is not supported for models created with logits_all=False"
+                f"logprobs must be at most {self._logits.top_k} with logits_storage='topk'"
             )
         
         if self.cache:
@@ -1244,8 +1497,14 @@ class Llama:
             self._ctx.set_rng_seed(seed)
 
         finish_reason = "length"
-        multibyte_fix = 0
         logprobs_or_none = None
+        detokenizer = IncrementalDetokenizer(self.tokenizer_, prompt_tokens)
+        for token in completion_tokens:
+            detokenizer.push(token)
+        stop_matcher = StopSequenceMatcher(stop_sequences)
+        returned_bytes = 0
+        # Logprobs computed by the sampler, by index into completion_tokens
+        sampled_logprobs: Dict[int, Dict[str, Any]] = {}
 
         for token, logprobs_info in self.generate(
             prompt_tokens,
@@ -1269,11 +1528,12 @@ class Llama:
         ):
             assert self._model.model is not None
             if llama_cpp.llama_token_is_eog(self._model.model, token):
-                text = self.detokenize(completion_tokens, prev_tokens=prompt_tokens)
+                text = bytes(detokenizer.text)
                 finish_reason = "stop"
                 break
 
             completion_tokens.append(token)
+            piece = detokenizer.push(token)
 
             if logprobs_info and logprobs_or_none is None:
                 logprobs_or_none = {
@@ -1284,113 +1544,47 @@ class Llama:
                 }
 
             if logprobs_info:
-                logprobs_or_none["tokens"].append(self.detokenize([token]).decode("utf-8", errors="ignore"))
-                logprobs_or_none["text_offset"].append(len(self.detokenize(completion_tokens[:-1])))
+                sampled_logprobs[len(completion_tokens) - 1] = logprobs_info
+                logprobs_or_none["tokens"].append(piece.decode("utf-8", errors="ignore"))
+                logprobs_or_none["text_offset"].append(detokenizer.offsets[-2])
                 logprobs_or_none["token_logprobs"].append(logprobs_info["token_logprob"])
                 logprobs_or_none["top_logprobs"].append(logprobs_info["top_logprobs"])
 
-            all_text = self.detokenize(completion_tokens, prev_tokens=prompt_tokens)
-
-            # Contains multi-byte UTF8
-            for k, char in enumerate(all_text[-3:]):
-                k = 3 - k
-                for num, pattern in [(2, 192), (3, 224), (4, 240)]:
-                    # Bitwise AND check
-                    if num > k and pattern & char == pattern:
-                        multibyte_fix = num - k
+            stop_position = stop_matcher.feed(piece)
+            if stop_position >= 0:
+                text = bytes(detokenizer.text[:stop_position])
+                finish_reason = "stop"
+                break
 
             # Stop incomplete bytes from passing
-            if multibyte_fix > 0:
-                multibyte_fix -= 1
+            if detokenizer.incomplete_bytes > 0:
                 continue
 
-            any_stop = [s for s in stop_sequences if s in all_text]
-            if len(any_stop) > 0:
-                first_stop = any_stop[0]
-                text = all_text[: all_text.index(first_stop)]
-                finish_reason = "stop"
-                break
-
             if stream:
-                remaining_tokens = completion_tokens[returned_tokens:]
-                remaining_text = self.detokenize(
-                    remaining_tokens,
-                    prev_tokens=prompt_tokens + completion_tokens[:returned_tokens],
-                )
-                remaining_length = len(remaining_text)
-
                 # We want to avoid yielding any characters from
                 # the generated text if they are part of a stop
                 # sequence.
-                first_stop_position = 0
-                for s in stop_sequences:
-                    for i in range(min(len(s), remaining_length), 0, -1):
-                        if remaining_text.endswith(s[:i]):
-                            if i > first_stop_position:
-                                first_stop_position = i
-                            break
-
-                token_end_position = 0
+                safe_end = len(detokenizer.text) - stop_matcher.partial
 
                 if logprobs is not None:
-                    # not sure how to handle this branch when dealing
-                    # with CJK output, so keep it unchanged
-                    for token in remaining_tokens:
+                    while (
+                        returned_tokens < len(completion_tokens)
+                        and detokenizer.offsets[returned_tokens + 1] <= safe_end
+                    ):
+                        token = completion_tokens[returned_tokens]
+                        returned_tokens += 1
                         if token == bos_token_id:
                             continue
-                        token_end_position += len(
-                            self.detokenize(
-                                [token],
-                                prev_tokens=prompt_tokens
-                                + completion_tokens[:returned_tokens],
-                            )
-                        )
-                        # Check if stop sequence is in the token
-                        if token_end_position > (
-                            remaining_length - first_stop_position
-                        ):
-                            break
-                        token_str = self.detokenize(
-                            [token],
-                            prev_tokens=prompt_tokens
-                            + completion_tokens[:returned_tokens],
-                        ).decode("utf-8", errors="ignore")
-                        text_offset = len(prompt) + len(
-                            self.detokenize(
-                                completion_tokens[:returned_tokens],
-                                prev_tokens=prompt_tokens
-                                + completion_tokens[:returned_tokens],
-                            ).decode("utf-8", errors="ignore")
-                        )
-                        token_offset = len(prompt_tokens) + returned_tokens
-                        logits = self._scores[token_offset - 1, :]
-                        current_logprobs = Llama.logits_to_logprobs(logits).tolist()
-                        sorted_logprobs = list(
-                            sorted(
-                                zip(current_logprobs, range(len(current_logprobs))),
-                                reverse=True,
-                            )
+                        start = detokenizer.offsets[returned_tokens - 1]
+                        end = detokenizer.offsets[returned_tokens]
+                        logprobs_or_none = self._stream_logprobs(
+                            token,
+                            bytes(detokenizer.text[start:end]).decode("utf-8", errors="ignore"),
+                            len(prompt) + detokenizer.char_offsets[returned_tokens - 1],
+                            len(prompt_tokens) + returned_tokens - 2,
+                            logprobs,
+                            sampled_logprobs.get(returned_tokens - 1),
                         )
-                        top_logprob = {
-                            self.detokenize([i]).decode(
-                                "utf-8", errors="ignore"
-                            ): logprob
-                            for logprob, i in sorted_logprobs[:logprobs]
-                        }
-                        top_logprob.update({token_str: current_logprobs[int(token)]})
-                        logprobs_or_none = {
-                            "tokens": [
-                                self.detokenize(
-                                    [token],
-                                    prev_tokens=prompt_tokens
-                                    + completion_tokens[:returned_tokens],
-                                ).decode("utf-8", errors="ignore")
-                            ],
-                            "text_offset": [text_offset],
-                            "token_logprobs": [current_logprobs[int(token)]],
-                            "top_logprobs": [top_logprob],
-                        }
-                        returned_tokens += 1
                         yield {
                             "id": completion_id,
                             "object": "text_completion",
@@ -1398,137 +1592,75 @@ class Llama:
                             "model": model_name,
                             "choices": [
                                 {
-                                    "text": self.detokenize(
-                                        [token],
-                                        prev_tokens=prompt_tokens
-                                        + completion_tokens[:returned_tokens],
-                                    ).decode("utf-8", errors="ignore"),
+                                    "text": logprobs_or_none["tokens"][0],
                                     "index": 0,
                                     "logprobs": logprobs_or_none,
                                     "finish_reason": None,
                                 }
                             ],
                         }
-                else:
-                    while len(remaining_tokens) > 0:
-                        decode_success = False
-                        for i in range(1, len(remaining_tokens) + 1):
-                            try:
-                                bs = self.detokenize(
-                                    remaining_tokens[:i],
-                                    prev_tokens=prompt_tokens
-                                    + completion_tokens[:returned_tokens],
-                                )
-                                ts = bs.decode("utf-8")
-                                decode_success = True
-                                break
-                            except UnicodeError:
-                                pass
-                        else:
-                            break
-                        if not decode_success:
-                            # all remaining tokens cannot be decoded to a UTF-8 character
-                            break
-                        token_end_position += len(bs)
-                        if token_end_position > (
-                            remaining_length - first_stop_position
-                        ):
-                            break
-                        remaining_tokens = remaining_tokens[i:]
-                        returned_tokens += i
+                    returned_bytes = detokenizer.offsets[returned_tokens]
+                elif safe_end > returned_bytes:
+                    ts = bytes(detokenizer.text[returned_bytes:safe_end]).decode(
+                        "utf-8", errors="ignore"
+                    )
+                    returned_bytes = safe_end
+                    while (
+                        returned_tokens < len(completion_tokens)
+                        and detokenizer.offsets[returned_tokens + 1] <= returned_bytes
+                    ):
+                        returned_tokens += 1
 
-                        yield {
-                            "id": completion_id,
-                            "object": "text_completion",
-                            "created": created,
-                            "model": model_name,
-                            "choices": [
-                                {
-                                    "text": ts,
-                                    "index": 0,
-                                    "logprobs": None,
-                                    "finish_reason": None,
-                                }
-                            ],
-                        }
+                    yield {
+                        "id": completion_id,
+                        "object": "text_completion",
+                        "created": created,
+                        "model": model_name,
+                        "choices": [
+                            {
+                                "text": ts,
+                                "index": 0,
+                                "logprobs": None,
+                                "finish_reason": None,
+                            }
+                        ],
+                    }
 
             if len(completion_tokens) >= max_tokens:
-                text = self.detokenize(completion_tokens, prev_tokens=prompt_tokens)
+                text = bytes(detokenizer.text)
                 finish_reason = "length"
                 break
 
         if stopping_criteria is not None and stopping_criteria(
-            self._input_ids, self._scores[-1, :]
+            self._input_ids, self._logits.row(self.n_tokens - 1)
         ):
-            text = self.detokenize(completion_tokens, prev_tokens=prompt_tokens)
+            text = bytes(detokenizer.text)
             finish_reason = "stop"
 
         if self.verbose:
             self._ctx.print_timings()
 
         if stream:
-            remaining_tokens = completion_tokens[returned_tokens:]
-            all_text = self.detokenize(
-                remaining_tokens,
-                prev_tokens=prompt_tokens + completion_tokens[:returned_tokens],
-            )
-            any_stop = [s for s in stop_sequences if s in all_text]
-            if len(any_stop) > 0:
-                end = min(all_text.index(stop) for stop in any_stop)
-            else:
-                end = len(all_text)
-
-            token_end_position = 0
-            for token in remaining_tokens:
-                token_end_position += len(
-                    self.detokenize(
-                        [token],
-                        prev_tokens=prompt_tokens + completion_tokens[:returned_tokens],
-                    )
-                )
-
-                # logprobs_or_none: Optional[CompletionLogprobs] = None
-                if logprobs is not None:
+            end = len(text)
+            if logprobs is not None:
+                while (
+                    returned_tokens < len(completion_tokens)
+                    and detokenizer.offsets[returned_tokens] < end
+                ):
+                    token = completion_tokens[returned_tokens]
+                    returned_tokens += 1
                     if token == bos_token_id:
                         continue
-                    token_str = self.detokenize([token]).decode(
-                        "utf-8", errors="ignore"
+                    start = detokenizer.offsets[returned_tokens - 1]
+                    token_end = min(detokenizer.offsets[returned_tokens], end)
+                    logprobs_or_none = self._stream_logprobs(
+                        token,
+                        text[start:token_end].decode("utf-8", errors="ignore"),
+                        len(prompt) + detokenizer.char_offsets[returned_tokens - 1],
+                        len(prompt_tokens) + returned_tokens - 2,
+                        logprobs,
+                        sampled_logprobs.get(returned_tokens - 1),
                     )
-                    text_offset = len(prompt) + len(
-                        self.detokenize(
-                            completion_tokens[:returned_tokens],
-                            prev_tokens=prompt_tokens
-                            + completion_tokens[:returned_tokens],
-                        )
-                    )
-                    token_offset = len(prompt_tokens) + returned_tokens - 1
-                    logits = self._scores[token_offset, :]
-                    current_logprobs = Llama.logits_to_logprobs(logits).tolist()
-                    sorted_logprobs = list(
-                        sorted(
-                            zip(current_logprobs, range(len(current_logprobs))),
-                            reverse=True,
-                        )
-                    )
-                    top_logprob = {
-                        self.detokenize([i]).decode("utf-8", errors="ignore"): logprob
-                        for logprob, i in sorted_logprobs[:logprobs]
-                    }
-                    top_logprob.update({token_str: current_logprobs[int(token)]})
-                    logprobs_or_none = {
-                        "tokens": [
-                            self.detokenize([token]).decode("utf-8", errors="ignore")
-                        ],
-                        "text_offset": [text_offset],
-                        "token_logprobs": [current_logprobs[int(token)]],
-                        "top_logprobs": [top_logprob],
-                    }
-
-                if token_end_position >= end:
-                    last_text = self.detokenize([token])
-                    if token_end_position == end - 1:
-                        break
-                    returned_tokens += 1
                     yield {
                         "id": completion_id,
                         "object": "text_completion",
@@ -1536,17 +1668,14 @@ class Llama:
                         "model": model_name,
                         "choices": [
                             {
-                                "text": last_text[
-                                    : len(last_text) - (token_end_position - end)
-                                ].decode("utf-8", errors="ignore"),
+                                "text": logprobs_or_none["tokens"][0],
                                 "index": 0,
                                 "logprobs": logprobs_or_none,
                                 "finish_reason": None,
                             }
                         ],
                     }
-                    break
-                returned_tokens += 1
+            elif end > returned_bytes:
                 yield {
                     "id": completion_id,
                     "object": "text_completion",
@@ -1554,11 +1683,11 @@ class Llama:
                     "model": model_name,
                     "choices": [
                         {
-                            "text": self.detokenize([token]).decode(
+                            "text": text[returned_bytes:end].decode(
                                 "utf-8", errors="ignore"
                             ),
                             "index": 0,
-                            "logprobs": logprobs_or_none,
+                            "logprobs": None,
                             "finish_reason": None,
                         }
                     ],
@@ -1619,41 +1748,34 @@ class Llama:
             else:
                 all_tokens = completion_tokens
 
-            all_token_strs = [
-                self.detokenize([token], prev_tokens=all_tokens[:i]).decode(
-                    "utf-8", errors="ignore"
-                )
-                for i, token in enumerate(all_tokens)
-            ]
-            all_logprobs = Llama.logits_to_logprobs(self._scores)[token_offset:]
-            # TODO: may be able to change this loop to use np.take_along_dim
-            for idx, (token, token_str, logprobs_token) in enumerate(
-                zip(all_tokens, all_token_strs, all_logprobs)
-            ):
+            if echo:
+                all_detokenizer = IncrementalDetokenizer(self.tokenizer_)
+                for token in all_tokens:
+                    all_detokenizer.push(token)
+            else:
+                all_detokenizer = detokenizer
+            all_text = bytes(all_detokenizer.text)
+            n_scored = max(0, min(len(all_tokens), self.n_tokens - token_offset))
+            all_token_logprobs, all_top_indices, all_top_values = self._logits.logprobs(
+                token_offset, all_tokens[:n_scored], logprobs
+            )
+            for idx, token in enumerate(all_tokens[:n_scored]):
                 if token == bos_token_id:
                     continue
-                text_offsets.append(
-                    text_offset
-                    + len(
-                        self.detokenize(all_tokens[:idx]).decode(
-                            "utf-8", errors="ignore"
-                        )
-                    )
-                )
+                token_str = all_text[
+                    all_detokenizer.offsets[idx] : all_detokenizer.offsets[idx + 1]
+                ].decode("utf-8", errors="ignore")
+                text_offsets.append(text_offset + all_detokenizer.char_offsets[idx])
                 tokens.append(token_str)
-                sorted_logprobs = list(
-                    sorted(
-                        zip(logprobs_token, range(len(logprobs_token))), reverse=True
-                    )
-                )
-                token_logprobs.append(logprobs_token[int(token)])
+                token_logprobs.append(all_token_logprobs[idx])
+                prev_tokens = all_tokens[max(0, idx - IncrementalDetokenizer.context) : idx]
                 top_logprob: Optional[Dict[str, float]] = {
-                    self.detokenize([i], prev_tokens=all_tokens[:idx]).decode(
+                    self.detokenize([i], prev_tokens=prev_tokens).decode(
                         "utf-8", errors="ignore"
                     ): logprob
-                    for logprob, i in sorted_logprobs[:logprobs]
+                    for i, logprob in zip(all_top_indices[idx], all_top_values[idx])
                 }
-                top_logprob.update({token_str: logprobs_token[int(token)]})
+                top_logprob.update({token_str: all_token_logprobs[idx]})
                 top_logprobs.append(top_logprob)
             # Weird idosincracy of the OpenAI API where
             # token_logprobs and top_logprobs are null for
@@ -2029,6 +2151,7 @@ class Llama:
             seed=self.context_params.seed,
             n_ctx=self.context_params.n_ctx,
             n_batch=self.n_batch,
+            n_seq_max=self.context_params.n_seq_max,
             n_threads=self.context_params.n_threads,
             n_threads_batch=self.context_params.n_threads_batch,
             rope_scaling_type=self.context_params.rope_scaling_type,
@@ -2041,6 +2164,8 @@ class Llama:
             yarn_beta_slow=self.context_params.yarn_beta_slow,
             yarn_orig_ctx=self.context_params.yarn_orig_ctx,
             logits_all=self.context_params.logits_all,
+            logits_storage=self.logits_storage,
+            logits_storage_size=self.logits_storage_size,
             embedding=self.context_params.embeddings,
             offload_kqv=self.context_params.offload_kqv,
             flash_attn=self.context_params.flash_attn,
@@ -2091,7 +2216,7 @@ class Llama:
                 file=sys.stderr,
             )
         return LlamaState(
-            scores=self._scores.copy(),
+            scores=self._logits.save(self.n_tokens),
             input_ids=self.input_ids.copy(),
             n_tokens=self.n_tokens,
             llama_state=bytes(llama_state_compact),
@@ -2100,11 +2225,16 @@ class Llama:
 
     def load_state(self, state: LlamaState) -> None:
         assert self._ctx.ctx is not None
-        # Only filling in up to `n_tokens` and then zero-ing out the rest
-        self.scores[: state.n_tokens, :] = state.scores.copy()
-        self.scores[state.n_tokens :, :] = 0.0
+        if isinstance(state.scores, np.ndarray):
+            # Saved as a dense (n_tokens, n_vocab) array
+            self._logits.store(
+                0, state.input_ids[: state.n_tokens].tolist(), state.scores
+            )
+        else:
+            self._logits.load(state.scores)
         self.input_ids = state.input_ids.copy()
         self.n_tokens = state.n_tokens
+        self._sampling_context = None
         state_size = state.llama_state_size
         LLamaStateArrayType = ctypes.c_uint8 * state_size
         llama_state = LLamaStateArrayType.from_buffer_copy(state.llama_state)
@@ -2334,7 +2464,7 @@ class LlamaState:
     def __init__(
         self,
         input_ids: npt.NDArray[np.intc],
-        scores: npt.NDArray[np.single],
+        scores: Union[LlamaLogits, npt.NDArray[np.single]],
         n_tokens: int,
         llama_state: bytes,
         llama_state_size: int,
@@ -2384,3 +2514,72 @@ class MinTokensLogitsProcessor(LogitsProcessor):
         if len(input_ids) - self.prompt_tokens < self.min_tokens:
             scores[self.token_eos] = -np.inf
         return scores
+
+
+class StopSequenceMatcher:
+    """Aho-Corasick automaton that finds stop sequences in streamed text.
+
+    Text is fed in pieces as it is generated; each byte costs amortized
+    constant time regardless of the number of stop sequences or the length of
+    the text so far.
+    """
+
+    def __init__(self, stop_sequences: Sequence[bytes]):
+        self._goto: List[Dict[int, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._depth: List[int] = [0]
+        # Length of the longest stop sequence ending in each state, 0 if none
+        self._match: List[int] = [0]
+        for seq in stop_sequences:
+            state = 0
+            for byte in seq:
+                next_state = self._goto[state].get(byte)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][byte] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._depth.append(self._depth[state] + 1)
+                    self._match.append(0)
+                state = next_state
+            if state != 0:
+                self._match[state] = len(seq)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for byte, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and byte not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(byte, 0)
+                if not self._match[next_state]:
+                    self._match[next_state] = self._match[self._fail[next_state]]
+                queue.append(next_state)
+
+        self._state = 0
+        self._pos = 0
+
+    @property
+    def partial(self) -> int:
+        """Length of the longest suffix of the text that starts a stop sequence.
+
+        These bytes must be held back from a stream until it is known whether
+        the stop sequence completes."""
+        return self._depth[self._state]
+
+    def feed(self, data: bytes) -> int:
+        """Advance over `data` and return the offset (into all text fed so far)
+        at which the earliest stop sequence completed by `data` starts, or -1."""
+        goto, fail, match = self._goto, self._fail, self._match
+        state = self._state
+        start = -1
+        for i, byte in enumerate(data, self._pos + 1):
+            while state and byte not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(byte, 0)
+            if match[state] and (start < 0 or i - match[state] < start):
+                start = i - match[state]
+        self._state = state
+        self._pos += len(data)
+        return start
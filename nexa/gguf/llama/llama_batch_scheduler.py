@@ -0,0 +1,470 @@
+from __future__ import annotations
+
+import sys
+import queue
+import ctypes
+import threading
+import contextlib
+
+from typing import (
+    Iterator,
+    List,
+    Optional,
+    Union,
+)
+from collections import deque
+from dataclasses import dataclass, field
+
+import nexa.gguf.llama.llama_cpp as llama_cpp
+import nexa.gguf.llama.llama_chat_format as llama_chat_format
+
+from nexa.gguf.llama.llama import Llama
+from nexa.gguf.llama.llama_tokenizer import IncrementalDetokenizer, incomplete_utf8_suffix
+from nexa.gguf.llama.llama_types import ChatCompletionRequestMessage
+from nexa.gguf.llama._internals_transformers import (
+    _LlamaBatch,  # type: ignore
+    _LlamaSamplingParams,  # type: ignore
+    _LlamaSamplingContext,  # type: ignore
+)
+
+
+class BatchRequest:
+    """A generation request admitted to a `LlamaBatchScheduler`.
+
+    Iterating the request yields decoded text pieces as soon as the scheduler
+    produces them. Abandoning the iterator (or calling `cancel`) frees the
+    request's sequence slot at the next decode step."""
+
+    def __init__(
+        self,
+        prompt_tokens: List[int],
+        max_tokens: int,
+        stop: List[str],
+        sampling_params: _LlamaSamplingParams,
+    ):
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.stop_sequences = [s.encode("utf-8") for s in stop if s]
+        self.sampling_params = sampling_params
+        self.completion_tokens: List[int] = []
+        self.finish_reason: Optional[str] = None
+        self._chunks: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._cancelled = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Stop generating for this request and release its sequence slot."""
+        self._cancelled.set()
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            while True:
+                chunk = self._chunks.get()
+                if chunk is None:
+                    break
+                yield chunk
+            if self._error is not None:
+                raise self._error
+        finally:
+            if self.finish_reason is None:
+                self.cancel()
+
+    def result(self) -> str:
+        """Block until the request finishes and return the generated text."""
+        return "".join(self)
+
+    def _put(self, text: str):
+        if text:
+            self._chunks.put(text)
+
+    def _finish(self, finish_reason: str, error: Optional[BaseException] = None):
+        self.finish_reason = finish_reason
+        self._error = error
+        self._chunks.put(None)
+
+
+@dataclass
+class _SequenceSlot:
+    seq_id: int
+    request: Optional[BatchRequest] = None
+    sampling: Optional[_LlamaSamplingContext] = None
+    n_past: int = 0
+    n_prompt_done: int = 0
+    last_token: int = -1
+    batch_idx: int = -1
+    detokenizer: Optional[IncrementalDetokenizer] = None
+    # The detokenizer's text, cut at a stop sequence
+    text: bytearray = field(default_factory=bytearray)
+    n_sent: int = 0
+
+    @property
+    def prefilling(self) -> bool:
+        assert self.request is not None
+        return self.n_prompt_done < len(self.request.prompt_tokens)
+
+
+class LlamaBatchScheduler:
+    """Continuous-batching scheduler over a single llama.cpp context.
+
+    Every admitted request is bound to its own llama.cpp sequence id. Each
+    scheduler step packs one pending token per generating sequence plus as
+    much outstanding prompt as fits into `n_batch`, decodes them together and
+    samples every sequence from its own logits row, so new requests join and
+    finished requests leave between steps without waiting for each other.
+
+    The KV cache of the context is split evenly across the `n_parallel`
+    slots, so each request can use at most `n_ctx // n_parallel` tokens. The
+    `Llama` must be created with `n_seq_max >= n_parallel` and
+    `n_batch >= n_parallel`, so that a step fits every generating sequence.
+
+    Code that needs to call the wrapped `Llama` directly (e.g. for requests
+    the scheduler cannot serve) must do so inside `exclusive()`."""
+
+    def __init__(self, llama: Llama, n_parallel: int = 4):
+        if n_parallel < 1:
+            raise ValueError("n_parallel must be at least 1")
+        if n_parallel > llama.n_batch:
+            raise ValueError(
+                f"n_parallel ({n_parallel}) must not exceed n_batch ({llama.n_batch}): "
+                "every generating sequence adds one token to each decode"
+            )
+        self.llama = llama
+        self.n_parallel = n_parallel
+        self.n_ctx_slot = llama.n_ctx() // n_parallel
+        self.verbose = llama.verbose
+
+        self._slots = [_SequenceSlot(seq_id=i) for i in range(n_parallel)]
+        self._pending: "deque[BatchRequest]" = deque()
+        self._batch = _LlamaBatch(
+            n_tokens=llama.n_batch,
+            embd=0,
+            n_seq_max=1,
+            verbose=self.verbose,
+        )
+        self._cond = threading.Condition()
+        self._exclusive_lock = threading.Lock()
+        self._n_exclusive = 0
+        self._stepping = False
+        self._dirty = False
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="llama-batch-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def n_active(self) -> int:
+        return sum(1 for slot in self._slots if slot.request is not None)
+
+    @property
+    def n_pending(self) -> int:
+        return len(self._pending)
+
+    @property
+    def supports_chat(self) -> bool:
+        return self._chat_formatter() is not None
+
+    def submit(
+        self,
+        prompt: Union[str, List[int]],
+        max_tokens: Optional[int] = 16,
+        temperature: float = 0.8,
+        top_k: int = 40,
+        top_p: float = 0.95,
+        min_p: float = 0.05,
+        typical_p: float = 1.0,
+        repeat_penalty: float = 1.0,
+        frequency_penalty: float = 0.0,
+        presence_penalty: float = 0.0,
+        stop: Optional[Union[str, List[str]]] = None,
+    ) -> BatchRequest:
+        """Queue a completion request.
+
+        Raises:
+            ValueError: If the prompt does not fit into a single slot's context.
+
+        Returns:
+            A `BatchRequest` that yields the generated text as it is decoded.
+        """
+        if isinstance(prompt, str):
+            prompt_tokens = self.llama.tokenize(
+                prompt.encode("utf-8"), add_bos=True, special=True
+            )
+        else:
+            prompt_tokens = list(prompt)
+        if len(prompt_tokens) == 0:
+            prompt_tokens = [self.llama.token_bos()]
+        if len(prompt_tokens) >= self.n_ctx_slot:
+            raise ValueError(
+                f"Requested tokens ({len(prompt_tokens)}) exceed the per-sequence context window of {self.n_ctx_slot}"
+            )
+        if max_tokens is None or max_tokens <= 0:
+            max_tokens = self.n_ctx_slot - len(prompt_tokens)
+        max_tokens = min(max_tokens, self.n_ctx_slot - len(prompt_tokens))
+
+        stop = stop if isinstance(stop, list) else [stop] if isinstance(stop, str) else []
+        request = BatchRequest(
+            prompt_tokens=prompt_tokens,
+            max_tokens=max_tokens,
+            stop=stop,
+            sampling_params=_LlamaSamplingParams(
+                top_k=top_k,
+                top_p=top_p,
+                min_p=min_p,
+                typical_p=typical_p,
+                temp=temperature,
+                penalty_last_n=self.llama.last_n_tokens_size,
+                penalty_repeat=repeat_penalty,
+                penalty_freq=frequency_penalty,
+                penalty_present=presence_penalty,
+            ),
+        )
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("LlamaBatchScheduler is closed")
+            self._pending.append(request)
+            self._cond.notify_all()
+        return request
+
+    def submit_chat(
+        self,
+        messages: List[ChatCompletionRequestMessage],
+        stop: Optional[Union[str, List[str]]] = None,
+        **kwargs,
+    ) -> BatchRequest:
+        """Format `messages` with the model's chat format and queue them.
+
+        Raises:
+            ValueError: If the model's chat handler cannot be expressed as a plain prompt.
+        """
+        formatter = self._chat_formatter()
+        if formatter is None:
+            raise ValueError(
+                f"Chat format {self.llama.chat_format} does not support batched generation"
+            )
+        result = formatter(messages=messages)
+        prompt_tokens = self.llama.tokenize(
+            result.prompt.encode("utf-8"),
+            add_bos=not result.added_special,
+            special=True,
+        )
+        stop = [] if stop is None else [stop] if isinstance(stop, str) else list(stop)
+        if result.stop is not None:
+            stop += result.stop if isinstance(result.stop, list) else [result.stop]
+        return self.submit(prompt_tokens, stop=stop, **kwargs)
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """Pause admission, wait for in-flight requests to drain and hand the
+        wrapped `Llama` to the caller for direct use."""
+        with self._cond:
+            self._n_exclusive += 1
+            self._cond.wait_for(lambda: self.n_active == 0 and not self._stepping)
+        try:
+            with self._exclusive_lock:
+                if self._dirty:
+                    # The scheduler reused sequence 0, so the Llama's own
+                    # prefix bookkeeping no longer matches the KV cache.
+                    self.llama.reset()
+                    self._dirty = False
+                yield self.llama
+        finally:
+            with self._cond:
+                self._n_exclusive -= 1
+                self._cond.notify_all()
+
+    def close(self):
+        """Stop the scheduler thread and fail any outstanding requests."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        error = RuntimeError("LlamaBatchScheduler is closed")
+        for slot in self._slots:
+            if slot.request is not None:
+                self._release(slot, "stop", error)
+        while self._pending:
+            self._pending.popleft()._finish("stop", error)
+        self._batch.close()
+
+    def _chat_formatter(self) -> Optional[llama_chat_format.ChatFormatter]:
+        if self.llama.chat_handler is not None or self.llama.chat_format is None:
+            return None
+        return self.llama._chat_formatters.get(
+            self.llama.chat_format
+        ) or llama_chat_format.get_chat_formatter(self.llama.chat_format)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # In-flight requests keep decoding while an exclusive caller
+                # waits for them to drain; only admission is paused.
+                self._cond.wait_for(
+                    lambda: self._closed
+                    or self.n_active > 0
+                    or (self._n_exclusive == 0 and len(self._pending) > 0)
+                )
+                if self._closed:
+                    return
+                if self._n_exclusive == 0:
+                    self._admit()
+                self._stepping = True
+            try:
+                self._step()
+            except Exception as e:
+                if self.verbose:
+                    print(f"LlamaBatchScheduler: decode failed: {e}", file=sys.stderr)
+                for slot in self._slots:
+                    if slot.request is not None:
+                        self._release(slot, "stop", e)
+            finally:
+                with self._cond:
+                    self._stepping = False
+                    self._cond.notify_all()
+
+    def _admit(self):
+        for slot in self._slots:
+            if not self._pending:
+                break
+            if slot.request is not None:
+                continue
+            request = self._pending.popleft()
+            if request.cancelled:
+                request._finish("cancelled")
+                continue
+            self.llama._ctx.kv_cache_seq_rm(slot.seq_id, -1, -1)
+            slot.request = request
+            slot.sampling = _LlamaSamplingContext(
+                params=request.sampling_params,
+                mirostat_mu=ctypes.c_float(
+                    2.0 * request.sampling_params.mirostat_tau
+                ),
+                prev=list(request.prompt_tokens),
+            )
+            slot.n_past = 0
+            slot.n_prompt_done = 0
+            slot.last_token = -1
+            slot.batch_idx = -1
+            slot.detokenizer = IncrementalDetokenizer(
+                self.llama.tokenizer_, request.prompt_tokens
+            )
+            slot.text = slot.detokenizer.text
+            slot.n_sent = 0
+            self._dirty = True
+
+    def _step(self):
+        batch = self._batch
+        batch.reset()
+        n_batch = self.llama.n_batch
+
+        for slot in self._slots:
+            if slot.request is not None and slot.request.cancelled:
+                self._release(slot, "cancelled")
+
+        active = [slot for slot in self._slots if slot.request is not None]
+
+        # One token per generating sequence first, so decoding never starves
+        for slot in active:
+            if slot.prefilling:
+                continue
+            slot.batch_idx = batch.n_tokens()
+            batch.add_token(slot.last_token, slot.n_past, slot.seq_id, True)
+            slot.n_past += 1
+
+        # Then fill the remaining room with outstanding prompt chunks
+        for slot in active:
+            if not slot.prefilling:
+                continue
+            room = n_batch - batch.n_tokens()
+            if room <= 0:
+                break
+            assert slot.request is not None
+            prompt_tokens = slot.request.prompt_tokens
+            chunk = prompt_tokens[slot.n_prompt_done : slot.n_prompt_done + room]
+            for token in chunk:
+                slot.n_prompt_done += 1
+                is_last = slot.n_prompt_done == len(prompt_tokens)
+                if is_last:
+                    slot.batch_idx = batch.n_tokens()
+                batch.add_token(token, slot.n_past, slot.seq_id, is_last)
+                slot.n_past += 1
+
+        if batch.n_tokens() == 0:
+            return
+
+        self.llama._ctx.decode(batch)
+
+        for slot in active:
+            if slot.batch_idx < 0:
+                continue
+            assert slot.sampling is not None
+            token = slot.sampling.sample(ctx_main=self.llama._ctx, idx=slot.batch_idx)
+            slot.sampling.accept(ctx_main=self.llama._ctx, id=token, apply_grammar=False)
+            slot.batch_idx = -1
+            self._on_token(slot, token)
+
+    def _on_token(self, slot: _SequenceSlot, token: int):
+        request = slot.request
+        assert request is not None
+
+        if llama_cpp.llama_token_is_eog(self.llama.model, token):
+            self._release(slot, "stop")
+            return
+
+        request.completion_tokens.append(token)
+        slot.last_token = token
+        assert slot.detokenizer is not None
+        # Appends to slot.text; only the last few tokens are passed as context
+        slot.detokenizer.push(token)
+
+        stop_positions = [
+            pos
+            for pos in (
+                slot.text.find(s, max(0, slot.n_sent - len(s) + 1))
+                for s in request.stop_sequences
+            )
+            if pos >= 0
+        ]
+        if stop_positions:
+            del slot.text[min(stop_positions) :]
+            self._release(slot, "stop")
+            return
+
+        if len(request.completion_tokens) >= request.max_tokens:
+            self._release(slot, "length")
+            return
+
+        # Hold back anything that could still turn into a stop sequence or
+        # that ends in the middle of a UTF-8 character.
+        held = 0
+        for s in request.stop_sequences:
+            for i in range(min(len(s) - 1, len(slot.text) - slot.n_sent), 0, -1):
+                if slot.text.endswith(s[:i]):
+                    held = max(held, i)
+                    break
+        end = len(slot.text) - held
+        end -= incomplete_utf8_suffix(slot.text[max(0, end - 4) : end])
+        if end > slot.n_sent:
+            request._put(slot.text[slot.n_sent : end].decode("utf-8", errors="ignore"))
+            slot.n_sent = end
+
+    def _release(
+        self,
+        slot: _SequenceSlot,
+        finish_reason: str,
+        error: Optional[BaseException] = None,
+    ):
+        request = slot.request
+        assert request is not None
+        if error is None and finish_reason != "cancelled" and slot.n_sent < len(slot.text):
+            request._put(slot.text[slot.n_sent :].decode("utf-8", errors="ignore"))
+        self.llama._ctx.kv_cache_seq_rm(slot.seq_id, -1, -1)
+        slot.request = None
+        slot.sampling = None
+        slot.detokenizer = None
+        slot.batch_idx = -1
+        request._finish(finish_reason, error)
@@ -1,6 +1,7 @@
 import sys
 from abc import ABC, abstractmethod
 from typing import (
+    Dict,
     Optional,
     Sequence,
     Tuple,
@@ -14,6 +15,117 @@ import nexa.gguf.llama as llama_cpp
 from nexa.gguf.llama.llama_types import *
 
 
+class _RadixNode:
+    __slots__ = ("edge", "children", "key", "n_keys")
+
+    def __init__(self, edge: Tuple[int, ...] = ()):
+        # Tokens on the edge leading into this node.
+        self.edge = edge
+        # Children keyed by the first token of their edge.
+        self.children: Dict[int, "_RadixNode"] = {}
+        # The cached key ending exactly at this node, if any.
+        self.key: Optional[Tuple[int, ...]] = None
+        # Number of cached keys in this subtree.
+        self.n_keys = 0
+
+
+class _TokenPrefixIndex:
+    """Radix tree over cached token sequences.
+
+    Finds the cached key sharing the longest common prefix with a prompt in
+    time proportional to the prompt length instead of the number of keys.
+    """
+
+    def __init__(self):
+        self.root = _RadixNode()
+
+    def __len__(self) -> int:
+        return self.root.n_keys
+
+    def add(self, key: Tuple[int, ...]) -> None:
+        node = self.root
+        path = [node]
+        i = 0
+        while i < len(key):
+            child = node.children.get(key[i])
+            if child is None:
+                child = _RadixNode(key[i:])
+                node.children[key[i]] = child
+                node = child
+                path.append(node)
+                break
+            edge = child.edge
+            j = 1
+            while j < len(edge) and i + j < len(key) and edge[j] == key[i + j]:
+                j += 1
+            if j < len(edge):
+                # Split the edge where the key diverges from it.
+                middle = _RadixNode(edge[:j])
+                middle.n_keys = child.n_keys
+                child.edge = edge[j:]
+                middle.children[child.edge[0]] = child
+                node.children[key[i]] = middle
+                child = middle
+            node = child
+            path.append(node)
+            i += j
+        if node.key is not None:
+            return
+        node.key = key
+        for n in path:
+            n.n_keys += 1
+
+    def remove(self, key: Tuple[int, ...]) -> None:
+        node = self.root
+        path = [node]
+        i = 0
+        while i < len(key):
+            node = node.children.get(key[i])
+            if node is None or key[i : i + len(node.edge)] != node.edge:
+                return
+            path.append(node)
+            i += len(node.edge)
+        if node.key is None:
+            return
+        node.key = None
+        for n in path:
+            n.n_keys -= 1
+        # Drop empty subtrees and merge nodes left with a single child.
+        for parent, child in zip(reversed(path[:-1]), reversed(path[1:])):
+            if child.n_keys == 0:
+                del parent.children[child.edge[0]]
+            elif child.key is None and len(child.children) == 1:
+                (grandchild,) = child.children.values()
+                grandchild.edge = child.edge + grandchild.edge
+                parent.children[child.edge[0]] = grandchild
+
+    def longest_prefix_key(self, tokens: Sequence[int]) -> Optional[Tuple[int, ...]]:
+        """Return a key sharing the longest (non-empty) common prefix with `tokens`."""
+        node = self.root
+        i = 0
+        while i < len(tokens):
+            child = node.children.get(tokens[i])
+            if child is None:
+                break
+            edge = child.edge
+            j = 1
+            while j < len(edge) and i + j < len(tokens) and edge[j] == tokens[i + j]:
+                j += 1
+            node = child
+            i += j
+            if j < len(edge):
+                break
+        if node is self.root:
+            return None
+        # Every key below the node shares the same prefix with the tokens.
+        while node.key is None:
+            node = next(iter(node.children.values()))
+        return node.key
+
+    def clear(self) -> None:
+        self.root = _RadixNode()
+
+
 class BaseLlamaCache(ABC):
     """Base cache class for a llama.cpp model."""
 
@@ -55,26 +167,23 @@ class LlamaRAMCache(BaseLlamaCache):
         self.cache_state: OrderedDict[Tuple[int, ...], "llama_cpp.llama.LlamaState"] = (
             OrderedDict()
         )
+        self._index = _TokenPrefixIndex()
+        self._cache_size = 0
 
     @property
     def cache_size(self):
-        return sum([state.llama_state_size for state in self.cache_state.values()])
+        return self._cache_size
 
     def _find_longest_prefix_key(
         self,
         key: Tuple[int, ...],
     ) -> Optional[Tuple[int, ...]]:
-        min_len = 0
-        min_key = None
-        keys = (
-            (k, llama_cpp.llama.Llama.longest_token_prefix(k, key))
-            for k in self.cache_state.keys()
-        )
-        for k, prefix_len in keys:
-            if prefix_len > min_len:
-                min_len = prefix_len
-                min_key = k
-        return min_key
+        return self._index.longest_prefix_key(key)
+
+    def _remove(self, key: Tuple[int, ...]):
+        state = self.cache_state.pop(key)
+        self._cache_size -= state.llama_state_size
+        self._index.remove(key)
 
     def __getitem__(self, key: Sequence[int]) -> "llama_cpp.llama.LlamaState":
         key = tuple(key)
@@ -91,10 +200,12 @@ class LlamaRAMCache(BaseLlamaCache):
     def __setitem__(self, key: Sequence[int], value: "llama_cpp.llama.LlamaState"):
         key = tuple(key)
         if key in self.cache_state:
-            del self.cache_state[key]
+            self._remove(key)
         self.cache_state[key] = value
+        self._cache_size += value.llama_state_size
+        self._index.add(key)
         while self.cache_size > self.capacity_bytes and len(self.cache_state) > 0:
-            self.cache_state.popitem(last=False)
+            self._remove(next(iter(self.cache_state)))
 
 
 # Alias for backwards compatibility
@@ -109,6 +220,12 @@ class LlamaDiskCache(BaseLlamaCache):
     ):
         super().__init__(capacity_bytes)
         self.cache = diskcache.Cache(cache_dir)
+        # The index only sees this process' writes; it is built once from
+        # the keys already on disk.
+        self._index = _TokenPrefixIndex()
+        for k in self.cache.iterkeys():  # type: ignore
+            if isinstance(k, tuple):
+                self._index.add(k)
 
     @property
     def cache_size(self):
@@ -118,14 +235,7 @@ class LlamaDiskCache(BaseLlamaCache):
         self,
         key: Tuple[int, ...],
     ) -> Optional[Tuple[int, ...]]:
-        min_len = 0
-        min_key: Optional[Tuple[int, ...]] = None
-        for k in self.cache.iterkeys():  # type: ignore
-            prefix_len = llama_cpp.llama.Llama.longest_token_prefix(k, key)
-            if prefix_len > min_len:
-                min_len = prefix_len
-                min_key = k  # type: ignore
-        return min_key
+        return self._index.longest_prefix_key(key)
 
     def __getitem__(self, key: Sequence[int]) -> "llama_cpp.llama.LlamaState":
         key = tuple(key)
@@ -133,6 +243,7 @@ class LlamaDiskCache(BaseLlamaCache):
         if _key is None:
             raise KeyError("Key not found")
         value: "llama_cpp.llama.LlamaState" = self.cache.pop(_key)  # type: ignore
+        self._index.remove(_key)
         # NOTE: This puts an integer as key in cache, which breaks,
         # Llama.longest_token_prefix(k, key) above since k is not a tuple of ints/tokens
         # self.cache.push(_key, side="front")  # type: ignore
@@ -148,8 +259,11 @@ class LlamaDiskCache(BaseLlamaCache):
             print("LlamaDiskCache.__setitem__: delete", file=sys.stderr)
             del self.cache[key]
         self.cache[key] = value
+        self._index.add(key)
         print("LlamaDiskCache.__setitem__: set", file=sys.stderr)
         while self.cache_size > self.capacity_bytes and len(self.cache) > 0:
             key_to_remove = next(iter(self.cache))
             del self.cache[key_to_remove]
+            if isinstance(key_to_remove, tuple):
+                self._index.remove(key_to_remove)
         print("LlamaDiskCache.__setitem__: trim", file=sys.stderr)
\ No newline at end of file
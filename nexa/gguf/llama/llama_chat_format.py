@@ -943,17 +943,29 @@ def _grammar_for_response_format(
 ### Chat Formats ###
 
 
+_CHAT_FORMATTERS: Dict[str, ChatFormatter] = {}
+
+
 def register_chat_format(name: str):
     def decorator(f: ChatFormatter):
         chat_completion_handler = chat_formatter_to_chat_completion_handler(f)
         LlamaChatCompletionHandlerRegistry().register_chat_completion_handler(
             name, chat_completion_handler
         )
+        _CHAT_FORMATTERS[name] = f
         return f
 
     return decorator
 
 
+def get_chat_formatter(name: str) -> Optional[ChatFormatter]:
+    """Return the prompt formatter registered under `name`, if any.
+
+    Handlers that do more than format a prompt (function calling, multimodal)
+    have no formatter and return None."""
+    return _CHAT_FORMATTERS.get(name)
+
+
 # see https://github.com/huggingface/transformers/blob/main/src/transformers/models/llama/tokenization_llama.py
 # system prompt is "embedded" in the first message
 @register_chat_format("llama-2")
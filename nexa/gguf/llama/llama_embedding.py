@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from typing import (
+    Iterable,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+import numpy.typing as npt
+
+import nexa.gguf.llama.llama_cpp as llama_cpp
+
+from nexa.gguf.llama.llama import Llama
+
+
+class LlamaEmbedder:
+    """Batched sentence-embedding engine on top of a pooled embedding model.
+
+    Inputs are tokenized up front, sorted by length and packed as separate
+    sequences into `n_batch`-sized decode calls, so short inputs share a
+    decode with each other instead of each paying for one. Pooled embeddings
+    are read straight from `llama_get_embeddings_seq` into a float32 matrix
+    whose rows follow the input order.
+
+    Inputs longer than `n_batch` tokens are either truncated or, with
+    `truncate=False`, split into `n_batch`-token chunks whose embeddings are
+    mean-pooled (weighted by chunk length) into one row.
+    """
+
+    def __init__(self, llama: Llama):
+        if llama.context_params.embeddings is False:
+            raise RuntimeError(
+                "Llama model must be created with embedding=True to compute embeddings"
+            )
+        if llama.pooling_type() == llama_cpp.LLAMA_POOLING_TYPE_NONE:
+            raise ValueError(
+                "LlamaEmbedder needs a pooled embedding model, use Llama.embed for token embeddings"
+            )
+        self.llama = llama
+        self.n_embd = llama.n_embd()
+        self.n_batch = llama.n_batch
+
+    def _split(
+        self, inputs: Sequence[str], truncate: bool
+    ) -> Tuple[List[Tuple[int, List[int]]], int]:
+        """Tokenize `inputs` into (input index, tokens) pieces of at most `n_batch` tokens."""
+        pieces: List[Tuple[int, List[int]]] = []
+        total_tokens = 0
+        for i, text in enumerate(inputs):
+            tokens = self.llama.tokenize(text.encode("utf-8"))
+            if truncate:
+                tokens = tokens[: self.n_batch]
+            total_tokens += len(tokens)
+            for start in range(0, max(len(tokens), 1), self.n_batch):
+                pieces.append((i, tokens[start : start + self.n_batch]))
+        return pieces, total_tokens
+
+    def _decode(
+        self,
+        pieces: List[Tuple[int, List[int]]],
+        group: List[int],
+        out: npt.NDArray[np.single],
+    ):
+        """Decode the pieces in `group` as one packed batch and copy each
+        sequence's pooled embedding into its row of `out`."""
+        llama = self.llama
+        batch = llama._batch
+        ctx = llama._ctx.ctx
+        assert ctx is not None
+        batch.reset()
+        for seq_id, k in enumerate(group):
+            batch.add_sequence(pieces[k][1], seq_id, False)
+        llama_cpp.llama_kv_cache_clear(ctx)
+        llama._ctx.decode(batch)
+        batch.reset()
+        for seq_id, k in enumerate(group):
+            ptr = llama_cpp.llama_get_embeddings_seq(ctx, seq_id)
+            out[k] = np.ctypeslib.as_array(ptr, shape=(self.n_embd,))
+
+    def embed(
+        self,
+        inputs: Sequence[str],
+        normalize: bool = False,
+        truncate: bool = True,
+        return_count: bool = False,
+    ):
+        """Embed `inputs` and return an `(len(inputs), n_embd)` float32 matrix.
+
+        With `return_count`, also return the number of tokens processed."""
+        pieces, total_tokens = self._split(inputs, truncate)
+        # Inputs without any token keep a zero embedding
+        piece_embeddings = np.zeros((len(pieces), self.n_embd), dtype=np.single)
+
+        # Longest first, then fill each decode call until the next piece no
+        # longer fits.
+        order = sorted(
+            (k for k in range(len(pieces)) if pieces[k][1]),
+            key=lambda k: len(pieces[k][1]),
+            reverse=True,
+        )
+        group: List[int] = []
+        n_group_tokens = 0
+        for k in order:
+            n_tokens = len(pieces[k][1])
+            if group and n_group_tokens + n_tokens > self.n_batch:
+                self._decode(pieces, group, piece_embeddings)
+                group = []
+                n_group_tokens = 0
+            group.append(k)
+            n_group_tokens += n_tokens
+        if group:
+            self._decode(pieces, group, piece_embeddings)
+
+        llama_cpp.llama_kv_cache_clear(self.llama._ctx.ctx)
+        self.llama.reset()
+
+        if len(pieces) == len(inputs):
+            # No input was split, pieces are already in input order
+            embeddings = piece_embeddings
+        else:
+            owners = np.fromiter((i for i, _ in pieces), dtype=np.intp, count=len(pieces))
+            weights = np.fromiter(
+                (len(tokens) for _, tokens in pieces), dtype=np.single, count=len(pieces)
+            )
+            embeddings = np.zeros((len(inputs), self.n_embd), dtype=np.single)
+            np.add.at(embeddings, owners, piece_embeddings * weights[:, None])
+            totals = np.bincount(owners, weights=weights, minlength=len(inputs))
+            embeddings /= np.maximum(totals, 1.0)[:, None].astype(np.single)
+
+        if normalize:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            np.divide(embeddings, norms, out=embeddings, where=norms > 0)
+
+        if return_count:
+            return embeddings, total_tokens
+        return embeddings
+
+    def iter_embed(
+        self,
+        inputs: Iterable[str],
+        normalize: bool = False,
+        truncate: bool = True,
+        window: int = 1024,
+    ) -> Iterator[npt.NDArray[np.single]]:
+        """Embed an arbitrarily long stream of inputs, `window` inputs at a time.
+
+        Yields one matrix per window, in input order; only one window of texts
+        and embeddings is held in memory at a time."""
+        texts: List[str] = []
+        for text in inputs:
+            texts.append(text)
+            if len(texts) == window:
+                yield self.embed(texts, normalize=normalize, truncate=truncate)
+                texts = []
+        if texts:
+            yield self.embed(texts, normalize=normalize, truncate=truncate)
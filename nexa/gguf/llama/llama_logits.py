@@ -0,0 +1,380 @@
+from __future__ import annotations
+
+import copy
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import numpy.typing as npt
+
+LOGITS_STORAGE_MODES = ("full", "last", "ring", "topk")
+
+# Rows reduced at once in "topk" mode; bounds the temporaries of argpartition
+# over a whole decode batch of vocabulary-sized rows.
+_REDUCE_ROWS = 16
+
+_COMPACT_FIELDS = ("_top_ids", "_top_logits", "_lse", "_next_token", "_next_logit")
+
+
+def _log_softmax(logits: npt.NDArray[np.single]) -> npt.NDArray[np.single]:
+    maxs = np.amax(logits, axis=-1, keepdims=True)
+    maxs[~np.isfinite(maxs)] = 0
+    shifted = np.subtract(logits, maxs, dtype=np.single)
+    # Suppress warnings about log of zero
+    with np.errstate(divide="ignore"):
+        return shifted - np.log(np.sum(np.exp(shifted), axis=-1, keepdims=True))
+
+
+def _logsumexp(logits: npt.NDArray[np.single]) -> npt.NDArray[np.single]:
+    maxs = np.amax(logits, axis=-1)
+    maxs[~np.isfinite(maxs)] = 0
+    with np.errstate(divide="ignore"):
+        return np.log(np.sum(np.exp(logits - maxs[:, None]), axis=-1)) + maxs
+
+
+def _dense_logprobs(
+    rows: npt.NDArray[np.single], tokens: Sequence[int], k: int
+) -> Tuple[List[Optional[float]], List[List[int]], List[List[float]]]:
+    """Logprob of `tokens[i]` in `rows[i]` and the `k` most likely tokens of each row."""
+    logprobs = _log_softmax(rows)
+    index = np.arange(len(logprobs))
+    token_logprobs = logprobs[index, np.asarray(tokens, dtype=np.intp)].tolist()
+    # Only the top `k` entries of each row are sorted
+    k = min(k, logprobs.shape[-1])
+    if k <= 0:
+        return token_logprobs, [[] for _ in index], [[] for _ in index]
+    top = np.argpartition(logprobs, -k, axis=-1)[:, -k:]
+    values = np.take_along_axis(logprobs, top, axis=-1)
+    order = np.argsort(-values, axis=-1)
+    return (
+        token_logprobs,
+        np.take_along_axis(top, order, axis=-1).tolist(),
+        np.take_along_axis(values, order, axis=-1).tolist(),
+    )
+
+
+class KeptRows:
+    """Rows of a `LlamaLogits` indexed by position, like the dense scores array.
+
+    `scores[pos]`, `scores[pos, token]` and `scores[start:end]` work for every
+    position whose row is kept (the last one with logits_storage="last", the
+    last `logits_storage_size` with "ring", and the last one with "topk");
+    any other position raises ValueError.
+    """
+
+    def __init__(self, logits: "LlamaLogits"):
+        self._logits = logits
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return (self._logits.n_tokens, self._logits.n_vocab)
+
+    def __len__(self) -> int:
+        return self._logits.n_tokens
+
+    def _row(self, pos: int) -> npt.NDArray[np.single]:
+        row = self._logits._full_row(pos)
+        if row is None:
+            raise ValueError(
+                f"Logits of position {pos} are not kept with "
+                f"logits_storage={self._logits.mode!r}; use logits_storage='full' "
+                f"to keep the logits of every position"
+            )
+        return row
+
+    def __getitem__(self, key):
+        rest = ()
+        if isinstance(key, tuple):
+            key, rest = key[0], key[1:]
+        if isinstance(key, slice):
+            positions = range(*key.indices(len(self)))
+            rows = np.empty((len(positions), self._logits.n_vocab), dtype=np.single)
+            for i, pos in enumerate(positions):
+                rows[i] = self._row(pos)
+            return rows[(slice(None),) + rest]
+        pos = int(key)
+        if pos < 0:
+            pos += len(self)
+        return self._row(pos)[rest]
+
+    def __array__(self, dtype=None, copy=None):
+        rows = self[:]
+        return rows if dtype is None else rows.astype(dtype)
+
+
+class LlamaLogits:
+    """Logits of the positions evaluated by a `Llama` context.
+
+    Which logits are kept depends on `mode`:
+
+    - `"full"`: every row, `(n_ctx, n_vocab)` at most, grown as positions
+      are evaluated.
+    - `"last"`: only the row of the last evaluated position.
+    - `"ring"`: the rows of the last `n_live` positions.
+    - `"topk"`: the row of the last position in full and, for every
+      position, its `top_k` largest logits, the log-sum-exp of its row and
+      the logit of the token evaluated after it. That is all completion
+      logprobs (echo included) need, at `top_k * 8 + 12` bytes per position
+      instead of `n_vocab * 4`.
+
+    `n_live` is the number of most recent rows kept in full in every mode
+    but `"full"`. Nothing is allocated before the first `store`, and `save`
+    copies only the part that holds data.
+    """
+
+    def __init__(
+        self,
+        n_ctx: int,
+        n_vocab: int,
+        mode: str = "full",
+        top_k: int = 20,
+        n_live: int = 1,
+    ):
+        if mode not in LOGITS_STORAGE_MODES:
+            raise ValueError(
+                f"Unknown logits storage {mode!r}, expected one of {LOGITS_STORAGE_MODES}"
+            )
+        self.n_ctx = n_ctx
+        self.n_vocab = n_vocab
+        self.mode = mode
+        self.top_k = min(top_k, n_vocab)
+        self.n_live = max(n_live, 1)
+        self.n_tokens = 0
+        # "full": one row per position
+        self._rows: Optional[npt.NDArray[np.single]] = None
+        # Other modes: the most recent rows, position p in slot p % n_live
+        self._live: Optional[npt.NDArray[np.single]] = None
+        self._live_pos: Optional[npt.NDArray[np.intp]] = None
+        # "topk": per-position summaries of the rows
+        self._top_ids: Optional[npt.NDArray[np.intc]] = None
+        self._top_logits: Optional[npt.NDArray[np.single]] = None
+        self._lse: Optional[npt.NDArray[np.single]] = None
+        self._next_token: Optional[npt.NDArray[np.intc]] = None
+        self._next_logit: Optional[npt.NDArray[np.single]] = None
+
+    @property
+    def has_logprobs(self) -> bool:
+        """Whether logprobs of every evaluated position can be looked up."""
+        return self.mode in ("full", "topk")
+
+    @property
+    def rows(self) -> npt.NDArray[np.single]:
+        """Row per position, only in "full" mode."""
+        if self.mode != "full":
+            raise ValueError(f"Per-position logits are not kept with logits_storage={self.mode!r}")
+        if self._rows is None:
+            return np.empty((0, self.n_vocab), dtype=np.single)
+        return self._rows
+
+    def kept_rows(self) -> Union[npt.NDArray[np.single], KeptRows]:
+        """`rows` in "full" mode, otherwise a `KeptRows` view of the rows still kept."""
+        return self.rows if self.mode == "full" else KeptRows(self)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self._rows, self._live) + tuple(getattr(self, f) for f in _COMPACT_FIELDS)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def _grow(self, array: Optional[np.ndarray], n: int, shape: tuple, dtype) -> np.ndarray:
+        if array is not None and len(array) >= n:
+            return array
+        old = 0 if array is None else len(array)
+        capacity = max(n, min(self.n_ctx, max(2 * old, 64)))
+        grown = np.empty((capacity,) + shape, dtype=dtype)
+        if old:
+            grown[: min(old, self.n_tokens)] = array[: self.n_tokens]
+        return grown
+
+    def _ensure_rows(self, n: int) -> npt.NDArray[np.single]:
+        self._rows = self._grow(self._rows, n, (self.n_vocab,), np.single)
+        return self._rows
+
+    def _ensure_live(self) -> npt.NDArray[np.single]:
+        if self._live is None:
+            self._live = np.empty((self.n_live, self.n_vocab), dtype=np.single)
+            self._live_pos = np.full(self.n_live, -1, dtype=np.intp)
+        return self._live
+
+    def _ensure_compact(self, n: int):
+        k = self.top_k
+        self._top_ids = self._grow(self._top_ids, n, (k,), np.intc)
+        self._top_logits = self._grow(self._top_logits, n, (k,), np.single)
+        self._lse = self._grow(self._lse, n, (), np.single)
+        self._next_token = self._grow(self._next_token, n, (), np.intc)
+        self._next_logit = self._grow(self._next_logit, n, (), np.single)
+
+    def _full_row(self, pos: int) -> Optional[npt.NDArray[np.single]]:
+        if pos < 0 or pos >= self.n_tokens:
+            return None
+        if self.mode == "full":
+            return None if self._rows is None else self._rows[pos]
+        slot = pos % self.n_live
+        if self._live is None or self._live_pos[slot] != pos:
+            return None
+        return self._live[slot]
+
+    def row(self, pos: int) -> npt.NDArray[np.single]:
+        """Logits of position `pos`, as a writable view into the storage."""
+        row = self._full_row(pos)
+        if row is None:
+            raise ValueError(
+                f"Logits of position {pos} are not kept with logits_storage={self.mode!r}"
+            )
+        return row
+
+    def recent(self, n_tokens: int) -> npt.NDArray[np.single]:
+        """The full rows of the positions before `n_tokens` still kept, oldest first."""
+        if self.mode == "full":
+            return self.rows[: min(n_tokens, self.n_tokens)]
+        pos = min(n_tokens, self.n_tokens)
+        rows = []
+        while len(rows) < self.n_live and self._full_row(pos - 1) is not None:
+            pos -= 1
+            rows.append(self._live[pos % self.n_live])
+        return np.array(rows[::-1], dtype=np.single).reshape(-1, self.n_vocab)
+
+    def missing_next(self, pos: int, token: int) -> bool:
+        """Whether evaluating `token` after position `pos` would leave its logprob unknown.
+
+        Only in "topk" mode, when the row of `pos` is no longer kept and was
+        followed by another token before.
+        """
+        if self.mode != "topk" or pos < 0 or pos >= self.n_tokens:
+            return False
+        return self._full_row(pos) is None and self._next_token[pos] != token
+
+    def store(self, n_past: int, tokens: Sequence[int], logits: npt.NDArray[np.single]):
+        """Record the logits of evaluating `tokens` at positions from `n_past` on.
+
+        `logits` holds `(rows, n_vocab)` logits of the last `rows` tokens.
+        Everything kept for positions from `n_past` on is replaced.
+        """
+        n = len(tokens)
+        end = n_past + n
+        if n == 0:
+            self.n_tokens = min(self.n_tokens, n_past)
+            return
+        first = end - len(logits)
+        if self.mode == "topk":
+            self._reduce(n_past, tokens, first, logits)
+        if self.mode == "full":
+            self._ensure_rows(end)[first:end] = logits
+        else:
+            keep = logits[-self.n_live :]
+            live = self._ensure_live()
+            positions = np.arange(end - len(keep), end)
+            slots = positions % self.n_live
+            live[slots] = keep
+            self._live_pos[slots] = positions
+        self.n_tokens = end
+
+    def _reduce(self, n_past: int, tokens: Sequence[int], first: int, logits: npt.NDArray[np.single]):
+        end = n_past + len(tokens)
+        self._ensure_compact(end)
+        # Positions without logits from this or an earlier decode
+        gap = min(self.n_tokens, n_past)
+        self._lse[gap:first] = np.nan
+        self._next_token[gap:end] = -1
+        if n_past > 0:
+            # Complete the row before the batch with its next token
+            previous = self._full_row(n_past - 1)
+            if previous is not None:
+                self._next_token[n_past - 1] = tokens[0]
+                self._next_logit[n_past - 1] = previous[tokens[0]]
+            elif self._next_token[n_past - 1] != tokens[0]:
+                self._next_token[n_past - 1] = -1
+        k = self.top_k
+        for start in range(0, len(logits), _REDUCE_ROWS):
+            chunk = logits[start : start + _REDUCE_ROWS]
+            p = slice(first + start, first + start + len(chunk))
+            top = np.argpartition(chunk, -k, axis=-1)[:, -k:]
+            values = np.take_along_axis(chunk, top, axis=-1)
+            order = np.argsort(-values, axis=-1)
+            self._top_ids[p] = np.take_along_axis(top, order, axis=-1)
+            self._top_logits[p] = np.take_along_axis(values, order, axis=-1)
+            self._lse[p] = _logsumexp(chunk)
+        # Within the batch, the token after each row is known already
+        next_tokens = np.asarray(tokens[first - n_past + 1 :], dtype=np.intc)
+        if len(next_tokens):
+            self._next_token[first : end - 1] = next_tokens
+            self._next_logit[first : end - 1] = logits[np.arange(len(next_tokens)), next_tokens]
+
+    def logprobs(
+        self, start: int, tokens: Sequence[int], k: int
+    ) -> Tuple[List[Optional[float]], List[List[int]], List[List[float]]]:
+        """Logprob of `tokens[i]` at position `start + i`, with the `k` most likely tokens there.
+
+        Returns the token logprobs and, for every position, the ids and
+        logprobs of its top `k` tokens, best first. In "topk" mode a token
+        logprob is None if it is neither the token evaluated after the
+        position nor among its top `top_k`.
+        """
+        if self.mode == "full":
+            return _dense_logprobs(self.rows[start : start + len(tokens)], tokens, k)
+        token_logprobs: List[Optional[float]] = []
+        top_ids: List[List[int]] = []
+        top_values: List[List[float]] = []
+        for i, token in enumerate(tokens):
+            pos = start + i
+            row = self._full_row(pos)
+            if row is not None:
+                logprob, ids, values = _dense_logprobs(row[None], [token], k)
+                token_logprobs.append(logprob[0])
+                top_ids.extend(ids)
+                top_values.extend(values)
+                continue
+            if self.mode != "topk" or pos < 0 or pos >= self.n_tokens or np.isnan(self._lse[pos]):
+                raise ValueError(
+                    f"Logits of position {pos} are not kept with logits_storage={self.mode!r}"
+                )
+            lse = self._lse[pos]
+            if self._next_token[pos] == token:
+                token_logprobs.append(float(self._next_logit[pos] - lse))
+            else:
+                match = np.flatnonzero(self._top_ids[pos] == token)
+                token_logprobs.append(
+                    float(self._top_logits[pos, match[0]] - lse) if len(match) else None
+                )
+            top_ids.append(self._top_ids[pos, :k].tolist())
+            top_values.append((self._top_logits[pos, :k] - lse).tolist())
+        return token_logprobs, top_ids, top_values
+
+    def save(self, n_tokens: int) -> "LlamaLogits":
+        """Copy of what is kept for the first `n_tokens` positions, trimmed to it."""
+        state = copy.copy(self)
+        state.n_tokens = n_tokens = min(n_tokens, self.n_tokens)
+        if self._rows is not None:
+            state._rows = self._rows[:n_tokens].copy()
+        if self._live is not None:
+            kept = (self._live_pos >= 0) & (self._live_pos < n_tokens)
+            state._live = self._live[kept].copy()
+            state._live_pos = self._live_pos[kept].copy()
+        for name in _COMPACT_FIELDS:
+            array = getattr(self, name)
+            if array is not None:
+                setattr(state, name, array[:n_tokens].copy())
+        return state
+
+    def load(self, state: "LlamaLogits"):
+        """Restore logits saved by `save` of a storage with the same mode."""
+        if state.mode != self.mode or state.n_vocab != self.n_vocab:
+            raise ValueError(
+                f"Cannot load logits saved with logits_storage={state.mode!r} "
+                f"into logits_storage={self.mode!r}"
+            )
+        n = state.n_tokens
+        self.n_tokens = 0
+        if state._rows is not None:
+            self._ensure_rows(n)[:n] = state._rows[:n]
+        if self._live_pos is not None:
+            self._live_pos[:] = -1
+        if state._live is not None and len(state._live):
+            live = self._ensure_live()
+            order = np.argsort(state._live_pos)[-self.n_live :]
+            positions = state._live_pos[order]
+            live[positions % self.n_live] = state._live[order]
+            self._live_pos[positions % self.n_live] = positions
+        if state._lse is not None:
+            self._ensure_compact(n)
+            for name in _COMPACT_FIELDS:
+                getattr(self, name)[:n] = getattr(state, name)[:n]
+        self.n_tokens = n
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import abc
 from typing import (
+    Dict,
     List,
     Optional,
     Any,
@@ -68,6 +69,90 @@ class LlamaTokenizer(BaseLlamaTokenizer):
         return cls(llama_cpp.Llama(model_path=path, vocab_only=True))
 
 
+def incomplete_utf8_suffix(data: bytes) -> int:
+    """Number of trailing bytes of `data` that belong to an unfinished UTF-8 character."""
+    for k in range(1, min(4, len(data)) + 1):
+        byte = data[-k]
+        if byte & 0xC0 == 0x80:
+            # continuation byte, keep looking for the lead byte
+            continue
+        if byte & 0xE0 == 0xC0:
+            size = 2
+        elif byte & 0xF0 == 0xE0:
+            size = 3
+        elif byte & 0xF8 == 0xF0:
+            size = 4
+        else:
+            size = 1
+        return k if size > k else 0
+    return 0
+
+
+class IncrementalDetokenizer:
+    """Detokenizes a generation one token at a time.
+
+    The text generated so far is kept in `text`, and `offsets[i]` /
+    `char_offsets[i]` hold the byte / character offset at which the i-th token
+    starts (the last entry is the current length). For `LlamaTokenizer` a token
+    always renders to the same piece, so pieces are cached and each step costs
+    a dict lookup. Other tokenizers render a token relative to the previous
+    `context` tokens.
+    """
+
+    context = 8
+
+    def __init__(self, tokenizer: BaseLlamaTokenizer, prev_tokens: Optional[List[int]] = None):
+        self._tokenizer = tokenizer
+        self._context_free = isinstance(tokenizer, LlamaTokenizer)
+        self._pieces: Dict[int, bytes] = {}
+        self._prev: List[int] = list(prev_tokens[-self.context :]) if prev_tokens else []
+        self._bos = tokenizer._model.token_bos() if self._context_free else None
+        self._strip_space = False
+        self.text = bytearray()
+        self.offsets: List[int] = [0]
+        self.char_offsets: List[int] = [0]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def piece(self, token: int) -> bytes:
+        """The bytes `token` adds when it follows the tokens pushed so far."""
+        if not self._context_free:
+            return self._tokenizer.detokenize([token], prev_tokens=self._prev)
+        piece = self._pieces.get(token)
+        if piece is None:
+            piece = self._tokenizer.detokenize([token])
+            self._pieces[token] = piece
+        return piece
+
+    def push(self, token: int) -> bytes:
+        """Append `token` and return the bytes it added to `text`."""
+        piece = self.piece(token)
+        if self._context_free:
+            # Like `_LlamaModel.detokenize`: drop the leading space of a text
+            # that starts with a BOS token
+            if len(self.offsets) == 1 and token == self._bos:
+                self._strip_space = True
+            elif self._strip_space and piece:
+                self._strip_space = False
+                if not self.text and piece[:1] == b" ":
+                    piece = piece[1:]
+        else:
+            self._prev.append(token)
+            del self._prev[: -self.context]
+        self.text += piece
+        self.offsets.append(len(self.text))
+        self.char_offsets.append(
+            self.char_offsets[-1] + sum(1 for byte in piece if byte & 0xC0 != 0x80)
+        )
+        return piece
+
+    @property
+    def incomplete_bytes(self) -> int:
+        """Trailing bytes of `text` that do not form a complete character yet."""
+        return incomplete_utf8_suffix(self.text[-4:])
+
+
 class LlamaHFTokenizer(BaseLlamaTokenizer):
     def __init__(self, hf_tokenizer: Any):
         self.hf_tokenizer = hf_tokenizer
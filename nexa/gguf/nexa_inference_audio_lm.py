@@ -2,10 +2,12 @@ import ctypes
 import logging
 import os
 import sys
-import time
+import tempfile
 import librosa
+import numpy as np
 import soundfile as sf
 from pathlib import Path
+from typing import Iterator, Union
 from streamlit.web import cli as stcli
 from nexa.utils import SpinningCursorAnimation, nexa_prompt
 from nexa.constants import (
@@ -18,6 +20,8 @@ from nexa.gguf.llama import audio_lm_cpp
 from nexa.gguf.llama._utils_transformers import suppress_stdout_stderr
 from nexa.general import pull_model
 
+SAMPLING_RATE = 16000
+
 def is_qwen(model_name):
     if "qwen" in model_name.lower():  # TEMPORARY SOLUTION : this hardcode can be risky
         return True
@@ -132,17 +136,24 @@ class NexaAudioLMInference:
             self.ctx_params.n_gpu_layers = (
                 0x7FFFFFFF if self.n_gpu_layers == -1 else self.n_gpu_layers
             )  # 0x7FFFFFFF is INT32 max, will be auto set to all layers
-
-            # self.context = audio_lm_cpp.init_context(
-            #     ctypes.byref(self.ctx_params), is_qwen=self.is_qwen
-            # )
-            # if not self.context:
-            #     raise RuntimeError("Failed to load audio language model")
-            # logging.debug("Model loaded successfully")
         except Exception as e:
             logging.error(f"Error loading model: {e}")
             raise
 
+    def _init_context(self):
+        """Create a fresh native context for one request.
+
+        The library has no call to reset a context's KV cache between
+        requests, so every request gets its own context, freed by `cleanup`.
+        """
+        self._free_context()
+        self.context = audio_lm_cpp.init_context(
+            ctypes.byref(self.ctx_params), is_qwen=self.is_qwen
+        )
+        if not self.context:
+            raise RuntimeError("Failed to load audio language model")
+        logging.debug("Model loaded successfully")
+
     def run(self):
         """
         Run the audio language model inference loop.
@@ -197,56 +208,36 @@ class NexaAudioLMInference:
                 print(f"'{audio_path}' is not a valid audio path. Please try again.")
 
     # @SpinningCursorAnimation()
-    def inference(self, audio_path: str, prompt: str = "") -> str:
+    def inference(self, audio: Union[str, np.ndarray], prompt: str = "") -> str:
         """
         Perform a single inference with the audio language model.
-        """
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"Audio file not found: {audio_path}")
 
+        `audio` is either the path to an audio file or 16kHz mono float PCM samples.
+        """
         try:
-            # Ensure audio is at 16kHz before processing
-            audio_path = self._ensure_16khz(audio_path)
-
-            self.ctx_params.file = ctypes.c_char_p(audio_path.encode("utf-8"))
-            self.ctx_params.prompt = ctypes.c_char_p(prompt.encode("utf-8"))
-
-            self.context = audio_lm_cpp.init_context(
-                ctypes.byref(self.ctx_params), is_qwen=self.is_qwen
-            )
-            if not self.context:
-                raise RuntimeError("Failed to load audio language model")
-            logging.debug("Model loaded successfully")
-
+            self._set_request(audio, prompt)
             response = audio_lm_cpp.process_full(
                 self.context, ctypes.byref(self.ctx_params), is_qwen=self.is_qwen
             )
             return response.decode("utf-8") if isinstance(response, bytes) else response
+        except FileNotFoundError:
+            raise
         except Exception as e:
             raise RuntimeError(f"Error during inference: {str(e)}")
+        finally:
+            self.cleanup()
 
-    def inference_streaming(self, audio_path: str, prompt: str = "") -> str:
+    def inference_streaming(self, audio: Union[str, np.ndarray], prompt: str = "") -> Iterator[str]:
         """
         Perform a single inference with the audio language model.
-        """
-        if not os.path.exists(audio_path):
-            raise FileNotFoundError(f"Audio file not found: {audio_path}")
 
+        `audio` is either the path to an audio file or 16kHz mono float PCM samples.
+        """
         try:
-            # Ensure audio is at 16kHz before processing
-            audio_path = self._ensure_16khz(audio_path)
-
-            self.ctx_params.file = ctypes.c_char_p(audio_path.encode("utf-8"))
-            self.ctx_params.prompt = ctypes.c_char_p(prompt.encode("utf-8"))
-
+            self._set_request(audio, prompt)
+            # The library has no free for the streaming state; it lives as long
+            # as the request's context, which cleanup() frees
             with suppress_stdout_stderr():
-                self.context = audio_lm_cpp.init_context(
-                    ctypes.byref(self.ctx_params), is_qwen=self.is_qwen
-                )
-                if not self.context:
-                    raise RuntimeError("Failed to load audio language model")
-                logging.debug("Model loaded successfully")
-
                 oss = audio_lm_cpp.process_streaming(
                     self.context, ctypes.byref(self.ctx_params), is_qwen=self.is_qwen
                 )
@@ -258,17 +249,40 @@ class NexaAudioLMInference:
                 if '<|im_start|>' in res_str or '</s>' in res_str:
                     continue
                 yield res_str
+        except FileNotFoundError:
+            raise
         except Exception as e:
             raise RuntimeError(f"Error during inference: {str(e)}")
+        finally:
+            self.cleanup()
 
-    def cleanup(self):
-        """
-        Explicitly cleanup resources
-        """
+    def _set_request(self, audio: Union[str, np.ndarray], prompt: str):
+        """Set up a context for this request's audio and prompt."""
+        if isinstance(audio, (str, os.PathLike)) and not os.path.exists(audio):
+            raise FileNotFoundError(f"Audio file not found: {audio}")
+
+        # Ensure audio is at 16kHz before processing
+        audio_path = self._ensure_16khz(audio)
+
+        # Keep the encoded strings referenced for as long as the params point at them
+        self._file_bytes = audio_path.encode("utf-8")
+        self._prompt_bytes = prompt.encode("utf-8")
+        self.ctx_params.file = ctypes.c_char_p(self._file_bytes)
+        self.ctx_params.prompt = ctypes.c_char_p(self._prompt_bytes)
+
+        with suppress_stdout_stderr():
+            self._init_context()
+
+    def _free_context(self):
         if self.context:
             audio_lm_cpp.free(self.context, is_qwen=self.is_qwen)
             self.context = None
-        
+
+    def cleanup(self):
+        """
+        Cleanup per-request resources: the native context and temporary files.
+        """
+        self._free_context()
         if self.temp_file and os.path.exists(self.temp_file):
             try:
                 os.remove(self.temp_file)
@@ -276,48 +290,44 @@ class NexaAudioLMInference:
             except Exception as e:
                 logging.warning(f"Failed to remove temporary file {self.temp_file}: {e}")
 
-    # def __del__(self):
-    #     """
-    #     Destructor to free the Bark context when the instance is deleted.
-    #     """
-    #     if self.context:
-    #         audio_lm_cpp.free(self.context, is_qwen=self.is_qwen)
+    def close(self):
+        """
+        Free any context still held, e.g. by an abandoned streaming request.
+        """
+        self.cleanup()
 
-    def _ensure_16khz(self, audio_path: str) -> str:
+    def _ensure_16khz(self, audio: Union[str, np.ndarray]) -> str:
         """
-        Check if audio is 16kHz, resample if necessary.
-        Supports various audio formats (mp3, wav, m4a, etc.)
+        Return the path of a 16kHz audio file for `audio`, resampling if necessary.
+        Supports various audio formats (mp3, wav, m4a, etc.) and in-memory PCM
+        samples, which are assumed to be 16kHz already.
         """
         try:
-            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            
-            # Create tmp directory if it doesn't exist
-            tmp_dir = os.path.join(base_dir, 'tmp')
-            os.makedirs(tmp_dir, exist_ok=True)
+            if isinstance(audio, (str, os.PathLike)):
+                audio_path = str(audio)
+                # Only the header is needed to know whether resampling is required
+                try:
+                    sr = sf.info(audio_path).samplerate
+                    y = None
+                except Exception:
+                    y, sr = librosa.load(audio_path, sr=None)
 
-            # Load audio file
-            y, sr = librosa.load(audio_path, sr=None)
+                if sr == SAMPLING_RATE:
+                    return audio_path
+
+                # Resample to 16kHz
+                print(f"Resampling audio from {sr} to {SAMPLING_RATE}")
+                if y is None:
+                    y, sr = librosa.load(audio_path, sr=None)
+                y = librosa.resample(y=y, orig_sr=sr, target_sr=SAMPLING_RATE)
+            else:
+                y = np.asarray(audio, dtype=np.float32)
+
+            # The native library reads its input from a file
+            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp:
+                sf.write(tmp, y, SAMPLING_RATE, subtype='PCM_16', format='WAV')
+                tmp_path = tmp.name
 
-            if sr == 16000:
-                return audio_path
-            
-            # Resample to 16kHz
-            print(f"Resampling audio from {sr} to 16000")
-            y_resampled = librosa.resample(y=y, orig_sr=sr, target_sr=16000)
-
-            # Create a unique filename in the tmp directory
-            original_name = os.path.splitext(os.path.basename(audio_path))[0]
-            tmp_filename = f"resampled_{original_name}_16khz_{int(time.time())}.wav"
-            tmp_path = os.path.join(tmp_dir, tmp_filename)
-            
-            # Save the resampled audio
-            sf.write(
-                tmp_path, 
-                y_resampled, 
-                16000,
-                subtype='PCM_16'
-            )
-            
             # Store the path for cleanup
             self.temp_file = tmp_path
             return tmp_path
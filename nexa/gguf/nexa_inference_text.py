@@ -121,6 +121,9 @@ class NexaTextInference:
                     n_ctx=self.params.get("nctx", 2048),
                     n_gpu_layers=n_gpu_layers,
                     lora_path=self.params.get("lora_path", ""),
+                    n_seq_max=self.params.get("n_seq_max", 1),
+                    n_threads=self.params.get("n_threads"),
+                    n_threads_batch=self.params.get("n_threads_batch"),
                 )
             except Exception as e:
                 logging.error(f"Failed to load model: {e}. Falling back to CPU.", exc_info=True)
@@ -131,6 +134,9 @@ class NexaTextInference:
                     n_ctx=self.params.get("nctx", 2048),
                     n_gpu_layers=0,  # hardcode to use CPU
                     lora_path=self.params.get("lora_path", ""),
+                    n_seq_max=self.params.get("n_seq_max", 1),
+                    n_threads=self.params.get("n_threads"),
+                    n_threads_batch=self.params.get("n_threads_batch"),
                 )
 
         load_time = time.time() - start_time
@@ -12,6 +12,7 @@ from nexa.constants import (
 from nexa.general import pull_model
 from nexa.utils import nexa_prompt, SpinningCursorAnimation
 from nexa.gguf.llama._utils_transformers import suppress_stdout_stderr
+from nexa.gguf.whisper_streaming import StreamASRProcessor
 import numpy as np
 
 
@@ -60,10 +61,8 @@ class NexaVoiceInference:
 
         self.params.update(kwargs)
 
-        # for StreamASRProcessor
-        self.audio_buffer = np.array([], dtype=np.float32)
-        self.commited = []
-        self.buffer_time_offset = 0.0
+        # for streaming transcription, created with the model
+        self.streamer = None
 
         self.model = None
 
@@ -87,50 +86,27 @@ class NexaVoiceInference:
             )
         logging.debug("Model loaded successfully")
 
-    # for StreamASRProcessor
-    def live_transcribe(self, audio, prompt=""):
-        segments, info = self.model.transcribe(audio, language=self.params["language"], beam_size=self.params["beam_size"], word_timestamps=True, condition_on_previous_text=True, initial_prompt=prompt)
-        return list(segments)
-
-    def ts_words(self, segments):
-        # return a list of (start, end, "word") for each word
-        words = []
-        for seg in segments:
-            if seg.no_speech_prob > 0.9:
-                continue
-            for w in seg.words:
-                words.append((w.start, w.end, w.word))
-        return words
-    
+    def _get_streamer(self):
+        if self.streamer is None:
+            self.streamer = StreamASRProcessor(
+                self.model,
+                task=self.params["task"],
+                language=self.params["language"],
+                beam_size=self.params["beam_size"],
+            )
+        return self.streamer
+
     def insert_audio_chunk(self, audio):
-        self.audio_buffer = np.append(self.audio_buffer, audio)
+        self._get_streamer().insert_audio_chunk(audio)
 
     def process_iter(self):
-        # Transcribe the current buffer
-        if len(self.audio_buffer) == 0:
-            return (None, None, "")
-        res = self.live_transcribe(self.audio_buffer)
-        tsw = self.ts_words(res)
-        if len(tsw) == 0:
-            return (None, None, "")
-
-        # We'll consider all words as committed for simplicity
-        self.commited = tsw
-        # return the entire transcription so far
-        text = " ".join([w[2] for w in self.commited])
-        beg = self.commited[0][0] + self.buffer_time_offset
-        end = self.commited[-1][1] + self.buffer_time_offset
-        return (beg, end, text)
+        """Transcribe the buffered audio and return the newly committed (start, end, text)."""
+        return self._get_streamer().process_iter()
 
     def finish(self):
         # Final flush when done
-        if len(self.commited) == 0:
-            return (None, None, "")
-        text = " ".join([w[2] for w in self.commited])
-        beg = self.commited[0][0] + self.buffer_time_offset
-        end = self.commited[-1][1] + self.buffer_time_offset
-        return (beg, end, text)
-        
+        return self._get_streamer().finish()
+
     def run(self):
         from nexa.gguf.llama._utils_spinner import start_spinner, stop_spinner
 
@@ -242,8 +218,12 @@ class NexaVoiceInference:
         audio, sr = librosa.load(audio_path, sr=SAMPLING_RATE, dtype=np.float32)
         duration = len(audio) / SAMPLING_RATE
 
+        self._get_streamer().init()
         start = time.time()
         beg = 0.0
+        # Every (start, end, text) yielded so far; the final event repeats
+        # the whole transcript
+        emitted = []
         while beg < duration:
             now = time.time() - start
             # Simulate waiting for real-time
@@ -262,6 +242,7 @@ class NexaVoiceInference:
             self.insert_audio_chunk(chunk_audio)
             o = self.process_iter()
             if o[0] is not None:
+                emitted.append(o)
                 yield {
                     "emission_time_ms": (time.time()-start)*1000,
                     "segment_start_ms": o[0]*1000,
@@ -269,14 +250,22 @@ class NexaVoiceInference:
                     "text": o[2]
                 }
 
-        # Final flush
+        # Final flush: yield the remaining words, then the full transcript
         o = self.finish()
         if o[0] is not None:
+            emitted.append(o)
             yield {
                 "emission_time_ms": (time.time()-start)*1000,
                 "segment_start_ms": o[0]*1000,
                 "segment_end_ms": o[1]*1000,
-                "text": o[2],
+                "text": o[2]
+            }
+        if emitted:
+            yield {
+                "emission_time_ms": (time.time()-start)*1000,
+                "segment_start_ms": emitted[0][0]*1000,
+                "segment_end_ms": emitted[-1][1]*1000,
+                "text": "".join(t[2] for t in emitted).strip(),
                 "final": True
             }
 
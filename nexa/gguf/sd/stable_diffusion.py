@@ -627,7 +627,7 @@ class StableDiffusion:
 
             # Load the image from the C sd_image_t and convert it to a PIL Image
             image = self._dereference_sd_image_t_p(image)
-            image = self._bytes_to_image(image["data"], image["width"], image["height"])
+            image = self._bytes_to_image(image["data"], image["width"], image["height"], image["channel"])
             upscaled_images.append(image)
 
         return upscaled_images
@@ -699,8 +699,9 @@ class StableDiffusion:
         # Convert the PIL Image to a byte array
         image_bytes = image.tobytes()
 
+        # Single memcpy into a C buffer; the cast pointer keeps it alive
         data = ctypes.cast(
-            (ctypes.c_byte * len(image_bytes))(*image_bytes),
+            (ctypes.c_uint8 * len(image_bytes)).from_buffer_copy(image_bytes),
             ctypes.POINTER(ctypes.c_uint8),
         )
         return data, width, height
@@ -729,7 +730,8 @@ class StableDiffusion:
     # ============= C sd_image_t to Image =============
 
     def _c_array_to_bytes(self, c_array, buffer_size: int):
-        return bytearray(ctypes.cast(c_array, ctypes.POINTER(ctypes.c_byte * buffer_size)).contents)
+        """View a C uint8 buffer as a ctypes array without copying it."""
+        return ctypes.cast(c_array, ctypes.POINTER(ctypes.c_uint8 * buffer_size)).contents
 
     def _dereference_sd_image_t_p(self, c_image: sd_cpp.sd_image_t):
         """Dereference a C sd_image_t pointer to a Python dictionary with height, width, channel and data (bytes)."""
@@ -780,24 +782,19 @@ class StableDiffusion:
         # Convert each image to PIL Image
         for i in range(len(images)):
             image = images[i]
-            images[i] = self._bytes_to_image(image["data"], image["width"], image["height"])
+            images[i] = self._bytes_to_image(image["data"], image["width"], image["height"], image["channel"])
 
         return images
 
     # ============= Bytes to Image =============
 
-    def _bytes_to_image(self, byte_data: bytes, width: int, height: int):
-        """Convert a byte array to a PIL Image."""
-        image = Image.new("RGBA", (width, height))
-
-        for y in range(height):
-            for x in range(width):
-                idx = (y * width + x) * 3
-                image.putpixel(
-                    (x, y),
-                    (byte_data[idx], byte_data[idx + 1], byte_data[idx + 2], 255),
-                )
-        return image
+    def _bytes_to_image(self, byte_data: bytes, width: int, height: int, channel: int = 3):
+        """Convert a byte array (or a view of a C buffer) to a RGBA PIL Image."""
+        mode = {1: "L", 3: "RGB", 4: "RGBA"}[channel]
+        # frombuffer wraps the data without copying; convert() makes the only
+        # copy, into memory owned by the returned image.
+        image = Image.frombuffer(mode, (width, height), byte_data, "raw", mode, 0, 1)
+        return image.convert("RGBA")
 
     def __setstate__(self, state):
         self.__init__(**state)
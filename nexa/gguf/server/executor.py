@@ -0,0 +1,162 @@
+import asyncio
+import contextlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, TypeVar
+
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+_ITEM = 0
+_ERROR = 1
+_DONE = 2
+
+
+class ServerBusyError(HTTPException):
+    """Raised when an executor already holds as many requests as it accepts."""
+
+    def __init__(self, detail: str):
+        super().__init__(status_code=429, detail=detail)
+
+
+class InferenceExecutor:
+    """Bounded worker pool that keeps blocking inference off the event loop.
+
+    At most `max_workers` calls run at once and at most `max_queue` more wait
+    for a worker; anything beyond that is rejected with `ServerBusyError`
+    instead of piling up behind a long generation.
+    """
+
+    def __init__(self, name: str, max_workers: int = 1, max_queue: int = 32):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"nexa-{name}"
+        )
+        self._lock = threading.Lock()
+        self._inflight = 0
+        # Submitted futures that have not finished, cancelled on shutdown
+        self._futures = set()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def _acquire(self):
+        with self._lock:
+            if self._inflight >= self.max_workers + self.max_queue:
+                raise ServerBusyError(
+                    f"Too many pending {self.name} requests, please retry later"
+                )
+            self._inflight += 1
+
+    def _submit(self, fn: Callable[[], Any]):
+        future = self._pool.submit(fn)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future=None):
+        with self._lock:
+            self._inflight -= 1
+            self._futures.discard(future)
+
+    @contextlib.contextmanager
+    def admit(self):
+        """Count a request served outside the pool (e.g. by a batch scheduler).
+
+        It takes a place among the `max_workers + max_queue` requests admitted
+        at once, or raises `ServerBusyError` when there is none, without
+        holding a worker.
+        """
+        self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run `fn(*args, **kwargs)` on a worker thread and await its result."""
+        self._acquire()
+        future = self._submit(functools.partial(fn, *args, **kwargs))
+        return await asyncio.wrap_future(future)
+
+    def iterate(
+        self,
+        make_iterator: Callable[[], Iterator[T]],
+        on_cancel: Optional[Callable[[], None]] = None,
+    ) -> AsyncIterator[T]:
+        """Drive a blocking iterator on a worker thread and yield its items.
+
+        The iterator is created by `make_iterator` on the worker thread. The
+        request is admitted (or rejected with `ServerBusyError`) right away so
+        that a full queue is reported before a streaming response starts. When
+        the consumer stops early (e.g. the client disconnected and the response
+        task was cancelled), the worker stops pulling items, closes the
+        iterator and `on_cancel` is called.
+        """
+        self._acquire()
+        loop = asyncio.get_running_loop()
+        items: "asyncio.Queue[tuple]" = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def put(kind: int, value: Any = None):
+            try:
+                loop.call_soon_threadsafe(items.put_nowait, (kind, value))
+            except RuntimeError:
+                # The event loop is already closed, nobody is listening.
+                pass
+
+        def produce():
+            try:
+                iterator = make_iterator()
+                try:
+                    for item in iterator:
+                        if cancelled.is_set():
+                            break
+                        put(_ITEM, item)
+                finally:
+                    close = getattr(iterator, "close", None)
+                    if close is not None:
+                        close()
+            except BaseException as e:
+                put(_ERROR, e)
+            finally:
+                put(_DONE)
+
+        self._submit(produce)
+        return self._consume(items, cancelled, on_cancel)
+
+    @staticmethod
+    async def _consume(
+        items: "asyncio.Queue[tuple]",
+        cancelled: threading.Event,
+        on_cancel: Optional[Callable[[], None]],
+    ) -> AsyncIterator[Any]:
+        finished = False
+        try:
+            while True:
+                kind, value = await items.get()
+                if kind == _DONE:
+                    finished = True
+                    break
+                if kind == _ERROR:
+                    finished = True
+                    raise value
+                yield value
+        finally:
+            if not finished:
+                cancelled.set()
+                if on_cancel is not None:
+                    on_cancel()
+
+    def shutdown(self):
+        with self._lock:
+            pending = list(self._futures)
+        for future in pending:
+            future.cancel()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,222 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from nexa.gguf.server.executor import InferenceExecutor, ServerBusyError
+
+
+def path_size(path: Optional[str]) -> int:
+    """Size in bytes of a model file, or of every file below a model directory."""
+    if not path or not os.path.exists(path):
+        return 0
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def default_memory_budget() -> Optional[int]:
+    """Half of the physical memory, or None where it cannot be determined."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+@dataclass
+class ModelSpec:
+    """Everything needed to (re)load a model after it has been evicted."""
+
+    model_path: str
+    model_type: Optional[str] = None
+    is_local_path: bool = False
+    is_huggingface: bool = False
+    is_modelscope: bool = False
+    projector_path: Optional[str] = None
+
+
+@dataclass
+class ResidentModel:
+    """A loaded model together with the state the endpoints need to use it.
+
+    `refs` counts requests currently using the model. A model replaced or
+    evicted while still in use is only marked `retired`; it is closed when
+    its last reference is released.
+    """
+
+    name: str
+    model_type: str
+    model: Any
+    spec: ModelSpec
+    size_bytes: int = 0
+    chat_format: Optional[str] = None
+    completion_template: Optional[str] = None
+    batch_scheduler: Any = None
+    executor: Optional[InferenceExecutor] = None
+    # Models backed by process-wide native state (e.g. OmniVLM) cannot be
+    # resident next to another model of the same group.
+    exclusive_group: Optional[str] = None
+    last_used: float = field(default_factory=time.monotonic)
+    refs: int = 0
+    retired: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def exclusive(self):
+        """Context for calling the model directly, outside the batch scheduler."""
+        if self.batch_scheduler is not None:
+            return self.batch_scheduler.exclusive()
+        return self.lock
+
+    def close(self):
+        if self.batch_scheduler is not None:
+            self.batch_scheduler.close()
+            self.batch_scheduler = None
+        if self.executor is not None:
+            self.executor.shutdown()
+        close = getattr(self.model, "close", None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                logging.error(f"Error closing model {self.name}: {e}")
+        self.model = None
+
+
+class ModelPool:
+    """Keeps several models resident and evicts the least recently used ones.
+
+    Models are keyed by name (the model path used to load them). Whenever a
+    new model is about to be loaded, idle models are evicted in LRU order until
+    the new model fits into `max_memory_bytes` (no limit when None).
+    """
+
+    def __init__(self, max_memory_bytes: Optional[int] = None):
+        self.max_memory_bytes = max_memory_bytes
+        self._models: "OrderedDict[str, ResidentModel]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._models
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._models.values())
+
+    def models(self) -> List[ResidentModel]:
+        """Resident models, least recently used first."""
+        with self._lock:
+            return list(self._models.values())
+
+    def acquire(self, name: str) -> Optional[ResidentModel]:
+        """Return a resident model with one more reference held, or None."""
+        with self._lock:
+            entry = self._models.get(name)
+            if entry is None:
+                return None
+            self._models.move_to_end(name)
+            entry.last_used = time.monotonic()
+            entry.refs += 1
+            return entry
+
+    def retain(self, entry: ResidentModel):
+        """Take one more reference on a model the caller already holds."""
+        with self._lock:
+            entry.refs += 1
+
+    def release(self, entry: ResidentModel):
+        with self._lock:
+            entry.refs -= 1
+            entry.last_used = time.monotonic()
+            closing = entry.retired and entry.refs == 0
+        if closing:
+            logging.info(f"Closing retired model {entry.name}")
+            entry.close()
+
+    def _retire(self, entry: ResidentModel) -> Optional[ResidentModel]:
+        """Mark a model removed from the pool; return it if it can be closed now.
+
+        Must be called with `_lock` held. A model still in use is closed by
+        the `release` that drops its last reference.
+        """
+        entry.retired = True
+        return entry if entry.refs == 0 else None
+
+    def make_room(self, size_bytes: int, exclusive_group: Optional[str] = None):
+        """Evict idle models until `size_bytes` more fit into the budget.
+
+        Models sharing `exclusive_group` are always evicted, and
+        `ServerBusyError` is raised if one of them is still in use. When every
+        remaining model is in use the budget is exceeded rather than failing
+        the request.
+        """
+        evicted = []
+        with self._lock:
+            if exclusive_group is not None:
+                for name, entry in list(self._models.items()):
+                    if entry.exclusive_group != exclusive_group:
+                        continue
+                    if entry.refs > 0:
+                        raise ServerBusyError(
+                            f"Model {name} is in use and cannot be resident next to the requested model"
+                        )
+                    evicted.append(self._retire(self._models.pop(name)))
+            if self.max_memory_bytes is not None:
+                used = sum(entry.size_bytes for entry in self._models.values())
+                for name, entry in list(self._models.items()):
+                    if used + size_bytes <= self.max_memory_bytes:
+                        break
+                    if entry.refs > 0:
+                        continue
+                    evicted.append(self._retire(self._models.pop(name)))
+                    used -= entry.size_bytes
+                if used + size_bytes > self.max_memory_bytes:
+                    logging.warning(
+                        f"Model memory budget exceeded: {used + size_bytes} > {self.max_memory_bytes} bytes"
+                    )
+        for entry in evicted:
+            logging.info(f"Evicting model {entry.name} ({entry.size_bytes} bytes)")
+            entry.close()
+
+    def add(self, entry: ResidentModel) -> ResidentModel:
+        """Make `entry` resident, replacing a previous model of the same name.
+
+        The returned entry already holds one reference for the caller.
+        """
+        with self._lock:
+            previous = self._models.pop(entry.name, None)
+            if previous is not None:
+                previous = self._retire(previous)
+            entry.refs += 1
+            self._models[entry.name] = entry
+        if previous is not None:
+            previous.close()
+        return entry
+
+    def evict(self, name: str) -> bool:
+        """Remove a model from the pool; it is closed once no request uses it."""
+        with self._lock:
+            entry = self._models.pop(name, None)
+            if entry is None:
+                return False
+            entry = self._retire(entry)
+        if entry is not None:
+            entry.close()
+        return True
+
+    def clear(self):
+        with self._lock:
+            entries = [self._retire(entry) for entry in self._models.values()]
+            self._models.clear()
+        for entry in entries:
+            if entry is not None:
+                entry.close()
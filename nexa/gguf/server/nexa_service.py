@@ -4,13 +4,15 @@ import os
 import socket
 import time
 import uuid
+import asyncio
 from typing import List, Optional, Dict, Any, Union, Literal
 import base64
 import multiprocessing
 from PIL import Image
 import tempfile
 import uvicorn
-from fastapi import FastAPI, HTTPException, Request, File, UploadFile, Query
+from fastapi import FastAPI, HTTPException, Request, File, UploadFile, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, HttpUrl, AnyUrl, Field
@@ -31,7 +33,6 @@ from nexa.constants import (
     NEXA_RUN_COMPLETION_TEMPLATE_MAP,
     NEXA_RUN_MODEL_PRECISION_MAP,
     NEXA_RUN_MODEL_MAP_FUNCTION_CALLING,
-    NEXA_MODEL_LIST_PATH
 )
 from nexa.gguf.lib_utils import is_gpu_available
 from nexa.gguf.llama.llama_chat_format import (
@@ -41,11 +42,23 @@ from nexa.gguf.llama.llama_chat_format import (
 )
 from nexa.gguf.llama._utils_transformers import suppress_stdout_stderr
 from nexa.general import pull_model
+from nexa.model_registry import model_registry
 from nexa.gguf.llama.llama import Llama
+from nexa.gguf.llama.llama_embedding import LlamaEmbedder
+import nexa.gguf.llama.llama_cpp as llama_cpp
+from nexa.gguf.llama.llama_batch_scheduler import LlamaBatchScheduler
+from nexa.gguf.server.executor import InferenceExecutor
+from nexa.gguf.server.model_pool import ModelPool, ModelSpec, ResidentModel, default_memory_budget, path_size
 from nexa.gguf.nexa_inference_vlm_omni import NexaOmniVlmInference
 from nexa.gguf.nexa_inference_audio_lm import NexaAudioLMInference
 from nexa.gguf.sd.stable_diffusion import StableDiffusion
-from faster_whisper import WhisperModel
+from nexa.gguf.whisper_streaming import StreamASRProcessor
+from nexa.gguf.whisper_batch_scheduler import WhisperBatchScheduler
+from faster_whisper import WhisperModel, decode_audio
+try:
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+except ImportError:
+    VadOptions = get_speech_timestamps = None
 import numpy as np
 import argparse
 import soundfile as sf
@@ -81,16 +94,19 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-model = None
-whisper_model = None
-chat_format = None
-completion_template = None
+model_pool = ModelPool()
+model_specs: Dict[str, ModelSpec] = {}
+model_load_lock = asyncio.Lock()
 hostname = socket.gethostname()
 chat_completion_system_prompt = [{"role": "system", "content": "You are a helpful assistant"}]
 function_call_system_prompt = [{"role": "system", "content": "A chat between a curious user and an artificial intelligence assistant. The assistant gives helpful, detailed, and polite answers to the user's questions. The assistant calls functions with appropriate input when necessary"}]
 model_path = None
 whisper_model_path = "faster-whisper-tiny"  # by default, use tiny whisper model
 n_ctx = None
+n_parallel = 1
+max_queue = 32
+audio_batch_size = 0
+max_model_memory = None
 is_local_path = False
 model_type = None
 is_huggingface = False
@@ -107,6 +123,7 @@ class GenerationRequest(BaseModel):
     stop_words: Optional[List[str]] = []
     logprobs: Optional[int] = None
     stream: Optional[bool] = False
+    model: Optional[str] = Field(default=None, description="Model to use; defaults to the model loaded at startup or via /v1/load_model")
 
 class TextContent(BaseModel):
     type: Literal["text"] = "text"
@@ -140,6 +157,7 @@ class ChatCompletionRequest(BaseModel):
     top_logprobs: Optional[int] = 4
     top_k: Optional[int] = 40
     top_p: Optional[float] = 0.95
+    model: Optional[str] = Field(default=None, description="Model to use; defaults to the model loaded at startup or via /v1/load_model")
 
 class VLMChatCompletionRequest(BaseModel):
     messages: List[Message] = [
@@ -157,6 +175,7 @@ class VLMChatCompletionRequest(BaseModel):
     stop_words: Optional[List[str]] = []
     top_k: Optional[int] = 40
     top_p: Optional[float] = 0.95
+    model: Optional[str] = Field(default=None, description="Model to use; defaults to the model loaded at startup or via /v1/load_model")
 
 class FunctionDefinitionRequestClass(BaseModel):
     type: str = "function"
@@ -191,6 +210,7 @@ class FunctionCallRequest(BaseModel):
         )
     ]
     tool_choice: Optional[str] = "auto"
+    model: Optional[str] = Field(default=None, description="Model to use; defaults to the model loaded at startup or via /v1/load_model")
 
 class ImageGenerationRequest(BaseModel):
     prompt: str = "A girl, standing in a field of flowers, vivid"
@@ -201,12 +221,15 @@ class ImageGenerationRequest(BaseModel):
     sample_steps: int = 20
     seed: int = 0
     negative_prompt: Optional[str] = ""
+    model: Optional[str] = Field(default=None, description="Model to use; defaults to the model loaded at startup or via /v1/load_model")
 
 # New request class for embeddings
 class EmbeddingRequest(BaseModel):
     input: Union[str, List[str]] = Field(..., description="The input text to get embeddings for. Can be a string or an array of strings.")
     normalize: Optional[bool] = False
-    truncate: Optional[bool] = True
+    truncate: Optional[bool] = Field(default=True, description="Cut inputs at the batch size; when false, longer inputs are embedded in batch-size windows that are mean-pooled")
+    encoding_format: Literal["float", "base64"] = Field(default="float", description="`base64` returns each embedding as base64 of its little-endian float32 values")
+    model: Optional[str] = Field(default=None, description="Model to use; defaults to the model loaded at startup or via /v1/load_model")
 
 class LoadModelRequest(BaseModel):
     model_path: str = "llama3.2"
@@ -229,77 +252,34 @@ class DownloadModelRequest(BaseModel):
         "protected_namespaces": ()
     }
 
-class StreamASRProcessor:
-    def __init__(self, asr, task, language):
-        self.asr = asr
-        self.task = task
-        self.language = None if language == "auto" else language
-        self.audio_buffer = np.array([], dtype=np.float32)
-        self.commited = []
-        self.buffer_time_offset = 0.0
-
-    def insert_audio_chunk(self, audio):
-        self.audio_buffer = np.append(self.audio_buffer, audio)
-
-    def process_iter(self):
-        if len(self.audio_buffer) == 0:
-            return (None, None, "")
-        res = self.transcribe(self.audio_buffer)
-        tsw = self.ts_words(res)
-        if len(tsw) == 0:
-            return (None, None, "")
-
-        self.commited = tsw
-        text = " ".join([w[2] for w in self.commited])
-        beg = self.commited[0][0] + self.buffer_time_offset
-        end = self.commited[-1][1] + self.buffer_time_offset
-        return (beg, end, text)
-
-    def finish(self):
-        if len(self.commited) == 0:
-            return (None, None, "")
-        text = " ".join([w[2] for w in self.commited])
-        beg = self.commited[0][0] + self.buffer_time_offset
-        end = self.commited[-1][1] + self.buffer_time_offset
-        return (beg, end, text)
-
-    def transcribe(self, audio, prompt=""):
-        segments, info = self.asr.transcribe(
-            audio, 
-            language=self.language,
-            task=self.task,
-            beam_size=5, 
-            word_timestamps=True, 
-            condition_on_previous_text=True, 
-            initial_prompt=prompt
-        )
-        return list(segments)
-
-    def ts_words(self, segments):
-        words = []
-        for seg in segments:
-            if seg.no_speech_prob > 0.9:
-                continue
-            for w in seg.words:
-                words.append((w.start, w.end, w.word))
-        return words
-
 # helper functions
-async def load_model():
-    global model, chat_format, completion_template, model_path, n_ctx, is_local_path, model_type, is_huggingface, is_modelscope, projector_path
-    if is_local_path:
+def load_resident_model(spec: ModelSpec) -> ResidentModel:
+    """Download (if needed) and initialise the model described by `spec`.
+
+    Idle models are evicted from the pool before the new model is created, so
+    the budget holds at peak as well. The returned model is resident and
+    already holds one reference for the caller.
+    """
+    model_path = spec.model_path
+    model_type = spec.model_type
+    projector_downloaded_path = None
+    chat_format = None
+    completion_template = None
+    batch_scheduler = None
+    exclusive_group = None
+    if spec.is_local_path:
         if model_type == "Multimodal":
-            if not projector_path:
+            if not spec.projector_path:
                 raise ValueError("Projector path must be provided when using local path for Multimodal models")
             downloaded_path = model_path
-            projector_downloaded_path = projector_path
+            projector_downloaded_path = spec.projector_path
         else:
             downloaded_path = model_path
-    elif is_huggingface or is_modelscope:
+    elif spec.is_huggingface or spec.is_modelscope:
         # TODO: currently Multimodal models and Audio models are not supported for Hugging Face
         if model_type == "Multimodal" or model_type == "Audio":
             raise ValueError("Multimodal and Audio models are not supported for Hugging Face")
-        downloaded_path, _ = pull_model(model_path, hf=is_huggingface, ms=is_modelscope)
+        downloaded_path, _ = pull_model(model_path, hf=spec.is_huggingface, ms=spec.is_modelscope)
     else:
         if model_path in NEXA_RUN_MODEL_MAP_VLM or model_path in NEXA_RUN_OMNI_VLM_MAP or model_path in NEXA_RUN_MODEL_MAP_AUDIO_LM:
             if model_path in NEXA_RUN_OMNI_VLM_MAP:
@@ -312,10 +292,20 @@ async def load_model():
                 downloaded_path, model_type = pull_model(NEXA_RUN_MODEL_MAP_AUDIO_LM[model_path])
                 projector_downloaded_path, _ = pull_model(NEXA_RUN_AUDIO_LM_PROJECTOR_MAP[model_path])
         else:
-            downloaded_path, model_type = pull_model(model_path)
-            
+            downloaded_path, run_type = pull_model(model_path)
+            # Whisper models are requested as "Audio" by the audio endpoints
+            model_type = "Audio" if model_type == "Audio" else run_type
+
     print(f"model_type: {model_type}")
-    
+
+    if model_type == "Multimodal" and 'omni' in model_path.lower():
+        # OmniVLM keeps its weights in process-wide state
+        exclusive_group = "omnivlm"
+    model_pool.make_room(
+        path_size(downloaded_path) + path_size(projector_downloaded_path),
+        exclusive_group=exclusive_group,
+    )
+
     if model_type == "NLP" or model_type == "Text Embedding":
         if model_path in NEXA_RUN_MODEL_MAP_FUNCTION_CALLING:
             chat_format = "chatml-function-calling"
@@ -327,7 +317,9 @@ async def load_model():
                         chat_format=chat_format,
                         n_gpu_layers=-1 if is_gpu_available() else 0,
                         logits_all=True,
+                        logits_storage="topk",
                         n_ctx=n_ctx,
+                        n_seq_max=n_parallel,
                         embedding=False
                     )
                 except Exception as e:
@@ -340,7 +332,9 @@ async def load_model():
                         chat_format=chat_format,
                         n_gpu_layers=0,  # hardcode to use CPU,
                         logits_all=True,
+                        logits_storage="topk",
                         n_ctx=n_ctx,
+                        n_seq_max=n_parallel,
                         embedding=False
                     )
 
@@ -357,7 +351,9 @@ async def load_model():
                         chat_format=chat_format,
                         n_gpu_layers=-1 if is_gpu_available() else 0,
                         logits_all=True,
+                        logits_storage="topk",
                         n_ctx=n_ctx,
+                        n_seq_max=n_parallel,
                         embedding=model_type == "Text Embedding"
                     )
                 except Exception as e:
@@ -370,12 +366,14 @@ async def load_model():
                         chat_format=chat_format,
                         n_gpu_layers=0,  # hardcode to use CPU
                         logits_all=True,
+                        logits_storage="topk",
                         n_ctx=n_ctx,
+                        n_seq_max=n_parallel,
                         embedding=model_type == "Text Embedding"
                     )
                 logging.info(f"model loaded as {model}")
                 chat_format = model.metadata.get("tokenizer.chat_template", None)
-            
+
             if (
                 completion_template is None
                 and (
@@ -385,6 +383,10 @@ async def load_model():
             ):
                 chat_format = chat_format
                 logging.debug("Chat format detected")
+
+            if model_type == "NLP":
+                batch_scheduler = LlamaBatchScheduler(model, n_parallel=n_parallel)
+                logging.info(f"Continuous batching enabled with {n_parallel} parallel sequence(s)")
     elif model_type == "Computer Vision":
         with suppress_stdout_stderr():
             model = StableDiffusion(
@@ -417,7 +419,7 @@ async def load_model():
                 projector = (projector_handler(
                     clip_model_path=projector_downloaded_path, verbose=False
                 ) if projector_downloaded_path else None)
-                
+
                 chat_format = NEXA_RUN_CHAT_TEMPLATE_MAP.get(model_path, None)
                 try:
                     model = Llama(
@@ -444,7 +446,7 @@ async def load_model():
         logging.info(f"Model loaded as {model}")
     elif model_type == "AudioLM":
         with suppress_stdout_stderr():
-            try: 
+            try:
                 model = NexaAudioLMInference(
                     model_path=model_path,
                     device="gpu" if is_gpu_available() else "cpu"
@@ -459,30 +461,116 @@ async def load_model():
                     device="cpu"
                 )
         logging.info(f"model loaded as {model}")
+    elif model_type == "Audio":
+        with suppress_stdout_stderr():
+            model = WhisperModel(
+                downloaded_path,
+                device="cpu", # only support cpu for now because cuDNN needs to be installed on user's machine
+                compute_type="default"
+            )
+        logging.info(f"whisper model loaded as {model}")
+        if audio_batch_size > 0:
+            batch_scheduler = WhisperBatchScheduler(model, batch_size=audio_batch_size)
+            logging.info(f"Batched transcription enabled with batch size {audio_batch_size}")
     else:
         raise ValueError(f"Model {model_path} not found in Model Hub. If you are using local path, be sure to add --local_path and --model_type flags.")
 
+    spec.model_type = model_type
+    model_specs[model_path] = spec
+    return model_pool.add(ResidentModel(
+        name=model_path,
+        model_type=model_type,
+        model=model,
+        spec=spec,
+        size_bytes=path_size(downloaded_path) + path_size(projector_downloaded_path),
+        chat_format=chat_format,
+        completion_template=completion_template,
+        batch_scheduler=batch_scheduler,
+        executor=InferenceExecutor(
+            model_type,
+            max_workers=n_parallel + 1 if model_type == "NLP" else 1,
+            max_queue=max_queue,
+        ),
+        exclusive_group=exclusive_group,
+    ))
+
+async def acquire_model(name: Optional[str] = None, audio: bool = False) -> ResidentModel:
+    """Return the resident model called `name`, loading it on first use.
+
+    Without a name the default model (or the default Whisper model for audio
+    endpoints) is used. The caller must hand the model back with
+    `model_pool.release` once the request is done with it.
+    """
+    if name is None:
+        name = whisper_model_path if audio else model_path
+    if not name:
+        raise HTTPException(
+            status_code=400,
+            detail="No model is loaded. Please load a model first or pass one in the `model` field."
+        )
+    entry = model_pool.acquire(name)
+    if entry is not None:
+        return entry
+    async with model_load_lock:
+        # another request may have loaded it while we waited
+        entry = model_pool.acquire(name)
+        if entry is not None:
+            return entry
+        spec = model_specs.get(name) or ModelSpec(model_path=name, model_type="Audio" if audio else None)
+        return await run_in_threadpool(load_resident_model, spec)
+
+def hold_model(entry: ResidentModel, stream):
+    """Keep `entry` referenced until the streamed response is finished."""
+    model_pool.retain(entry)
+
+    async def held():
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            model_pool.release(entry)
+
+    return held()
+
+async def load_model():
+    """Make the configured model resident and the default for requests without a `model`."""
+    global model_type
+    spec = ModelSpec(
+        model_path=model_path,
+        model_type=model_type,
+        is_local_path=is_local_path,
+        is_huggingface=is_huggingface,
+        is_modelscope=is_modelscope,
+        projector_path=projector_path,
+    )
+    known = model_specs.get(model_path)
+    if known is not None and spec.model_type is None:
+        spec.model_type = known.model_type
+    if known != spec:
+        # the same name may have been loaded with different options before
+        model_pool.evict(model_path)
+        model_specs[model_path] = spec
+    entry = await acquire_model(model_path)
+    model_type = entry.model_type
+    model_pool.release(entry)
+
 async def load_whisper_model(custom_whisper_model_path=None):
-    global whisper_model, whisper_model_path
+    global whisper_model_path
     try:
         if custom_whisper_model_path:
             whisper_model_path = custom_whisper_model_path
-        downloaded_path, _ = pull_model(whisper_model_path)
-        with suppress_stdout_stderr():
-            whisper_model = WhisperModel(
-                downloaded_path,
-                device="cpu", # only support cpu for now because cuDNN needs to be installed on user's machine
-                compute_type="default"
-            )
-        logging.info(f"whisper model loaded as {whisper_model}")
+        entry = await acquire_model(whisper_model_path, audio=True)
+        model_pool.release(entry)
     except Exception as e:
         logging.error(f"Error loading Whisper model: {e}")
         raise ValueError(f"Failed to load Whisper model: {str(e)}")
 
 def nexa_run_text_generation(
-    prompt, temperature, stop_words, max_new_tokens, top_k, top_p, logprobs=None, stream=False, is_chat_completion=True
+    entry: ResidentModel, prompt, temperature, stop_words, max_new_tokens, top_k, top_p, logprobs=None, stream=False, is_chat_completion=True
 ) -> Dict[str, Any]:
-    global model, chat_format, completion_template
+    model = entry.model
+    completion_template = entry.completion_template
+    batch_scheduler = entry.batch_scheduler
     if model is None:
         raise ValueError("Model is not loaded. Please check the model path and try again.")
     
@@ -490,11 +578,38 @@ def nexa_run_text_generation(
     logprobs_or_none = None
 
     if is_chat_completion:
-        if is_local_path or is_huggingface or is_modelscope: # do not add system prompt if local path or huggingface or modelscope
+        spec = entry.spec
+        if spec.is_local_path or spec.is_huggingface or spec.is_modelscope: # do not add system prompt if local path or huggingface or modelscope
             messages = [{"role": "user", "content": prompt}]
         else:
             messages = chat_completion_system_prompt + [{"role": "user", "content": prompt}]
+    elif completion_template:
+        formatted_prompt = completion_template.format(input=prompt)
+    else:
+        formatted_prompt = prompt
+
+    # Requests without logprobs are decoded together with other in-flight
+    # requests; everything else takes the model exclusively.
+    if batch_scheduler is not None and not logprobs and (
+        not is_chat_completion or batch_scheduler.supports_chat
+    ):
+        batch_params = {
+            'temperature': temperature,
+            'max_tokens': max_new_tokens,
+            'top_k': top_k,
+            'top_p': top_p,
+            'stop': stop_words,
+        }
+        if is_chat_completion:
+            request = batch_scheduler.submit_chat(messages, **batch_params)
+        else:
+            request = batch_scheduler.submit(formatted_prompt, **batch_params)
 
+        if stream:
+            return ({"content": content, "logprobs": None} for content in request)
+        return {"result": request.result(), "logprobs": None}
+
+    if is_chat_completion:
         params = {
             'messages': messages,
             'temperature': temperature,
@@ -508,11 +623,6 @@ def nexa_run_text_generation(
 
         streamer = model.create_chat_completion(**params)
     else:
-        if completion_template:
-            formatted_prompt = completion_template.format(input=prompt)
-        else:
-            formatted_prompt = prompt
-
         params = {
             'prompt': formatted_prompt,
             'temperature': temperature,
@@ -528,25 +638,27 @@ def nexa_run_text_generation(
 
     if stream:
         def stream_with_logprobs():
-            for chunk in streamer:
-                if is_chat_completion:
-                    delta = chunk["choices"][0]["delta"]
-                    content = delta.get("content", "")
-                else:
-                    delta = chunk["choices"][0]["text"]
-                    content = delta
-
-                chunk_logprobs = None
-                if logprobs and "logprobs" in chunk["choices"][0]:
-                    chunk_logprobs = chunk["choices"][0]["logprobs"]
-
-                yield {
-                    "content": content,
-                    "logprobs": chunk_logprobs
-                }
+            with entry.exclusive():
+                for chunk in streamer:
+                    if is_chat_completion:
+                        delta = chunk["choices"][0]["delta"]
+                        content = delta.get("content", "")
+                    else:
+                        delta = chunk["choices"][0]["text"]
+                        content = delta
+
+                    chunk_logprobs = None
+                    if logprobs and "logprobs" in chunk["choices"][0]:
+                        chunk_logprobs = chunk["choices"][0]["logprobs"]
+
+                    yield {
+                        "content": content,
+                        "logprobs": chunk_logprobs
+                    }
 
         return stream_with_logprobs()
-    else:
+
+    with entry.exclusive():
         for chunk in streamer:
             if is_chat_completion:
                 delta = chunk["choices"][0]["delta"]
@@ -570,7 +682,8 @@ def nexa_run_text_generation(
     }
     return result
 
-async def nexa_run_image_generation(
+def nexa_run_image_generation(
+    entry: ResidentModel,
     prompt,
     image_path,
     cfg_scale,
@@ -580,7 +693,7 @@ async def nexa_run_image_generation(
     seed,
     negative_prompt = "",
 ):
-    global model
+    model = entry.model
     if model is None:
         raise ValueError("Model is not loaded. Please check the model path and try again.")
 
@@ -612,6 +725,18 @@ async def nexa_run_image_generation(
     return generated_image
 
 
+def save_generated_images(images, prefix: str) -> List[ImageResponse]:
+    data = []
+    for image in images:
+        id = int(time.time())
+        if not os.path.exists("nexa_server_output"):
+            os.makedirs("nexa_server_output")
+        image_path = os.path.join("nexa_server_output", f"{prefix}_{id}.png")
+        image.save(image_path)
+        data.append(ImageResponse(base64=base64_encode_image(image_path), url=os.path.abspath(image_path)))
+    return data
+
+
 def base64_encode_image(image_path):
     with open(image_path, "rb") as image_file:
         return base64.b64encode(image_file.read()).decode("utf-8")
@@ -670,7 +795,7 @@ def load_audio_from_bytes(audio_bytes: bytes):
     return a
 
 def run_nexa_ai_service(model_path_arg=None, is_local_path_arg=False, model_type_arg=None, huggingface=False, modelscope=False, projector_local_path_arg=None, **kwargs):
-    global model_path, n_ctx, is_local_path, model_type, is_huggingface, is_modelscope, projector_path
+    global model_path, n_ctx, n_parallel, max_queue, audio_batch_size, max_model_memory, is_local_path, model_type, is_huggingface, is_modelscope, projector_path
     is_local_path = is_local_path_arg
     is_huggingface = huggingface
     is_modelscope = modelscope
@@ -686,6 +811,14 @@ def run_nexa_ai_service(model_path_arg=None, is_local_path_arg=False, model_type
         model_path = model_path_arg
         model_type = None
     n_ctx = kwargs.get("nctx", 2048)
+    n_parallel = kwargs.get("n_parallel", 1)
+    max_queue = kwargs.get("max_queue", 32)
+    audio_batch_size = kwargs.get("audio_batch_size", 0)
+    max_model_memory = kwargs.get("max_model_memory", None)
+    if max_model_memory is not None:
+        model_pool.max_memory_bytes = int(max_model_memory * 1024**3)
+    else:
+        model_pool.max_memory_bytes = default_memory_budget()
     host = kwargs.get("host", "localhost")
     port = kwargs.get("port", 8000)
     reload = kwargs.get("reload", False)
@@ -709,9 +842,9 @@ async def read_root(request: Request):
     )
 
 
-def _resp_async_generator(streamer):
+async def _resp_async_generator(streamer):
     _id = str(uuid.uuid4())
-    for token in streamer:
+    async for token in streamer:
         chunk = {
             "id": _id,
             "object": "chat.completion.chunk",
@@ -810,41 +943,59 @@ async def load_different_whisper_model(request: LoadWhisperModelRequest):
             detail=f"Failed to load Whisper model: {str(e)}"
         )
 
+@app.get("/v1/loaded_models", tags=["Model"])
+async def loaded_models():
+    """List the models currently resident in memory, least recently used first"""
+    return {
+        "default_model": model_path,
+        "default_whisper_model": whisper_model_path,
+        "max_memory_bytes": model_pool.max_memory_bytes,
+        "used_bytes": model_pool.used_bytes,
+        "models": [
+            {
+                "model_path": entry.name,
+                "model_type": entry.model_type,
+                "size_bytes": entry.size_bytes,
+                "in_use": entry.refs,
+            } for entry in model_pool.models()
+        ],
+    }
+
 @app.get("/v1/list_models", tags=["Model"])
 async def list_models():
     """List all models available in the model hub"""
     try:
-        if NEXA_MODEL_LIST_PATH.exists():
-            with open(NEXA_MODEL_LIST_PATH, "r") as f:
-                model_list = json.load(f)
-        else:
-            model_list = {}
-        return JSONResponse(content=model_list)
+        return JSONResponse(content=model_registry.models())
     except Exception as e:
         logging.error(f"Error listing models: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/v1/completions", tags=["NLP"])
 async def generate_text(request: GenerationRequest):
+    entry = None
     try:
-        if model_type != "NLP":
+        entry = await acquire_model(request.model)
+        if entry.model_type != "NLP":
             raise HTTPException(
                 status_code=400,
                 detail="The model that is loaded is not an NLP model. Please use an NLP model for text generation."
             )
-        generation_kwargs = request.dict()
+        generation_kwargs = request.dict(exclude={"model"})
+        executor = entry.executor
         if request.stream:
             # Run the generation and stream the response
-            streamer = nexa_run_text_generation(is_chat_completion=False, **generation_kwargs)
-            return StreamingResponse(_resp_async_generator(streamer), media_type="application/x-ndjson")
+            streamer = executor.iterate(
+                lambda: nexa_run_text_generation(entry, is_chat_completion=False, **generation_kwargs)
+            )
+            return StreamingResponse(hold_model(entry, _resp_async_generator(streamer)), media_type="application/x-ndjson")
         else:
-            # Generate text synchronously and return the response
-            result = nexa_run_text_generation(is_chat_completion=False, **generation_kwargs)
+            # Generate text on a worker thread and return the response
+            result = await executor.run(nexa_run_text_generation, entry, is_chat_completion=False, **generation_kwargs)
             return JSONResponse(content={
                 "id": str(uuid.uuid4()),
                 "object": "text_completion",
                 "created": int(time.time()),
-                "model": model_path,
+                "model": entry.name,
                 "choices": [{
                     "text": result["result"],
                     "index": 0,
@@ -852,16 +1003,23 @@ async def generate_text(request: GenerationRequest):
                     "finish_reason": "stop"
                 }]
             })
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logging.error(f"Error in text generation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if entry is not None:
+            model_pool.release(entry)
 
 
 @app.post("/v1/chat/completions", tags=["NLP"])
 async def text_chat_completions(request: ChatCompletionRequest):
     """Endpoint for text-only chat completions using NLP models"""
+    entry = None
     try:
-        if model_type != "NLP":
+        entry = await acquire_model(request.model)
+        if entry.model_type != "NLP":
             raise HTTPException(
                 status_code=400,
                 detail="The model that is loaded is not an NLP model. Please use an NLP model for text chat completion."
@@ -877,13 +1035,16 @@ async def text_chat_completions(request: ChatCompletionRequest):
             stream=request.stream,
             top_k=request.top_k,
             top_p=request.top_p
-        ).dict()
+        ).dict(exclude={"model"})
 
+        executor = entry.executor
         if request.stream:
-            streamer = nexa_run_text_generation(is_chat_completion=True, **generation_kwargs)
-            return StreamingResponse(_resp_async_generator(streamer), media_type="application/x-ndjson")
+            streamer = executor.iterate(
+                lambda: nexa_run_text_generation(entry, is_chat_completion=True, **generation_kwargs)
+            )
+            return StreamingResponse(hold_model(entry, _resp_async_generator(streamer)), media_type="application/x-ndjson")
         
-        result = nexa_run_text_generation(is_chat_completion=True, **generation_kwargs)
+        result = await executor.run(nexa_run_text_generation, entry, is_chat_completion=True, **generation_kwargs)
         return {
             "id": str(uuid.uuid4()),
             "object": "chat.completion",
@@ -899,12 +1060,17 @@ async def text_chat_completions(request: ChatCompletionRequest):
     except Exception as e:
         logging.error(f"Error in text chat completions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if entry is not None:
+            model_pool.release(entry)
 
 @app.post("/v1/vlm/chat/completions", tags=["Multimodal"])
 async def multimodal_chat_completions(request: VLMChatCompletionRequest):
     """Endpoint for multimodal chat completions using VLM models"""
+    entry = None
     try:
-        if model_type != "Multimodal" or 'omni' in model_path.lower():
+        entry = await acquire_model(request.model)
+        if entry.model_type != "Multimodal" or 'omni' in entry.name.lower():
             raise HTTPException(
                 status_code=400,
                 detail="The model that is loaded is not a Multimodal model. Please use a Multimodal model (e.g. nanollava) for VLM."
@@ -930,33 +1096,43 @@ async def multimodal_chat_completions(request: VLMChatCompletionRequest):
             else:
                 processed_messages.append({"role": msg.role, "content": msg.content})
                 
-        response = model.create_chat_completion(
-            messages=processed_messages,
-            max_tokens=request.max_tokens,
-            temperature=request.temperature,
-            top_k=request.top_k,
-            top_p=request.top_p,
-            stream=request.stream,
-            stop=request.stop_words,
-        )
-        
+        def run_vlm_chat_completion():
+            return entry.model.create_chat_completion(
+                messages=processed_messages,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                top_k=request.top_k,
+                top_p=request.top_p,
+                stream=request.stream,
+                stop=request.stop_words,
+            )
+
+        executor = entry.executor
         if request.stream:
-            return StreamingResponse(_resp_async_generator(response), media_type="application/x-ndjson")
-        return response
+            return StreamingResponse(
+                hold_model(entry, _resp_async_generator(executor.iterate(run_vlm_chat_completion))),
+                media_type="application/x-ndjson"
+            )
+        return await executor.run(run_vlm_chat_completion)
 
     except HTTPException as e:
         raise e
     except Exception as e:
         logging.error(f"Error in multimodal chat completions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if entry is not None:
+            model_pool.release(entry)
 
-async def _resp_omnivlm_async_generator(model, prompt: str, image_path: str):
+async def _resp_omnivlm_async_generator(entry: ResidentModel, prompt: str, image_path: str):
     _id = str(uuid.uuid4())
     try:
         if not os.path.exists(image_path):
             raise FileNotFoundError(f"Image file not found: {image_path}")
             
-        for token in model.inference_streaming(prompt, image_path):
+        async for token in entry.executor.iterate(
+            lambda: entry.model.inference_streaming(prompt, image_path)
+        ):
             chunk = {
                 "id": _id,
                 "object": "chat.completion.chunk",
@@ -978,9 +1154,11 @@ async def omnivlm_chat_completions(request: VLMChatCompletionRequest):
     """Endpoint for Multimodal chat completions using OmniVLM models"""
     temp_file = None
     image_path = None
+    entry = None
     
     try:
-        if model_type != "Multimodal" or 'omni' not in model_path.lower():
+        entry = await acquire_model(request.model)
+        if entry.model_type != "Multimodal" or 'omni' not in entry.name.lower():
             raise HTTPException(
                 status_code=400,
                 detail="Please use an OmniVLM model for this endpoint."
@@ -1028,7 +1206,7 @@ async def omnivlm_chat_completions(request: VLMChatCompletionRequest):
         if request.stream:
             async def stream_with_cleanup():
                 try:
-                    async for chunk in _resp_omnivlm_async_generator(model, prompt, image_path):
+                    async for chunk in _resp_omnivlm_async_generator(entry, prompt, image_path):
                         yield chunk
                 finally:
                     if image_path and os.path.exists(image_path):
@@ -1038,12 +1216,12 @@ async def omnivlm_chat_completions(request: VLMChatCompletionRequest):
                             logging.error(f"Error cleaning up file {image_path}: {e}")
 
             return StreamingResponse(
-                stream_with_cleanup(),
+                hold_model(entry, stream_with_cleanup()),
                 media_type="text/event-stream"
             )
         else:
             try:
-                response = model.inference(prompt, image_path)
+                response = await entry.executor.run(entry.model.inference, prompt, image_path)
                 return {
                     "id": str(uuid.uuid4()),
                     "object": "chat.completion",
@@ -1069,11 +1247,16 @@ async def omnivlm_chat_completions(request: VLMChatCompletionRequest):
             raise e
         logging.error(f"Error in OmniVLM chat completions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if entry is not None:
+            model_pool.release(entry)
 
 @app.post("/v1/function-calling", tags=["NLP"])
 async def function_call(request: FunctionCallRequest):
+    entry = None
     try:
-        if model_type != "NLP":
+        entry = await acquire_model(request.model)
+        if entry.model_type != "NLP":
             raise HTTPException(
                 status_code=400,
                 detail="The model that is loaded is not an NLP model. Please use an NLP model for function calling."
@@ -1083,75 +1266,82 @@ async def function_call(request: FunctionCallRequest):
         ]
         tools = [tool.dict() for tool in request.tools]
 
-        response = model.create_chat_completion(
-            messages=messages,
-            tools=tools,
-            tool_choice=request.tool_choice,
-        )
+        def run_function_call():
+            with entry.exclusive():
+                return entry.model.create_chat_completion(
+                    messages=messages,
+                    tools=tools,
+                    tool_choice=request.tool_choice,
+                )
 
-        return response
+        return await entry.executor.run(run_function_call)
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logging.error(f"Error in function calling: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if entry is not None:
+            model_pool.release(entry)
     
 
 @app.post("/v1/txt2img", tags=["Computer Vision"])
 async def txt2img(request: ImageGenerationRequest):
+    entry = None
     try:
-        if model_type != "Computer Vision":
+        entry = await acquire_model(request.model)
+        if entry.model_type != "Computer Vision":
             raise HTTPException(
                 status_code=400,
                 detail="The model that is loaded is not a Computer Vision model. Please use a Computer Vision model for image generation."
             )
-        generation_kwargs = request.dict()
-        generated_images = await nexa_run_image_generation(**generation_kwargs)
+        generation_kwargs = request.dict(exclude={"model"})
+        executor = entry.executor
+        generated_images = await executor.run(nexa_run_image_generation, entry, **generation_kwargs)
 
         resp = {"created": time.time(), "data": []}
-
-        for image in generated_images:
-            id = int(time.time())
-            if not os.path.exists("nexa_server_output"):
-                os.makedirs("nexa_server_output")
-            image_path = os.path.join("nexa_server_output", f"txt2img_{id}.png")
-            image.save(image_path)
-            img = ImageResponse(base64=base64_encode_image(image_path), url=os.path.abspath(image_path))
-            resp["data"].append(img)
+        resp["data"] = await executor.run(save_generated_images, generated_images, "txt2img")
 
         return resp
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logging.error(f"Error in txt2img generation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if entry is not None:
+            model_pool.release(entry)
 
 @app.post("/v1/img2img", tags=["Computer Vision"])
 async def img2img(request: ImageGenerationRequest):
+    entry = None
     try:
-        if model_type != "Computer Vision":
+        entry = await acquire_model(request.model)
+        if entry.model_type != "Computer Vision":
             raise HTTPException(
                 status_code=400,
                 detail="The model that is loaded is not a Computer Vision model. Please use a Computer Vision model for image generation."
             )
-        generation_kwargs = request.dict()
+        generation_kwargs = request.dict(exclude={"model"})
+        executor = entry.executor
 
-        generated_images = await nexa_run_image_generation(**generation_kwargs)
+        generated_images = await executor.run(nexa_run_image_generation, entry, **generation_kwargs)
         resp = {"created": time.time(), "data": []}
-
-        for image in generated_images:
-            id = int(time.time())
-            if not os.path.exists("nexa_server_output"):
-                os.makedirs("nexa_server_output")
-            image_path = os.path.join("nexa_server_output", f"img2img_{id}.png")
-            image.save(image_path)
-            img = ImageResponse(base64=base64_encode_image(image_path), url=os.path.abspath(image_path))
-            resp["data"].append(img)
+        resp["data"] = await executor.run(save_generated_images, generated_images, "img2img")
 
         return resp
 
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logging.error(f"Error in img2img generation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if entry is not None:
+            model_pool.release(entry)
 
 @app.post("/v1/audio/processing", tags=["Audio"])
 async def process_audio(
@@ -1162,18 +1352,41 @@ async def process_audio(
     ),
     beam_size: Optional[int] = Query(5, description="Beam size for decoding."),
     language: Optional[str] = Query(None, description="Language code (e.g. 'en', 'fr') for transcription."),
-    temperature: Optional[float] = Query(0.0, description="Temperature for sampling.")
+    temperature: Optional[float] = Query(0.0, description="Temperature for sampling."),
+    model: Optional[str] = Query(None, description="Whisper model to use; defaults to the one loaded via /v1/load_whisper_model."),
 ):
+    entry = None
     try:
-        if not whisper_model:
+        entry = await acquire_model(model, audio=True)
+        if entry.model_type != "Audio":
             raise HTTPException(
                 status_code=400,
-                detail="Whisper model is not loaded. Please load a Whisper model first."
+                detail="The model that is loaded is not a Whisper model. Please load a Whisper model first."
             )
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_audio:
-            temp_audio.write(await file.read())
-            temp_audio_path = temp_audio.name
+        if entry.batch_scheduler is not None:
+            # Throughput mode: share batches with concurrent uploads. Admitted
+            # like pooled requests, before decoding, so that a full queue is
+            # answered with 429 instead of piling up decoded audio
+            with entry.executor.admit():
+                audio = await run_in_threadpool(
+                    decode_audio, io.BytesIO(await file.read()), sampling_rate=SAMPLING_RATE
+                )
+                future = await run_in_threadpool(
+                    entry.batch_scheduler.submit,
+                    audio,
+                    task=task,
+                    language=language if task == "transcribe" else None,
+                    beam_size=beam_size,
+                    temperature=temperature,
+                )
+                segments = await asyncio.wrap_future(future)
+            return JSONResponse(content={"text": "".join(text for _, _, text in segments)})
+
+        # Decoded in memory, no temporary file
+        audio = await run_in_threadpool(
+            decode_audio, io.BytesIO(await file.read()), sampling_rate=SAMPLING_RATE
+        )
 
         # Set up parameters for Whisper or similar model
         task_params = {
@@ -1188,15 +1401,21 @@ async def process_audio(
         if task == "transcribe" and language:
             task_params["language"] = language
 
-        segments, _ = whisper_model.transcribe(temp_audio_path, **task_params)
-        result_text = "".join(segment.text for segment in segments)
+        def transcribe():
+            # segments are decoded lazily, so consume them on the worker too
+            segments, _ = entry.model.transcribe(audio, **task_params)
+            return "".join(segment.text for segment in segments)
+
+        result_text = await entry.executor.run(transcribe)
         return JSONResponse(content={"text": result_text})
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during {task}: {str(e)}")
     finally:
-        if 'temp_audio_path' in locals() and os.path.exists(temp_audio_path):
-            os.unlink(temp_audio_path)
+        if entry is not None:
+            model_pool.release(entry)
 
 @app.post("/v1/audio/processing_stream", tags=["Audio"])
 async def processing_stream_audio(
@@ -1207,12 +1426,15 @@ async def processing_stream_audio(
     ),
     language: Optional[str] = Query("auto", description="Language code (e.g., 'en', 'fr')"),
     min_chunk: Optional[float] = Query(1.0, description="Minimum chunk duration for streaming"),
+    model: Optional[str] = Query(None, description="Whisper model to use; defaults to the one loaded via /v1/load_whisper_model."),
 ):
+    entry = None
     try:
-        if not whisper_model:
+        entry = await acquire_model(model, audio=True)
+        if entry.model_type != "Audio":
             raise HTTPException(
                 status_code=400,
-                detail="Whisper model is not loaded. Please load a Whisper model first."
+                detail="The model that is loaded is not a Whisper model. Please load a Whisper model first."
             )
 
         # Read the entire file into memory
@@ -1227,16 +1449,20 @@ async def processing_stream_audio(
         else:
             used_language = None
 
-        warmup_audio = a_full[:SAMPLING_RATE]  # first second
-        whisper_model.transcribe(warmup_audio)
-
+        whisper_model = entry.model
         streamer = StreamASRProcessor(whisper_model, task, used_language)
 
-        start = time.time()
+        start = None
         beg = 0.0
+        # Every (start, end, text) sent so far; the final event repeats the
+        # whole transcript
+        emitted = []
 
         def stream_generator():
-            nonlocal beg
+            nonlocal beg, start
+            warmup_audio = a_full[:SAMPLING_RATE]  # first second
+            whisper_model.transcribe(warmup_audio)
+            start = time.time()
             while beg < duration:
                 now = time.time() - start
                 if now < beg + min_chunk:
@@ -1252,6 +1478,7 @@ async def processing_stream_audio(
                 streamer.insert_audio_chunk(chunk_audio)
                 o = streamer.process_iter()
                 if o[0] is not None:
+                    emitted.append(o)
                     data = {
                         "emission_time_ms": (time.time()-start)*1000,
                         "segment_start_ms": o[0]*1000,
@@ -1260,34 +1487,195 @@ async def processing_stream_audio(
                     }
                     yield f"data: {json.dumps(data)}\n\n".encode("utf-8")
 
-            # Final flush
+            # Final flush: send the remaining words, then the full transcript
             o = streamer.finish()
             if o[0] is not None:
+                emitted.append(o)
                 data = {
                     "emission_time_ms": (time.time()-start)*1000,
                     "segment_start_ms": o[0]*1000,
                     "segment_end_ms": o[1]*1000,
-                    "text": o[2],
+                    "text": o[2]
+                }
+                yield f"data: {json.dumps(data)}\n\n".encode("utf-8")
+            if emitted:
+                data = {
+                    "emission_time_ms": (time.time()-start)*1000,
+                    "segment_start_ms": emitted[0][0]*1000,
+                    "segment_end_ms": emitted[-1][1]*1000,
+                    "text": "".join(t[2] for t in emitted).strip(),
                     "final": True
                 }
                 yield f"data: {json.dumps(data)}\n\n".encode("utf-8")
 
-        return StreamingResponse(stream_generator(), media_type="application/x-ndjson")
+        return StreamingResponse(
+            hold_model(entry, entry.executor.iterate(stream_generator)),
+            media_type="application/x-ndjson"
+        )
 
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logging.error(f"Error in audio processing stream: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if entry is not None:
+            model_pool.release(entry)
+
+def pcm_to_float32(data: bytes, sample_format: str) -> np.ndarray:
+    """Decode raw little-endian mono PCM frames into float32 samples in [-1, 1]."""
+    if sample_format == "f32le":
+        return np.frombuffer(data, dtype="<f4").astype(np.float32)
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+
+def has_speech(audio: np.ndarray) -> bool:
+    """Silero VAD (bundled with faster-whisper) check for speech in `audio`."""
+    if get_speech_timestamps is None:
+        return True
+    return len(get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=300))) > 0
+
+@app.websocket("/v1/audio/stream")
+async def audio_stream_ws(
+    websocket: WebSocket,
+    task: str = Query("transcribe", regex="^(transcribe|translate)$"),
+    language: Optional[str] = Query("auto", description="Language code (e.g., 'en', 'fr')"),
+    min_chunk: float = Query(1.0, description="Seconds of new audio per decoding step"),
+    sample_format: str = Query("s16le", regex="^(s16le|f32le)$", description="PCM sample format of the binary frames"),
+    model: Optional[str] = Query(None, description="Whisper model to use; defaults to the one loaded via /v1/load_whisper_model."),
+):
+    """Live transcription of 16 kHz mono PCM sent as binary WebSocket frames.
+
+    Every `min_chunk` seconds of received audio is checked with VAD. Chunks
+    with speech are decoded incrementally and answered right away with a
+    `final` message for the words that became stable and a `partial` message
+    with the current unstable hypothesis. Silence after speech ends the
+    utterance: its remaining words are flushed as `final` and silent audio is
+    not decoded at all. Send the text message `EOF` (or close the socket)
+    to flush and finish the stream.
+    """
+    await websocket.accept()
+    try:
+        entry = await acquire_model(model, audio=True)
+    except HTTPException as e:
+        await websocket.send_json({"type": "error", "detail": e.detail})
+        await websocket.close(code=1011)
+        return
+    if entry.model_type != "Audio":
+        model_pool.release(entry)
+        await websocket.send_json({"type": "error", "detail": "The model that is loaded is not a Whisper model. Please load a Whisper model first."})
+        await websocket.close(code=1011)
+        return
+
+    streamer = StreamASRProcessor(entry.model, task, None if task == "translate" else language)
+    chunk_samples = max(int(min_chunk * SAMPLING_RATE), 1)
+    max_step_samples = max(chunk_samples, int(streamer.buffer_trimming_sec * SAMPLING_RATE))
+    pending = bytearray()
+    bytes_per_sample = 4 if sample_format == "f32le" else 2
+    received = asyncio.Event()
+    closed = False
+    stream_time = 0.0  # seconds of audio handed to the decoder so far
+    in_utterance = False
+
+    async def receive():
+        nonlocal closed
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    pending.extend(message["bytes"])
+                    received.set()
+                elif message.get("text") == "EOF":
+                    break
+        finally:
+            closed = True
+            received.set()
+
+    async def send(kind, result):
+        beg, end, text = result
+        if beg is None:
+            return
+        await websocket.send_json({
+            "type": kind,
+            "segment_start_ms": beg * 1000,
+            "segment_end_ms": end * 1000,
+            "text": text,
+        })
+
+    def step(audio, speech):
+        """Decode one chunk on the model's worker; returns (final, partial) results."""
+        if speech:
+            streamer.insert_audio_chunk(audio)
+            final = streamer.process_iter()
+            return final, streamer.hypothesis()
+        # Silence after speech: decode once more so the last words settle,
+        # then flush the utterance
+        streamer.insert_audio_chunk(audio)
+        final = streamer.process_iter()
+        rest = streamer.finish()
+        return final, rest
+
+    receiver = asyncio.create_task(receive())
+    try:
+        while True:
+            usable = len(pending) - len(pending) % bytes_per_sample
+            if usable < chunk_samples * bytes_per_sample and not closed:
+                received.clear()
+                await received.wait()
+                continue
+            if usable == 0:
+                break
+            # A client sending faster than real time is decoded in steps that
+            # keep the streaming buffer bounded
+            usable = min(usable, max_step_samples * bytes_per_sample)
+            audio = pcm_to_float32(bytes(pending[:usable]), sample_format)
+            del pending[:usable]
+            speech = await entry.executor.run(has_speech, audio)
+            if speech:
+                in_utterance = True
+                final, partial = await entry.executor.run(step, audio, True)
+                await send("final", final)
+                await send("partial", partial)
+            elif in_utterance:
+                in_utterance = False
+                final, rest = await entry.executor.run(step, audio, False)
+                await send("final", final)
+                await send("final", rest)
+            stream_time += len(audio) / SAMPLING_RATE
+            if not in_utterance:
+                # Silence is not decoded, the next utterance starts here
+                streamer.init(offset=stream_time, keep_context=True)
+        if in_utterance:
+            await send("final", await entry.executor.run(streamer.finish))
+        await websocket.send_json({"type": "done"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logging.error(f"Error in audio websocket stream: {e}")
+        try:
+            await websocket.send_json({"type": "error", "detail": str(e)})
+            await websocket.close(code=1011)
+        except Exception:
+            pass
+    finally:
+        receiver.cancel()
+        model_pool.release(entry)
 
 @app.post("/v1/audiolm/chat/completions", tags=["AudioLM"])
 async def audio_chat_completions(
     file: UploadFile = File(...),
     prompt: Optional[str] = Query(None, description="Prompt for audio chat completions"),
     stream: Optional[bool] = Query(False, description="Whether to stream the response"),
+    model: Optional[str] = Query(None, description="AudioLM model to use; defaults to the model loaded at startup or via /v1/load_model."),
 ):
     temp_file = None
+    entry = None
     
     try:
-        if model_type != "AudioLM":
+        entry = await acquire_model(model)
+        if entry.model_type != "AudioLM":
             raise HTTPException(
                 status_code=400,
                 detail="The model that is loaded is not an AudioLM model. Please use an AudioLM model for audio chat completions."
@@ -1302,7 +1690,9 @@ async def audio_chat_completions(
         if stream:
             async def stream_with_cleanup():
                 try:
-                    for token in model.inference_streaming(audio_path, prompt or ""):
+                    async for token in entry.executor.iterate(
+                        lambda: entry.model.inference_streaming(audio_path, prompt or "")
+                    ):
                         chunk = {
                             "id": str(uuid.uuid4()),
                             "object": "chat.completion.chunk",
@@ -1321,13 +1711,13 @@ async def audio_chat_completions(
                         os.unlink(audio_path)
 
             return StreamingResponse(
-                stream_with_cleanup(),
+                hold_model(entry, stream_with_cleanup()),
                 media_type="text/event-stream"
             )
         else:
             try:
                 print("audio_path: ", audio_path)
-                response = model.inference(audio_path, prompt or "")
+                response = await entry.executor.run(entry.model.inference, audio_path, prompt or "")
                 return {
                     "id": str(uuid.uuid4()),
                     "object": "chat.completion",
@@ -1356,54 +1746,67 @@ async def audio_chat_completions(
             raise e
         logging.error(f"Error in audio chat completions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if entry is not None:
+            model_pool.release(entry)
 
 @app.post("/v1/embeddings", tags=["Embedding"])
 async def create_embedding(request: EmbeddingRequest):
+    entry = None
     try:
-        if model_type != "Text Embedding":
+        entry = await acquire_model(request.model)
+        if entry.model_type != "Text Embedding":
             raise HTTPException(
                 status_code=400,
                 detail="The model that is loaded is not a Text Embedding model. Please use a Text Embedding model for embedding generation."
             )
-        if isinstance(request.input, list):
-            embeddings_results = [model.embed(text, normalize=request.normalize, truncate=request.truncate) for text in request.input]
-        else:
-            embeddings_results = model.embed(request.input, normalize=request.normalize, truncate=request.truncate)
+        inputs = request.input if isinstance(request.input, list) else [request.input]
+
+        def run_embedding():
+            model = entry.model
+            if model.pooling_type() != llama_cpp.LLAMA_POOLING_TYPE_NONE:
+                # All inputs share packed decode calls and come back as one
+                # float32 matrix, together with the real token count
+                return LlamaEmbedder(model).embed(
+                    inputs, normalize=request.normalize, truncate=request.truncate, return_count=True
+                )
+            embeddings, total_tokens = model.embed(
+                inputs, normalize=request.normalize, truncate=request.truncate, return_count=True
+            )
+            return [np.asarray(e, dtype=np.float32) for e in embeddings], total_tokens
 
-        # Prepare the response data
-        if isinstance(request.input, list):
-            data = [
-                {
-                    "object": "embedding",
-                    "embedding": embedding,
-                    "index": i
-                } for i, embedding in enumerate(embeddings_results)
-            ]
-        else:
-            data = [
-                {
-                    "object": "embedding",
-                    "embedding": embeddings_results,
-                    "index": 0
-                }
-            ]
+        embeddings, total_tokens = await entry.executor.run(run_embedding)
 
-        # Calculate token usage
-        input_texts = request.input if isinstance(request.input, list) else [request.input]
-        total_tokens = sum(len(text.split()) for text in input_texts)
+        def encode(embedding):
+            if request.encoding_format == "base64":
+                return base64.b64encode(
+                    np.ascontiguousarray(embedding, dtype="<f4").tobytes()
+                ).decode("ascii")
+            return embedding.tolist()
 
-        return {
+        return JSONResponse(content={
             "object": "list",
-            "data": data,
-            "model": model_path,
+            "data": [
+                {
+                    "object": "embedding",
+                    "embedding": encode(embedding),
+                    "index": i
+                } for i, embedding in enumerate(embeddings)
+            ],
+            "model": entry.name,
             "usage": {
                 "prompt_tokens": total_tokens,
                 "total_tokens": total_tokens
             }
-        }
+        })
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logging.error(f"Error in embedding generation: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if entry is not None:
+            model_pool.release(entry)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -1415,6 +1818,18 @@ if __name__ == "__main__":
     parser.add_argument(
         "--nctx", type=int, default=2048, help="Length of context window"
     )
+    parser.add_argument(
+        "--n_parallel", type=int, default=1, help="Number of text generation requests decoded together; the context window is split across them"
+    )
+    parser.add_argument(
+        "--max_model_memory", type=float, default=None, help="Memory budget in GiB for resident models; least recently used models are unloaded beyond it (default: half of the system memory)"
+    )
+    parser.add_argument(
+        "--max_queue", type=int, default=32, help="Requests per loaded model allowed to wait for a worker before the server answers 429"
+    )
+    parser.add_argument(
+        "--audio_batch_size", type=int, default=0, help="Batch speech windows of concurrent /v1/audio/processing requests through faster-whisper's batched pipeline (0 disables)"
+    )
     parser.add_argument(
         "--host", type=str, default="localhost", help="Host to bind the server to"
     )
@@ -1455,6 +1870,10 @@ if __name__ == "__main__":
         huggingface=args.huggingface,
         modelscope=args.modelscope,
         nctx=args.nctx,
+        n_parallel=args.n_parallel,
+        max_queue=args.max_queue,
+        audio_batch_size=args.audio_batch_size,
+        max_model_memory=args.max_model_memory,
         host=args.host,
         port=args.port,
         reload=args.reload
@@ -0,0 +1,257 @@
+import contextlib
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from nexa.gguf.whisper_streaming import SAMPLING_RATE
+
+try:
+    from faster_whisper import BatchedInferencePipeline
+except ImportError:  # faster-whisper < 1.1
+    BatchedInferencePipeline = None
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+# Longest window whisper decodes in one pass
+WINDOW_SAMPLES = 30 * SAMPLING_RATE
+# Windows of a batch are laid out in slots of this length in one buffer; the
+# extra second of silence keeps segment timestamps unambiguous per slot.
+SLOT_SAMPLES = WINDOW_SAMPLES + SAMPLING_RATE
+
+# (start seconds, end seconds, text)
+Segment = Tuple[float, float, str]
+
+
+def split_on_speech(audio: np.ndarray) -> List[Tuple[int, int]]:
+    """Split `audio` into windows of at most 30 s at VAD speech boundaries.
+
+    Returns `(start, end)` sample ranges; audio without speech has none.
+    """
+    speech = get_speech_timestamps(
+        audio, VadOptions(max_speech_duration_s=30, min_silence_duration_ms=160)
+    )
+    windows: List[Tuple[int, int]] = []
+    for chunk in speech:
+        start, end = chunk["start"], min(chunk["end"], chunk["start"] + WINDOW_SAMPLES)
+        if windows and end - windows[-1][0] <= WINDOW_SAMPLES:
+            windows[-1] = (windows[-1][0], end)
+        else:
+            windows.append((start, end))
+    return windows
+
+
+@dataclass(eq=False)
+class TranscriptionRequest:
+    audio: np.ndarray
+    options: tuple
+    windows: List[Tuple[int, int]]
+    future: Future
+    next_window: int = 0
+    segments: List[Segment] = field(default_factory=list)
+
+
+class WhisperBatchScheduler:
+    """Queue that transcribes uploads from many requests in shared batches.
+
+    Each submitted waveform is split into speech windows of at most 30 s
+    with VAD. A worker thread gathers pending windows of requests with the
+    same decoding options (task, language, beam size, temperature), lays up
+    to `max_windows` of them out in one buffer and runs them through
+    faster-whisper's `BatchedInferencePipeline` in batches of `batch_size`,
+    then hands each request the segments that fall in its windows, shifted
+    back to its own timeline. Requests without a language have it detected
+    on submission, so that one batch never mixes languages.
+
+    With faster-whisper older than 1.1 (no batched pipeline) requests are
+    still decoded off the event loop, one at a time.
+    """
+
+    def __init__(
+        self,
+        model,
+        batch_size: int = 8,
+        max_windows: Optional[int] = None,
+        max_wait: float = 0.05,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_windows = max_windows or 4 * batch_size
+        self.max_wait = max_wait
+        self.pipeline = (
+            BatchedInferencePipeline(model=model) if BatchedInferencePipeline is not None else None
+        )
+        self._pending: "deque[TranscriptionRequest]" = deque()
+        self._cond = threading.Condition()
+        self._model_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="whisper-batch-scheduler", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def n_pending(self) -> int:
+        return len(self._pending)
+
+    def submit(
+        self,
+        audio: np.ndarray,
+        task: str = "transcribe",
+        language: Optional[str] = None,
+        beam_size: int = 5,
+        temperature: float = 0.0,
+    ) -> "Future[List[Segment]]":
+        """Queue a 16 kHz mono waveform; the future resolves to its segments.
+
+        Splitting and language detection run on the calling thread, so call
+        this off the event loop.
+        """
+        future: Future = Future()
+        audio = np.asarray(audio, dtype=np.float32)
+        windows = split_on_speech(audio)
+        if not windows:
+            future.set_result([])
+            return future
+        if language is None:
+            language = self._detect_language(audio[windows[0][0] : windows[0][1]])
+        request = TranscriptionRequest(
+            audio=audio,
+            options=(task, language, beam_size, temperature),
+            windows=windows,
+            future=future,
+        )
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("WhisperBatchScheduler is closed")
+            self._pending.append(request)
+            self._cond.notify_all()
+        return future
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """Hold the model between batches for a direct call."""
+        with self._model_lock:
+            yield self.model
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        error = RuntimeError("WhisperBatchScheduler is closed")
+        while self._pending:
+            self._pending.popleft().future.set_exception(error)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or self._pending)
+                if self._closed:
+                    return
+            # Let concurrent uploads arrive to fill the batch
+            if self.max_wait > 0 and self._pending_windows() < self.batch_size:
+                time.sleep(self.max_wait)
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                with self._model_lock:
+                    self._transcribe(batch)
+            except Exception as e:
+                logging.error(f"Batched transcription failed: {e}")
+                failed = {id(r): r for r, _ in batch}
+                with self._cond:
+                    self._pending = deque(r for r in self._pending if id(r) not in failed)
+                for request in failed.values():
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            for request, _ in batch:
+                if request.next_window == len(request.windows) and not request.future.done():
+                    with self._cond:
+                        if request in self._pending:
+                            self._pending.remove(request)
+                    request.segments.sort()
+                    request.future.set_result(request.segments)
+
+    def _pending_windows(self) -> int:
+        with self._cond:
+            return sum(len(r.windows) - r.next_window for r in self._pending)
+
+    def _take_batch(self) -> List[Tuple[TranscriptionRequest, int]]:
+        """Up to `max_windows` (request, window index) pairs, oldest request first,
+        all with the options of the oldest request."""
+        batch: List[Tuple[TranscriptionRequest, int]] = []
+        options = None
+        for request in self._pending:
+            if request.next_window == len(request.windows):
+                continue
+            if options is None:
+                options = request.options
+            elif request.options != options:
+                continue
+            while request.next_window < len(request.windows) and len(batch) < self.max_windows:
+                batch.append((request, request.next_window))
+                request.next_window += 1
+            if len(batch) >= self.max_windows:
+                break
+        return batch
+
+    def _detect_language(self, audio: np.ndarray) -> str:
+        try:
+            language, _, _ = self.model.detect_language(audio)
+        except AttributeError:
+            # older faster-whisper: detect through a plain transcription pass
+            _, info = self.model.transcribe(audio, beam_size=1)
+            language = info.language
+        return language
+
+    def _transcribe(self, batch: List[Tuple[TranscriptionRequest, int]]):
+        task, language, beam_size, temperature = batch[0][0].options
+        if self.pipeline is None:
+            for request, k in batch:
+                start, end = request.windows[k]
+                segments, _ = self.model.transcribe(
+                    request.audio[start:end],
+                    task=task,
+                    language=language,
+                    beam_size=beam_size,
+                    temperature=temperature,
+                )
+                offset = start / SAMPLING_RATE
+                request.segments.extend(
+                    (s.start + offset, s.end + offset, s.text) for s in segments
+                )
+            return
+
+        buffer = np.zeros(len(batch) * SLOT_SAMPLES, dtype=np.float32)
+        clips = []
+        for slot, (request, k) in enumerate(batch):
+            start, end = request.windows[k]
+            base = slot * SLOT_SAMPLES
+            buffer[base : base + end - start] = request.audio[start:end]
+            clips.append({"start": base, "end": base + end - start})
+
+        segments, _ = self.pipeline.transcribe(
+            buffer,
+            task=task,
+            language=language,
+            beam_size=beam_size,
+            temperature=temperature,
+            clip_timestamps=clips,
+            vad_filter=False,
+            batch_size=self.batch_size,
+        )
+        slot_sec = SLOT_SAMPLES / SAMPLING_RATE
+        for segment in segments:
+            slot = min(int((segment.start + 0.01) // slot_sec), len(batch) - 1)
+            request, k = batch[slot]
+            # Shift from the slot in the shared buffer back to the request's audio
+            shift = request.windows[k][0] / SAMPLING_RATE - slot * slot_sec
+            request.segments.append((segment.start + shift, segment.end + shift, segment.text))
@@ -0,0 +1,266 @@
+from collections import deque
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+SAMPLING_RATE = 16000
+
+# (start seconds, end seconds, text)
+Word = Tuple[float, float, str]
+
+
+class AudioRingBuffer:
+    """Preallocated float32 sample buffer with cheap appends and front trims.
+
+    Samples live in `data[start:end]`. Appending writes in place and trimming
+    only moves `start`; the live samples are moved back to the front only
+    when the tail runs out of room, so each sample is copied a bounded number
+    of times no matter how long the stream is. `view()` is a contiguous view
+    that can be handed to the model without a copy.
+    """
+
+    def __init__(self, capacity: int):
+        self.data = np.zeros(capacity, dtype=np.float32)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def append(self, audio: np.ndarray):
+        n = len(audio)
+        if self.end + n > len(self.data):
+            live = len(self)
+            if live + n > len(self.data):
+                # Nothing could be trimmed for a while, grow instead of failing
+                grown = np.zeros(max(2 * len(self.data), live + n), dtype=np.float32)
+                grown[:live] = self.data[self.start : self.end]
+                self.data = grown
+            else:
+                self.data[:live] = self.data[self.start : self.end]
+            self.start, self.end = 0, live
+        self.data[self.end : self.end + n] = audio
+        self.end += n
+
+    def consume(self, n: int):
+        """Drop the first `n` samples."""
+        self.start = min(self.start + max(n, 0), self.end)
+
+    def view(self) -> np.ndarray:
+        return self.data[self.start : self.end]
+
+    def clear(self):
+        self.start = self.end = 0
+
+
+class HypothesisBuffer:
+    """Local agreement between consecutive hypotheses of the same audio.
+
+    A word is committed once two successive transcriptions of the buffer
+    agree on it (and on every word before it); words committed earlier are
+    removed from the head of a new hypothesis so that they are not emitted
+    twice.
+    """
+
+    def __init__(self):
+        self.committed_in_buffer: List[Word] = []
+        self.buffer: List[Word] = []
+        self.new: List[Word] = []
+        self.last_committed_time = 0.0
+
+    def insert(self, words: List[Word], offset: float):
+        new = [(start + offset, end + offset, text) for start, end, text in words]
+        new = [w for w in new if w[0] > self.last_committed_time - 0.1]
+        if new and self.committed_in_buffer and abs(new[0][0] - self.last_committed_time) < 1:
+            # Drop the longest n-gram the new hypothesis repeats from the committed tail
+            for n in range(min(len(self.committed_in_buffer), len(new), 5), 0, -1):
+                tail = " ".join(w[2].strip() for w in self.committed_in_buffer[-n:])
+                head = " ".join(w[2].strip() for w in new[:n])
+                if tail == head:
+                    del new[:n]
+                    break
+        self.new = new
+
+    def flush(self) -> List[Word]:
+        """Commit the longest common prefix of the previous and the new hypothesis."""
+        committed = []
+        n = 0
+        while (
+            n < len(self.new)
+            and n < len(self.buffer)
+            and self.new[n][2].strip() == self.buffer[n][2].strip()
+        ):
+            committed.append(self.new[n])
+            n += 1
+        if committed:
+            self.last_committed_time = committed[-1][1]
+        self.buffer = self.new[n:]
+        self.new = []
+        self.committed_in_buffer.extend(committed)
+        return committed
+
+    def pop_committed(self, time: float):
+        """Forget committed words that ended before `time` (trimmed from the audio)."""
+        n = 0
+        while n < len(self.committed_in_buffer) and self.committed_in_buffer[n][1] <= time:
+            n += 1
+        del self.committed_in_buffer[:n]
+
+    def complete(self) -> List[Word]:
+        return self.buffer
+
+
+class StreamASRProcessor:
+    """Streaming transcription with a bounded audio buffer.
+
+    Every `process_iter` call transcribes only the audio since the last trim
+    point, not the whole stream. Words are emitted once two consecutive
+    transcriptions agree on them, and once the buffer is longer than
+    `buffer_trimming_sec` it is cut at the end of the last completed segment
+    that is fully committed. If nothing is committed for `max_buffer_sec`
+    (e.g. during silence) older audio is dropped anyway, so the buffer stays
+    bounded. The committed text that has left the buffer is
+    passed to the model as prompt so that decoding keeps its context.
+
+    `process_iter` and `finish` return `(start, end, text)` for the words
+    committed in that call, or `(None, None, "")` when there are none.
+    """
+
+    def __init__(
+        self,
+        asr,
+        task: str = "transcribe",
+        language: Optional[str] = None,
+        beam_size: int = 5,
+        buffer_trimming_sec: float = 15.0,
+        max_buffer_sec: float = 30.0,
+        prompt_chars: int = 200,
+    ):
+        self.asr = asr
+        self.task = task
+        self.language = None if language == "auto" else language
+        self.beam_size = beam_size
+        self.buffer_trimming_sec = buffer_trimming_sec
+        self.max_buffer_sec = max(max_buffer_sec, buffer_trimming_sec)
+        self.prompt_chars = prompt_chars
+        self.audio = AudioRingBuffer(int(2 * self.max_buffer_sec * SAMPLING_RATE))
+        self.init()
+
+    def init(self, offset: float = 0.0, keep_context: bool = False):
+        """Start a new stream (or utterance) whose first sample is at `offset` seconds.
+
+        With `keep_context` the text committed so far stays available as prompt.
+        """
+        self.audio.clear()
+        self.buffer_time_offset = offset
+        self.transcript = HypothesisBuffer()
+        self.transcript.last_committed_time = offset
+        if not keep_context or not hasattr(self, "committed"):
+            # only the tail is ever needed for the prompt
+            self.committed: deque = deque(maxlen=256)
+
+    def insert_audio_chunk(self, audio: np.ndarray):
+        self.audio.append(np.asarray(audio, dtype=np.float32))
+
+    def prompt(self) -> str:
+        """Up to `prompt_chars` of committed text that is no longer in the audio buffer."""
+        words = []
+        length = 0
+        for start, end, text in reversed(self.committed):
+            if end > self.buffer_time_offset:
+                continue
+            if length + len(text) > self.prompt_chars:
+                break
+            words.append(text)
+            length += len(text) + 1
+        return "".join(reversed(words))
+
+    def transcribe(self, audio: np.ndarray, prompt: str = ""):
+        segments, _ = self.asr.transcribe(
+            audio,
+            language=self.language,
+            task=self.task,
+            beam_size=self.beam_size,
+            word_timestamps=True,
+            condition_on_previous_text=True,
+            initial_prompt=prompt or None,
+        )
+        return list(segments)
+
+    @staticmethod
+    def ts_words(segments) -> List[Word]:
+        words = []
+        for seg in segments:
+            if seg.no_speech_prob > 0.9:
+                continue
+            for w in seg.words:
+                words.append((w.start, w.end, w.word))
+        return words
+
+    def process_iter(self) -> Tuple[Optional[float], Optional[float], str]:
+        audio = self.audio.view()
+        if len(audio) == 0:
+            return (None, None, "")
+        segments = self.transcribe(audio, prompt=self.prompt())
+        self.transcript.insert(self.ts_words(segments), self.buffer_time_offset)
+        committed = self.transcript.flush()
+        self.committed.extend(committed)
+
+        buffer_sec = len(audio) / SAMPLING_RATE
+        if buffer_sec > self.buffer_trimming_sec:
+            self._trim_at_segment(segments)
+        if len(self.audio) / SAMPLING_RATE > self.max_buffer_sec and self.committed:
+            # No completed segment to cut at, cut after the last committed word
+            self._trim(self.committed[-1][1])
+        if len(self.audio) / SAMPLING_RATE > self.max_buffer_sec:
+            # Nothing committed to cut at (silence, or hypotheses that keep
+            # disagreeing): keep the last `buffer_trimming_sec`, or from the
+            # start of the unstable hypothesis if that is earlier but still
+            # within `max_buffer_sec`
+            self._trim_uncommitted()
+        return self._join(committed)
+
+    def _trim_at_segment(self, segments):
+        if not self.committed:
+            return
+        committed_time = self.committed[-1][1]
+        # The last segment may still change, cut at the latest earlier segment
+        # end that is already committed
+        ends = [seg.end + self.buffer_time_offset for seg in segments[:-1]]
+        for end in reversed(ends):
+            if end <= committed_time:
+                self._trim(end)
+                return
+
+    def _trim_uncommitted(self):
+        end = self.buffer_time_offset + len(self.audio) / SAMPLING_RATE
+        cut = end - self.buffer_trimming_sec
+        pending = self.transcript.buffer
+        if pending and end - self.max_buffer_sec <= pending[0][0] < cut:
+            cut = pending[0][0]
+        self.transcript.buffer = [w for w in pending if w[0] >= cut]
+        self._trim(cut)
+
+    def _trim(self, time: float):
+        if time <= self.buffer_time_offset:
+            return
+        self.transcript.pop_committed(time)
+        self.audio.consume(int(round((time - self.buffer_time_offset) * SAMPLING_RATE)))
+        self.buffer_time_offset = time
+
+    def hypothesis(self) -> Tuple[Optional[float], Optional[float], str]:
+        """(start, end, text) of the words not committed yet; they may still change."""
+        return self._join(self.transcript.complete())
+
+    def finish(self) -> Tuple[Optional[float], Optional[float], str]:
+        """Flush the words that never got a second, agreeing hypothesis."""
+        words = list(self.transcript.complete())
+        self.committed.extend(words)
+        self.transcript.buffer = []
+        return self._join(words)
+
+    @staticmethod
+    def _join(words: List[Word]) -> Tuple[Optional[float], Optional[float], str]:
+        if not words:
+            return (None, None, "")
+        return (words[0][0], words[-1][1], "".join(w[2] for w in words))
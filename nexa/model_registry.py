@@ -0,0 +1,178 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from nexa.constants import NEXA_MODEL_LIST_PATH
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(lock_path: Path):
+    """Exclusive advisory lock shared by every process using `lock_path`."""
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 seconds, keep waiting
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _location_keys(location: str) -> List[str]:
+    """`a/b/c`-style suffixes of a model location, as `name:tag` lookups spell them.
+
+    `~/.cache/nexa/hub/official/gemma-2b/q4_0.gguf` yields `gemma-2b/q4_0.gguf`,
+    `gemma-2b/q4_0`, `official/gemma-2b/q4_0.gguf`, ... so `gemma-2b:q4_0`
+    resolves with one dict lookup.
+    """
+    parts = location.replace("\\", "/").rstrip("/").split("/")
+    if not parts:
+        return []
+    stem = parts[-1].split(".", 1)[0]
+    keys = []
+    for n in range(2, min(len(parts), 4) + 1):
+        prefix = "/".join(parts[-n:-1])
+        keys.append(f"{prefix}/{parts[-1]}")
+        if stem and stem != parts[-1]:
+            keys.append(f"{prefix}/{stem}")
+    return keys
+
+
+class ModelRegistry:
+    """Cached, process-safe view of the model list JSON file.
+
+    The parsed list is kept in memory together with the file's stat and only
+    re-read when the file changes on disk, along with an index of model
+    locations for `name:tag` lookups. Updates take an exclusive file lock,
+    re-read the file, and replace it atomically through a temporary file, so
+    concurrent CLI and server processes never see or write a torn list.
+    """
+
+    def __init__(self, path: Union[str, Path] = NEXA_MODEL_LIST_PATH):
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._lock = threading.RLock()
+        self._stat: Optional[Tuple[int, int, int]] = None
+        self._models: Dict[str, dict] = {}
+        self._by_location: Dict[str, str] = {}
+
+    def _file_stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    def _set(self, models: Dict[str, dict], stat: Optional[Tuple[int, int, int]]):
+        by_location: Dict[str, str] = {}
+        for name, info in models.items():
+            for key in _location_keys(info.get("location") or ""):
+                # the first model wins, like the linear scan it replaces
+                by_location.setdefault(key, name)
+        self._models = models
+        self._by_location = by_location
+        self._stat = stat
+
+    def _load(self) -> Dict[str, dict]:
+        with self._lock:
+            stat = self._file_stat()
+            if stat != self._stat:
+                if stat is None:
+                    self._set({}, None)
+                else:
+                    with open(self.path, "r") as f:
+                        self._set(json.load(f), stat)
+            return self._models
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def models(self) -> Dict[str, dict]:
+        """Copy of the whole model list, keyed by model name."""
+        return dict(self._load())
+
+    def find(self, model_name: str) -> Optional[str]:
+        """Key of the entry for `model_name`, looking `name:tag` up by location too."""
+        with self._lock:
+            models = self._load()
+            if model_name in models:
+                return model_name
+            if ":" not in model_name:
+                return None
+            model_path = model_name.replace(":", "/").replace("\\", "/")
+            key = self._by_location.get(model_path)
+            if key is not None:
+                return key
+            # Not a whole path component suffix, fall back to substring matching
+            for key, info in models.items():
+                if model_path in info["location"].replace("\\", "/"):
+                    return key
+            return None
+
+    def get(self, model_name: str) -> Optional[dict]:
+        with self._lock:
+            key = self.find(model_name)
+            return None if key is None else self._models[key]
+
+    @contextmanager
+    def edit(self) -> Iterator[Dict[str, dict]]:
+        """Lock the list for a read-modify-write and yield it for mutation.
+
+        The list is written back atomically when the block exits without an
+        exception.
+        """
+        with self._lock, file_lock(self.lock_path):
+            # Another process may have written since our last read
+            self._stat = None
+            models = dict(self._load())
+            yield models
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.path.parent, prefix=self.path.name, suffix=".tmp"
+            )
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(models, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self._set(models, self._file_stat())
+
+    def add(self, model_name: str, info: dict):
+        with self.edit() as models:
+            models[model_name] = info
+
+    def remove(self, *model_names: str):
+        with self.edit() as models:
+            for model_name in model_names:
+                models.pop(model_name, None)
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,272 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+
+from nexa.constants import NEXA_SIGLIP_INDEX_DIR
+
+VALID_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+
+def _file_signature(path: str) -> List[int]:
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+class ImageIndex:
+    """Persistent index of normalized SigLIP image embeddings.
+
+    Each image directory gets its own index under `root`: an `(N, dim)`
+    float32 matrix in `embeddings.npy`, memory-mapped when loaded, and
+    `index.json` with the image path and (mtime, size) of every row. Images
+    are only run through the vision tower when they are new or changed, so
+    reloading a directory, adding or removing images reuses every other row.
+
+    A query encodes the text once and scores all images with one
+    matrix-vector product.
+    """
+
+    def __init__(
+        self,
+        model,
+        processor,
+        model_name: str,
+        root: Path = NEXA_SIGLIP_INDEX_DIR,
+        batch_size: int = 32,
+        num_workers: Optional[int] = None,
+    ):
+        self.model = model
+        self.processor = processor
+        self.model_name = model_name
+        self.root = Path(root)
+        self.batch_size = batch_size
+        self.num_workers = num_workers or min(8, os.cpu_count() or 1)
+        self.dim = model.config.vision_config.hidden_size
+        self.image_dir: Optional[str] = None
+        self.index_dir: Optional[Path] = None
+        self.paths: List[str] = []
+        self.signatures: List[List[int]] = []
+        self.embeddings = np.zeros((0, self.dim), dtype=np.float32)
+        # `_lock` guards the state searches read; `_update_lock` serializes
+        # whole updates (read, encode, write) so that concurrent adds and
+        # removes do not overwrite each other
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def _index_dir_for(self, image_dir: str) -> Path:
+        key = f"{self.model_name}\0{os.path.abspath(image_dir)}".encode("utf-8")
+        return self.root / hashlib.sha1(key).hexdigest()[:16]
+
+    def _read(self, index_dir: Path):
+        """Paths, signatures and mmapped embeddings stored in `index_dir`, or an empty index."""
+        try:
+            with open(index_dir / "index.json", "r") as f:
+                meta = json.load(f)
+            if meta.get("model") != self.model_name:
+                raise ValueError("index was built with another model")
+            embeddings = np.load(index_dir / "embeddings.npy", mmap_mode="r")
+            if embeddings.shape != (len(meta["paths"]), self.dim):
+                raise ValueError("index is inconsistent")
+            return meta["paths"], meta["signatures"], embeddings
+        except (OSError, ValueError, KeyError):
+            return [], [], np.zeros((0, self.dim), dtype=np.float32)
+
+    def _write(self, index_dir: Path, image_dir: str, paths, signatures, embeddings):
+        index_dir.mkdir(parents=True, exist_ok=True)
+        matrix_path = index_dir / "embeddings.npy"
+        tmp_matrix = index_dir / "embeddings.npy.tmp"
+        out = np.lib.format.open_memmap(
+            tmp_matrix, mode="w+", dtype=np.float32, shape=embeddings.shape
+        )
+        out[:] = embeddings
+        out.flush()
+        del out
+        # The previous matrix may still be mapped, drop it before replacing
+        self.embeddings = None
+        os.replace(tmp_matrix, matrix_path)
+        tmp_meta = index_dir / "index.json.tmp"
+        with open(tmp_meta, "w") as f:
+            json.dump(
+                {
+                    "model": self.model_name,
+                    "image_dir": image_dir,
+                    "paths": paths,
+                    "signatures": signatures,
+                },
+                f,
+            )
+        os.replace(tmp_meta, index_dir / "index.json")
+        return np.load(matrix_path, mmap_mode="r")
+
+    def _prepare(self, path: str):
+        """Decode and preprocess one image on a worker thread."""
+        try:
+            image = Image.open(path).convert("RGB")
+            return self.processor(images=image, return_tensors="pt")["pixel_values"]
+        except Exception as e:
+            print(f"Failed to load image {os.path.basename(path)}: {str(e)}")
+            return None
+
+    def encode_images(self, paths: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Normalized embeddings of the images in `paths` that could be loaded.
+
+        Images are decoded in parallel, one batch ahead of the batch the
+        vision tower is working on.
+        """
+        batches = [paths[i : i + self.batch_size] for i in range(0, len(paths), self.batch_size)]
+        encoded_paths: List[str] = []
+        chunks: List[np.ndarray] = []
+        with ThreadPoolExecutor(max_workers=self.num_workers) as pool:
+            pending = [pool.submit(self._prepare, p) for p in batches[0]] if batches else []
+            for i, batch in enumerate(batches):
+                pixel_values = [future.result() for future in pending]
+                pending = (
+                    [pool.submit(self._prepare, p) for p in batches[i + 1]]
+                    if i + 1 < len(batches)
+                    else []
+                )
+                loaded = [(p, v) for p, v in zip(batch, pixel_values) if v is not None]
+                if not loaded:
+                    continue
+                with torch.no_grad():
+                    features = self.model.get_image_features(
+                        pixel_values=torch.cat([v for _, v in loaded])
+                    )
+                features = torch.nn.functional.normalize(features, dim=-1)
+                chunks.append(features.cpu().numpy().astype(np.float32))
+                encoded_paths.extend(p for p, _ in loaded)
+        if not chunks:
+            return [], np.zeros((0, self.dim), dtype=np.float32)
+        return encoded_paths, np.concatenate(chunks)
+
+    def encode_text(self, text: str) -> np.ndarray:
+        inputs = self.processor(text=[text], padding="max_length", return_tensors="pt")
+        with torch.no_grad():
+            features = self.model.get_text_features(**inputs)
+        return torch.nn.functional.normalize(features, dim=-1)[0].cpu().numpy().astype(np.float32)
+
+    def _rebuild(
+        self, index_dir: Path, image_dir: str, old, wanted: List[str], allow_empty: bool = False
+    ):
+        """Make the index hold exactly `wanted`, encoding only new or changed images.
+
+        Must be called with `_update_lock` held.
+        """
+        old_paths, old_signatures, old_embeddings = old
+        old_rows: Dict[str, int] = {p: i for i, p in enumerate(old_paths)}
+
+        keep_paths, keep_signatures, keep_rows = [], [], []
+        to_encode = []
+        for path in dict.fromkeys(wanted):
+            try:
+                signature = _file_signature(path)
+            except OSError:
+                continue
+            row = old_rows.get(path)
+            if row is not None and list(old_signatures[row]) == signature:
+                keep_paths.append(path)
+                keep_signatures.append(signature)
+                keep_rows.append(row)
+            else:
+                to_encode.append(path)
+
+        new_paths, new_embeddings = self.encode_images(to_encode)
+        paths = keep_paths + new_paths
+        if not paths and not allow_empty:
+            raise ValueError(f"No valid image files found in {image_dir}")
+        signatures = keep_signatures + [_file_signature(p) for p in new_paths]
+        embeddings = np.concatenate(
+            [np.asarray(old_embeddings[keep_rows], dtype=np.float32), new_embeddings]
+        )
+        unchanged = paths == list(old_paths) and signatures == [list(s) for s in old_signatures]
+
+        with self._lock:
+            if unchanged:
+                self.embeddings = old_embeddings
+            else:
+                # Release the old mapping before its file is replaced
+                old = old_embeddings = None
+                self.embeddings = self._write(index_dir, image_dir, paths, signatures, embeddings)
+            self.paths = paths
+            self.signatures = signatures
+            self.index_dir = index_dir
+            self.image_dir = image_dir
+
+    def load_directory(self, image_dir: str) -> List[str]:
+        """Index every image in `image_dir`, replacing the current images."""
+        if not os.path.exists(image_dir):
+            raise ValueError(f"Directory {image_dir} does not exist")
+        files = sorted(
+            os.path.join(image_dir, filename)
+            for filename in os.listdir(image_dir)
+            if filename.lower().endswith(VALID_EXTENSIONS)
+        )
+        index_dir = self._index_dir_for(image_dir)
+        with self._update_lock:
+            self._rebuild(index_dir, image_dir, self._read(index_dir), files)
+            return self.paths
+
+    def add_images(self, image_paths: Iterable[str]) -> List[str]:
+        """Add (or re-encode changed) images to the current index."""
+        with self._update_lock:
+            if self.index_dir is None:
+                raise ValueError("No image directory loaded, please load images first")
+            new_paths = [
+                os.path.join(self.image_dir, p) if not os.path.isabs(p) else p
+                for p in image_paths
+            ]
+            new_paths = [p for p in new_paths if p.lower().endswith(VALID_EXTENSIONS)]
+            self._rebuild(
+                self.index_dir,
+                self.image_dir,
+                (self.paths, self.signatures, self.embeddings),
+                self.paths + new_paths,
+            )
+            return self.paths
+
+    def remove_images(self, image_paths: Iterable[str]) -> List[str]:
+        """Drop images from the current index without touching the other rows.
+
+        Removing every image leaves an empty index.
+        """
+        with self._update_lock:
+            if self.index_dir is None:
+                raise ValueError("No image directory loaded, please load images first")
+            removed = {
+                os.path.join(self.image_dir, p) if not os.path.isabs(p) else p
+                for p in image_paths
+            }
+            self._rebuild(
+                self.index_dir,
+                self.image_dir,
+                (self.paths, self.signatures, self.embeddings),
+                [p for p in self.paths if p not in removed],
+                allow_empty=True,
+            )
+            return self.paths
+
+    def search(self, text: str, top_k: int = 1) -> List[Tuple[str, float]]:
+        """The `top_k` images closest to `text` with their SigLIP match probability."""
+        query = self.encode_text(text)
+        with self._lock:
+            if not self.paths:
+                return []
+            paths = self.paths
+            cosine = np.asarray(self.embeddings @ query)
+        k = max(1, min(top_k, len(paths)))
+        top = np.argpartition(-cosine, k - 1)[:k]
+        top = top[np.argsort(-cosine[top])]
+        # Same sigmoid(scale * cos + bias) as SiglipModel's logits_per_image
+        logits = cosine[top] * self.model.logit_scale.exp().item() + self.model.logit_bias.item()
+        probs = 1.0 / (1.0 + np.exp(-logits))
+        return [(paths[i], float(p)) for i, p in zip(top, probs)]
@@ -3,15 +3,17 @@ from pydantic import BaseModel
 from fastapi import Request
 from fastapi.responses import HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 import uvicorn
 import os
 import socket
 import time
 import argparse
-from PIL import Image
-import torch
+from typing import List
 from transformers import AutoProcessor, AutoModel
 
+from nexa.siglip.image_index import ImageIndex
+
 app = FastAPI(title="Nexa AI SigLIP Image-Text Matching Service")
 app.add_middleware(
     CORSMiddleware,
@@ -25,42 +27,32 @@ app.add_middleware(
 hostname = socket.gethostname()
 siglip_model = None
 siglip_processor = None
-images_dict = {}
+image_index = None
+SIGLIP_MODEL_NAME = "google/siglip-base-patch16-384"
 
 class ImagePathRequest(BaseModel):
     image_dir: str
 
+class ImageListRequest(BaseModel):
+    image_paths: List[str]
+
+class SearchResult(BaseModel):
+    image_path: str
+    similarity_score: float
+
 class SearchResponse(BaseModel):
     image_path: str
     similarity_score: float
     latency: float
+    results: List[SearchResult] = []
 
 def init_model():
-    """Initialize SigLIP model and processor"""
-    global siglip_model, siglip_processor
-    siglip_model = AutoModel.from_pretrained("google/siglip-base-patch16-384")
-    siglip_processor = AutoProcessor.from_pretrained("google/siglip-base-patch16-384")
-
-def load_images_from_directory(image_dir, valid_extensions=('.jpg', '.jpeg', '.png', '.webp')):
-    """Load images from directory"""
-    images_dict = {}
-    
-    if not os.path.exists(image_dir):
-        raise ValueError(f"Directory {image_dir} does not exist")
-        
-    for filename in os.listdir(image_dir):
-        if filename.lower().endswith(valid_extensions):
-            image_path = os.path.join(image_dir, filename)
-            try:
-                image = Image.open(image_path).convert("RGB")
-                images_dict[image_path] = image
-            except Exception as e:
-                print(f"Failed to load image {filename}: {str(e)}")
-                
-    if not images_dict:
-        raise ValueError(f"No valid image files found in {image_dir}")
-        
-    return images_dict
+    """Initialize SigLIP model, processor and the image embedding index"""
+    global siglip_model, siglip_processor, image_index
+    siglip_model = AutoModel.from_pretrained(SIGLIP_MODEL_NAME)
+    siglip_processor = AutoProcessor.from_pretrained(SIGLIP_MODEL_NAME)
+    siglip_model.eval()
+    image_index = ImageIndex(siglip_model, siglip_processor, SIGLIP_MODEL_NAME)
 
 @app.on_event("startup")
 async def startup_event():
@@ -68,10 +60,9 @@ async def startup_event():
     init_model()
     # Add image loading if image_dir is provided
     if hasattr(app, "image_dir") and app.image_dir:
-        global images_dict
         try:
-            images_dict = load_images_from_directory(app.image_dir)
-            print(f"Successfully loaded {len(images_dict)} images from {app.image_dir}")
+            await run_in_threadpool(image_index.load_directory, app.image_dir)
+            print(f"Successfully loaded {len(image_index)} images from {app.image_dir}")
         except Exception as e:
             print(f"Failed to load images: {str(e)}")
 
@@ -87,62 +78,78 @@ async def list_images():
     current_dir = getattr(app, "image_dir", None)
     return {
         "image_dir": current_dir,
-        "images_count": len(images_dict),
-        "images": list(images_dict.keys()),
-        "status": "active" if current_dir and images_dict else "no_images_loaded"
+        "images_count": len(image_index),
+        "images": list(image_index.paths),
+        "status": "active" if current_dir and len(image_index) else "no_images_loaded"
     }
 
 @app.post("/v1/load_images")
 async def load_images(request: ImagePathRequest):
-    """Load images from specified directory, replacing any previously loaded images"""
-    global images_dict
+    """Load images from specified directory, replacing any previously loaded images.
+
+    Embeddings of images seen before (same path, size and mtime) are reused
+    from the on-disk index; only new or changed images are encoded.
+    """
     try:
-        temp_images = load_images_from_directory(request.image_dir)
-        
-        if not temp_images:
-            raise ValueError("No valid images found in the specified directory")
-            
-        images_dict.clear()
-        images_dict.update(temp_images)
+        images = await run_in_threadpool(image_index.load_directory, request.image_dir)
         app.image_dir = request.image_dir
-        
+
         return {
-            "message": f"Successfully loaded {len(images_dict)} images from {request.image_dir}",
-            "images": list(images_dict.keys())
+            "message": f"Successfully loaded {len(images)} images from {request.image_dir}",
+            "images": images
         }
     except Exception as e:
-        current_count = len(images_dict)
+        current_count = len(image_index)
         error_message = f"Failed to load images: {str(e)}. Keeping existing {current_count} images."
         raise HTTPException(status_code=400, detail=error_message)
 
+@app.post("/v1/add_images")
+async def add_images(request: ImageListRequest):
+    """Add images (absolute or relative to the loaded directory) to the index"""
+    try:
+        images = await run_in_threadpool(image_index.add_images, request.image_paths)
+        return {"images_count": len(images), "images": images}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to add images: {str(e)}")
+
+@app.post("/v1/remove_images")
+async def remove_images(request: ImageListRequest):
+    """Remove images from the index"""
+    try:
+        images = await run_in_threadpool(image_index.remove_images, request.image_paths)
+        return {"images_count": len(images), "images": images}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to remove images: {str(e)}")
+
 @app.post("/v1/find_similar", response_model=SearchResponse)
-async def find_similar(text: str):
-    """Find image most similar to input text"""
-    if not images_dict:
+async def find_similar(text: str, top_k: int = 1):
+    """Find the images most similar to input text.
+
+    Only the text is encoded; it is scored against the precomputed image
+    embeddings with a single matrix product.
+    """
+    if image_index is None or not len(image_index):
         raise HTTPException(status_code=400, detail="No images available, please load images first")
-    
+
     try:
         start_time = time.time()
-        image_paths = list(images_dict.keys())
-        images = list(images_dict.values())
-        
-        inputs = siglip_processor(text=[text], images=images, padding="max_length", return_tensors="pt")
-        
-        with torch.no_grad():
-            outputs = siglip_model(**inputs)
-        
-        logits_per_image = outputs.logits_per_image
-        probs = torch.sigmoid(logits_per_image)
-        max_prob_index = torch.argmax(probs).item()
-        max_prob = probs[max_prob_index][0].item()
-        
-        return SearchResponse(
-            image_path=image_paths[max_prob_index],
-            similarity_score=max_prob,
-            latency = round(time.time() - start_time, 3)
-        )
+        results = await run_in_threadpool(image_index.search, text, top_k)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+    if not results:
+        # A concurrent /v1/remove_images emptied the index after the check above
+        raise HTTPException(status_code=400, detail="No images available, please load images first")
+
+    best_path, best_score = results[0]
+    return SearchResponse(
+        image_path=best_path,
+        similarity_score=best_score,
+        latency = round(time.time() - start_time, 3),
+        results=[
+            SearchResult(image_path=path, similarity_score=score)
+            for path, score in results
+        ]
+    )
 
 
 def run_nexa_ai_siglip_service(**kwargs):
@@ -14,6 +14,7 @@ from nexa.constants import (
     EXIT_REMINDER,
     NEXA_MODEL_LIST_PATH,
 )
+from nexa.model_registry import model_registry
 
 
 def get_available_models() -> Dict[str, dict]:
@@ -25,9 +26,7 @@ def get_available_models() -> Dict[str, dict]:
 
     try:
         # read model list from the JSON file:
-        with open(NEXA_MODEL_LIST_PATH, "r") as f:
-            available_models = json.load(f)
-            return available_models
+        return model_registry.models()
 
     except json.JSONDecodeError as e:
         logging.error(f"Invalid JSON in model list file: {e}")
@@ -0,0 +1,83 @@
+import hashlib
+import os
+
+from nexa.blob_store import BlobStore
+
+
+def _store(tmp_path):
+    models = tmp_path / "hub"
+    return BlobStore(root=models / "blobs", models_root=models), models
+
+
+def test_ingest_deduplicates_identical_files(tmp_path):
+    store, models = _store(tmp_path)
+    first = models / "official" / "gemma" / "q4_0.gguf"
+    second = models / "hf" / "repo" / "gemma-q4_0.gguf"
+    for path in (first, second):
+        path.parent.mkdir(parents=True)
+        path.write_bytes(b"weights")
+
+    blob = store.ingest(first)
+    assert store.ingest(second) == blob
+    assert blob.name == "sha256-" + hashlib.sha256(b"weights").hexdigest()
+    assert os.path.samefile(first, blob) and os.path.samefile(second, blob)
+    assert second.read_bytes() == b"weights"
+
+
+def test_link_known_hash(tmp_path):
+    store, models = _store(tmp_path)
+    source = models / "a" / "model.gguf"
+    source.parent.mkdir(parents=True)
+    source.write_bytes(b"weights")
+    sha256 = hashlib.sha256(b"weights").hexdigest()
+    store.ingest(source, sha256)
+
+    assert store.has(sha256)
+    assert not store.has(None)
+    dest = models / "b" / "model.gguf"
+    assert store.link(sha256, dest)
+    assert dest.read_bytes() == b"weights"
+    assert not store.link("0" * 64, models / "c" / "model.gguf")
+
+
+def test_gc_removes_only_unreferenced_blobs(tmp_path):
+    store, models = _store(tmp_path)
+    kept = models / "kept" / "model.gguf"
+    dropped = models / "dropped" / "model.gguf"
+    for path, content in ((kept, b"kept"), (dropped, b"dropped")):
+        path.parent.mkdir(parents=True)
+        path.write_bytes(content)
+        store.ingest(path)
+    (store.root / "notes.txt").write_text("not a blob")
+
+    assert store.gc() == 0
+    dropped.unlink()
+    assert store.gc() == len(b"dropped")
+    assert kept.read_bytes() == b"kept"
+    assert {p.name for p in store.root.iterdir()} == {
+        "sha256-" + hashlib.sha256(b"kept").hexdigest(),
+        "notes.txt",
+        ".lock",
+    }
+
+
+def test_gc_keeps_symlinked_blobs(tmp_path):
+    store, models = _store(tmp_path)
+    source = models / "a" / "model.gguf"
+    source.parent.mkdir(parents=True)
+    source.write_bytes(b"weights")
+    blob = store.ingest(source)
+    # Replace the hardlink by a symlink, as on filesystems without hardlinks
+    source.unlink()
+    source.symlink_to(blob)
+
+    assert store.gc() == 0
+    assert blob.exists()
+    source.unlink()
+    assert store.gc() == len(b"weights")
+    assert not blob.exists()
+
+
+def test_gc_without_store(tmp_path):
+    store, _ = _store(tmp_path)
+    assert store.gc() == 0
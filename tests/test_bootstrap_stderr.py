@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+pytest.importorskip("sacrebleu")
+
+from nexa.eval.nexa_task.metrics import (
+    _bootstrap_internal,
+    _vectorized_bootstrap,
+    bootstrap_stderr,
+    f1_score,
+    matthews_corrcoef,
+    mean,
+    mean_stderr,
+    pooled_bootstrap_stderr,
+    sample_stddev,
+    stderr_for_metric,
+)
+
+
+def _binary_items(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    golds = rng.integers(0, 2, size=n)
+    # Predictions agree with the gold label ~75% of the time.
+    preds = np.where(rng.random(n) < 0.75, golds, 1 - golds)
+    return [(int(g), int(p)) for g, p in zip(golds, preds)]
+
+
+@pytest.mark.parametrize("metric", [f1_score, matthews_corrcoef])
+def test_vectorized_matches_pooled_bootstrap(metric):
+    items = _binary_items()
+    vectorized = bootstrap_stderr(metric, items, iters=2000)
+    pooled = pooled_bootstrap_stderr(metric, items, iters=2000)
+    assert math.isclose(vectorized, pooled, rel_tol=0.1)
+
+
+@pytest.mark.parametrize("metric", [f1_score, matthews_corrcoef])
+def test_vectorized_kernel_matches_metric_per_resample(metric):
+    items = _binary_items(n=50)
+    idx = np.random.default_rng(1).integers(0, len(items), size=(20, len(items)))
+    stats = _vectorized_bootstrap[metric](items)(idx)
+    expected = [metric([items[j] for j in row]) for row in idx]
+    np.testing.assert_allclose(stats, expected, atol=1e-12)
+
+
+def test_non_binary_labels_fall_back_to_generic_bootstrap():
+    items = [(0, 2), (1, 1), (2, 2), (1, 0)]
+    assert _vectorized_bootstrap[f1_score](items) is None
+    assert _vectorized_bootstrap[matthews_corrcoef](items) is None
+
+
+def test_generic_bootstrap_worker_is_seeded():
+    items = _binary_items(n=40)
+    worker = _bootstrap_internal(matthews_corrcoef, 50)
+    first = worker((3, items))
+    assert len(first) == 50
+    assert first == worker((3, items))
+    assert sample_stddev(first) > 0
+
+
+def test_mean_uses_analytic_stderr():
+    assert mean not in _vectorized_bootstrap
+    assert stderr_for_metric(mean, bootstrap_iters=100) is mean_stderr
+    assert stderr_for_metric(f1_score, bootstrap_iters=0) is None
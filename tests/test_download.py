@@ -0,0 +1,157 @@
+import hashlib
+import re
+
+import pytest
+import requests
+
+import nexa.general as general
+from nexa.general import download_file_with_progress
+
+DATA = bytes(range(35))
+CHUNK = 10
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, body=b""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.body), 4):
+            yield self.body[i : i + 4]
+
+
+class FakeServer:
+    """Serves DATA; `fail(start)` may return "error" or "drop" for a range request."""
+
+    def __init__(self, advertise_ranges=True, honor_ranges=True, fail=None):
+        self.advertise_ranges = advertise_ranges
+        self.honor_ranges = honor_ranges
+        self.fail = fail or (lambda start: None)
+        self.requests = []
+
+    def head(self, url, **kwargs):
+        headers = {"Content-Length": str(len(DATA)), "ETag": '"v1"'}
+        if self.advertise_ranges:
+            headers["Accept-Ranges"] = "bytes"
+        return FakeResponse(200, headers)
+
+    def get(self, url, headers=None, **kwargs):
+        start, end = map(int, re.fullmatch(r"bytes=(\d+)-(\d+)", headers["Range"]).groups())
+        self.requests.append((start, end))
+        if not self.honor_ranges:
+            return FakeResponse(200, body=DATA)
+        action = self.fail(start)
+        if action == "error":
+            raise requests.ConnectionError("connection reset")
+        body = DATA[start : end + 1]
+        if action == "drop":
+            body = body[: len(body) // 2]
+        return FakeResponse(206, body=body)
+
+
+class FakeSession:
+    def __init__(self, server):
+        self.get = server.get
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    monkeypatch.setattr(general.time, "sleep", lambda seconds: None)
+
+    def serve(server):
+        monkeypatch.setattr(general.requests, "head", server.head)
+        monkeypatch.setattr(general.requests, "Session", lambda: FakeSession(server))
+        return server
+
+    return serve
+
+
+def _paths(tmp_path):
+    target = tmp_path / "model.gguf"
+    return target, tmp_path / "model.gguf.download", tmp_path / "model.gguf.download.state"
+
+
+def test_download_in_ranges_with_checksum(tmp_path, serve):
+    server = serve(FakeServer())
+    target, part, state = _paths(tmp_path)
+    download_file_with_progress(
+        "https://hub/model.gguf", target, chunk_size=CHUNK, max_workers=2,
+        sha256=hashlib.sha256(DATA).hexdigest(),
+    )
+    assert target.read_bytes() == DATA
+    assert sorted(server.requests) == [(0, 9), (10, 19), (20, 29), (30, 34)]
+    assert not part.exists() and not state.exists()
+
+
+def test_interrupted_download_resumes_missing_chunks(tmp_path, serve):
+    target, part, state = _paths(tmp_path)
+    serve(FakeServer(fail=lambda start: "error" if start == 20 else None))
+    with pytest.raises(Exception, match="1 chunk"):
+        download_file_with_progress("https://hub/model.gguf", target, chunk_size=CHUNK)
+    assert not target.exists()
+    assert part.exists() and state.exists()
+
+    server = serve(FakeServer())
+    download_file_with_progress("https://hub/model.gguf", target, chunk_size=CHUNK)
+    assert server.requests == [(20, 29)]
+    assert target.read_bytes() == DATA
+    assert not state.exists()
+
+
+def test_retry_continues_from_last_byte(tmp_path, serve):
+    dropped = set()
+
+    def fail(start):
+        if start == 10 and start not in dropped:
+            dropped.add(start)
+            return "drop"
+        return None
+
+    server = serve(FakeServer(fail=fail))
+    target, _, _ = _paths(tmp_path)
+    download_file_with_progress("https://hub/model.gguf", target, chunk_size=CHUNK, max_workers=1)
+    assert target.read_bytes() == DATA
+    # Half of 10..19 arrived before the connection closed
+    assert server.requests.count((10, 19)) == 1
+    assert (15, 19) in server.requests
+
+
+def test_server_without_ranges_is_fetched_in_one_request(tmp_path, serve):
+    server = serve(FakeServer(advertise_ranges=False, honor_ranges=False))
+    target, _, _ = _paths(tmp_path)
+    download_file_with_progress("https://hub/model.gguf", target, chunk_size=CHUNK)
+    assert server.requests == [(0, len(DATA) - 1)]
+    assert target.read_bytes() == DATA
+
+
+def test_server_ignoring_advertised_ranges_fails_without_corrupting(tmp_path, serve):
+    serve(FakeServer(honor_ranges=False))
+    target, _, _ = _paths(tmp_path)
+    with pytest.raises(Exception, match="range requests"):
+        download_file_with_progress("https://hub/model.gguf", target, chunk_size=CHUNK)
+    assert not target.exists()
+
+
+def test_checksum_mismatch_removes_partial_download(tmp_path, serve):
+    serve(FakeServer())
+    target, part, state = _paths(tmp_path)
+    with pytest.raises(Exception, match="checksum mismatch"):
+        download_file_with_progress(
+            "https://hub/model.gguf", target, chunk_size=CHUNK, sha256="0" * 64
+        )
+    assert not target.exists()
+    assert not part.exists() and not state.exists()
@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+import pytest
+
+from nexa.gguf.server.executor import InferenceExecutor, ServerBusyError
+
+
+def test_admit_rejects_when_queue_is_full():
+    executor = InferenceExecutor("audio", max_workers=1, max_queue=1)
+    with executor.admit(), executor.admit():
+        with pytest.raises(ServerBusyError) as excinfo:
+            with executor.admit():
+                pass
+        assert excinfo.value.status_code == 429
+        assert executor.inflight == 2
+    assert executor.inflight == 0
+    executor.shutdown()
+
+
+def test_admitted_requests_count_against_pooled_ones():
+    executor = InferenceExecutor("audio", max_workers=1, max_queue=0)
+    started, finish = threading.Event(), threading.Event()
+
+    def work():
+        started.set()
+        finish.wait(5)
+        return "done"
+
+    async def main():
+        running = asyncio.ensure_future(executor.run(work))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        with pytest.raises(ServerBusyError):
+            with executor.admit():
+                pass
+        finish.set()
+        assert await running == "done"
+        with executor.admit():
+            assert executor.inflight == 1
+
+    asyncio.run(main())
+    executor.shutdown()
+
+
+def test_admit_releases_on_error():
+    executor = InferenceExecutor("audio", max_workers=1, max_queue=0)
+    with pytest.raises(ValueError):
+        with executor.admit():
+            raise ValueError("decode failed")
+    assert executor.inflight == 0
+    executor.shutdown()
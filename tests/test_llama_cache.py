@@ -0,0 +1,93 @@
+import random
+from types import SimpleNamespace
+
+from nexa.gguf.llama.llama_cache import LlamaRAMCache, _TokenPrefixIndex
+
+
+def _common_prefix(a, b):
+    n = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        n += 1
+    return n
+
+
+def _best_prefix(keys, tokens):
+    return max((_common_prefix(k, tokens) for k in keys), default=0)
+
+
+def test_longest_prefix_key_finds_the_longest_match():
+    index = _TokenPrefixIndex()
+    for key in [(1, 2, 3, 4), (1, 2, 5), (7, 8)]:
+        index.add(key)
+    assert len(index) == 3
+    assert index.longest_prefix_key((1, 2, 3, 9)) == (1, 2, 3, 4)
+    assert index.longest_prefix_key((1, 2, 5, 6, 7)) == (1, 2, 5)
+    assert index.longest_prefix_key((7,)) == (7, 8)
+    assert index.longest_prefix_key((1, 2)) in {(1, 2, 3, 4), (1, 2, 5)}
+    assert index.longest_prefix_key((9, 1)) is None
+    assert index.longest_prefix_key(()) is None
+
+
+def test_key_that_is_a_prefix_of_another_key():
+    index = _TokenPrefixIndex()
+    index.add((1, 2, 3))
+    index.add((1, 2))
+    assert index.longest_prefix_key((1, 2, 4)) in {(1, 2), (1, 2, 3)}
+    assert index.longest_prefix_key((1, 2, 3, 4)) == (1, 2, 3)
+    index.remove((1, 2, 3))
+    assert index.longest_prefix_key((1, 2, 3, 4)) == (1, 2)
+
+
+def test_add_and_remove_are_idempotent():
+    index = _TokenPrefixIndex()
+    index.add((1, 2))
+    index.add((1, 2))
+    assert len(index) == 1
+    index.remove((1, 3))
+    index.remove((1,))
+    assert len(index) == 1
+    index.remove((1, 2))
+    index.remove((1, 2))
+    assert len(index) == 0
+    assert index.longest_prefix_key((1, 2)) is None
+
+
+def test_matches_brute_force_on_random_keys():
+    rnd = random.Random(0)
+    index = _TokenPrefixIndex()
+    keys = set()
+    for step in range(2000):
+        key = tuple(rnd.choices(range(4), k=rnd.randint(1, 8)))
+        if keys and rnd.random() < 0.3:
+            victim = rnd.choice(sorted(keys))
+            index.remove(victim)
+            keys.discard(victim)
+        else:
+            index.add(key)
+            keys.add(key)
+        assert len(index) == len(keys)
+
+        tokens = tuple(rnd.choices(range(4), k=rnd.randint(0, 10)))
+        found = index.longest_prefix_key(tokens)
+        best = _best_prefix(keys, tokens)
+        if best == 0:
+            assert found is None
+        else:
+            assert found in keys
+            assert _common_prefix(found, tokens) == best
+
+
+def test_ram_cache_evicts_least_recently_used():
+    cache = LlamaRAMCache(capacity_bytes=25)
+    cache[(1, 2, 3)] = SimpleNamespace(llama_state_size=10, name="a")
+    cache[(4, 5)] = SimpleNamespace(llama_state_size=10, name="b")
+    # Touch (1, 2, 3) so that (4, 5) is the least recently used
+    assert cache[(1, 2, 3, 9)].name == "a"
+    cache[(6,)] = SimpleNamespace(llama_state_size=10, name="c")
+
+    assert cache.cache_size == 20
+    assert (4, 5) not in cache
+    assert cache[(1, 2)].name == "a"
+    assert cache[(6, 7)].name == "c"
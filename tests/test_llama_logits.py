@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from nexa.gguf.llama.llama_logits import LlamaLogits
+
+N_VOCAB = 50
+
+
+def _logits(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, N_VOCAB)).astype(np.single)
+
+
+def _filled(mode, tokens, logits, **kwargs):
+    storage = LlamaLogits(64, N_VOCAB, mode=mode, **kwargs)
+    storage.store(0, tokens, logits)
+    return storage
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError, match="logits storage"):
+        LlamaLogits(64, N_VOCAB, mode="sparse")
+
+
+def test_full_mode_keeps_every_row():
+    logits = _logits(6)
+    storage = _filled("full", list(range(6)), logits)
+    np.testing.assert_array_equal(storage.rows[:6], logits)
+    np.testing.assert_array_equal(storage.kept_rows()[:6], logits)
+    assert storage.has_logprobs
+
+
+def test_last_mode_keeps_only_the_last_row():
+    logits = _logits(6)
+    storage = _filled("last", list(range(6)), logits)
+    np.testing.assert_array_equal(storage.row(5), logits[5])
+    assert not storage.has_logprobs
+    with pytest.raises(ValueError, match="logits_storage='last'"):
+        storage.row(4)
+    with pytest.raises(ValueError, match="logits_storage='last'"):
+        storage.rows
+
+
+def test_ring_mode_keeps_recent_rows():
+    logits = _logits(6)
+    storage = _filled("ring", list(range(6)), logits, n_live=3)
+    np.testing.assert_array_equal(storage.recent(6), logits[3:])
+    # Continue decoding one token at a time; the ring wraps around
+    more = _logits(2, seed=1)
+    storage.store(6, [7], more[:1])
+    storage.store(7, [8], more[1:])
+    np.testing.assert_array_equal(storage.recent(8), np.concatenate([logits[5:], more]))
+
+
+def test_kept_rows_index_like_scores():
+    logits = _logits(6)
+    scores = _filled("ring", list(range(6)), logits, n_live=2).kept_rows()
+    assert scores.shape == (6, N_VOCAB)
+    np.testing.assert_array_equal(scores[5], logits[5])
+    np.testing.assert_array_equal(scores[-1], logits[5])
+    assert scores[4, 3] == logits[4, 3]
+    np.testing.assert_array_equal(scores[4:], logits[4:])
+    with pytest.raises(ValueError, match="logits_storage='full'"):
+        scores[3]
+    with pytest.raises(ValueError):
+        np.asarray(scores)
+
+
+def test_topk_logprobs_match_full_mode():
+    tokens = [3, 7, 1, 9, 4, 2]
+    logits = _logits(len(tokens))
+    full = _filled("full", tokens, logits)
+    topk = _filled("topk", tokens, logits, top_k=5)
+
+    # Logprob of the token evaluated after each position, as echo needs
+    expected = full.logprobs(0, tokens[1:], 5)
+    actual = topk.logprobs(0, tokens[1:], 5)
+    np.testing.assert_allclose(actual[0], expected[0], rtol=1e-5)
+    assert actual[1] == expected[1]
+    np.testing.assert_allclose(actual[2], expected[2], rtol=1e-5)
+
+
+def test_topk_logprob_of_other_token_outside_top_k_is_unknown():
+    tokens = [3, 7, 1]
+    logits = _logits(len(tokens))
+    # The least likely token of position 0 is neither the next token nor in the top 5
+    rare = int(np.argmin(logits[0]))
+    storage = _filled("topk", tokens, logits, top_k=5)
+    assert storage.logprobs(0, [rare], 1)[0] == [None]
+    assert storage.missing_next(0, rare)
+    assert not storage.missing_next(0, tokens[1])
+
+
+def test_store_rewinds_positions_after_n_past():
+    logits = _logits(6)
+    storage = _filled("full", list(range(6)), logits)
+    replacement = _logits(1, seed=2)
+    storage.store(3, [9], replacement)
+    assert storage.n_tokens == 4
+    np.testing.assert_array_equal(storage.rows[3], replacement[0])
+
+
+@pytest.mark.parametrize("mode", ["full", "last", "ring", "topk"])
+def test_save_and_load_round_trip(mode):
+    tokens = [3, 7, 1, 9, 4, 2]
+    logits = _logits(len(tokens))
+    storage = _filled(mode, tokens, logits, n_live=3, top_k=5)
+    state = storage.save(len(tokens))
+    assert state.nbytes <= storage.nbytes
+
+    restored = LlamaLogits(64, N_VOCAB, mode=mode, n_live=3, top_k=5)
+    restored.load(state)
+    assert restored.n_tokens == len(tokens)
+    np.testing.assert_array_equal(restored.row(5), logits[5])
+    if restored.has_logprobs:
+        assert restored.logprobs(0, tokens[1:], 3) == storage.logprobs(0, tokens[1:], 3)
+
+
+def test_load_rejects_other_mode():
+    state = _filled("full", [1], _logits(1)).save(1)
+    with pytest.raises(ValueError, match="logits_storage"):
+        LlamaLogits(64, N_VOCAB, mode="topk").load(state)
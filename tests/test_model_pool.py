@@ -0,0 +1,65 @@
+from nexa.gguf.server.model_pool import ModelPool, ModelSpec, ResidentModel
+
+
+class FakeModel:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def make_entry(name="model"):
+    return ResidentModel(
+        name=name, model_type="NLP", model=FakeModel(), spec=ModelSpec(model_path=name)
+    )
+
+
+def test_evict_idle_model_closes_it():
+    pool = ModelPool()
+    entry = pool.add(make_entry())
+    model = entry.model
+    pool.release(entry)
+    assert pool.evict("model")
+    assert model.closed
+    assert "model" not in pool
+
+
+def test_evict_held_model_closes_on_last_release():
+    pool = ModelPool()
+    entry = pool.add(make_entry())
+    model = entry.model
+    pool.retain(entry)  # e.g. a streaming response holding the model
+    assert pool.evict("model")
+    assert "model" not in pool
+    assert entry.retired and not model.closed
+    pool.release(entry)
+    assert not model.closed
+    pool.release(entry)
+    assert model.closed
+
+
+def test_replacing_held_model_keeps_it_open():
+    pool = ModelPool()
+    old = pool.add(make_entry())
+    old_model = old.model
+    new = pool.add(make_entry())
+    assert pool.acquire("model") is new
+    assert not old_model.closed
+    pool.release(old)
+    assert old_model.closed
+    assert not new.model.closed
+
+
+def test_make_room_skips_models_in_use():
+    pool = ModelPool(max_memory_bytes=100)
+    busy = make_entry("busy")
+    busy.size_bytes = 60
+    idle = make_entry("idle")
+    idle.size_bytes = 30
+    pool.add(busy)
+    pool.release(pool.add(idle))
+    idle_model = idle.model
+    pool.make_room(50)
+    assert "busy" in pool and "idle" not in pool
+    assert idle_model.closed and not busy.model.closed
@@ -0,0 +1,69 @@
+import json
+import threading
+
+import pytest
+
+from nexa.model_registry import ModelRegistry, _location_keys
+
+
+def test_location_keys_cover_name_tag_lookups():
+    keys = _location_keys("/home/u/.cache/nexa/hub/official/gemma-2b/q4_0.gguf")
+    assert "gemma-2b/q4_0.gguf" in keys
+    assert "gemma-2b/q4_0" in keys
+    assert "official/gemma-2b/q4_0" in keys
+    assert _location_keys("C:\\models\\llama\\q8_0.gguf")[:2] == ["llama/q8_0.gguf", "llama/q8_0"]
+
+
+def test_find_by_name_and_by_location(tmp_path):
+    registry = ModelRegistry(tmp_path / "model_list.json")
+    registry.add("gemma-2b:q4_0", {"location": "/hub/official/gemma-2b/q4_0.gguf"})
+    registry.add("my-model", {"location": "/hub/user/repo/fp16/model.gguf"})
+
+    assert registry.find("gemma-2b:q4_0") == "gemma-2b:q4_0"
+    assert registry.find("official/gemma-2b:q4_0") == "gemma-2b:q4_0"
+    assert registry.find("repo/fp16:model") == "my-model"
+    # Not a whole path component suffix, found by substring
+    assert registry.find("po/fp16:mod") == "my-model"
+    assert registry.find("missing") is None
+    assert registry.find("missing:tag") is None
+    assert registry.get("my-model") == {"location": "/hub/user/repo/fp16/model.gguf"}
+
+
+def test_changes_by_other_processes_are_picked_up(tmp_path):
+    path = tmp_path / "model_list.json"
+    registry = ModelRegistry(path)
+    assert registry.models() == {}
+    assert not registry.exists()
+
+    path.write_text(json.dumps({"a": {"location": "/x/a.gguf"}}))
+    assert list(registry.models()) == ["a"]
+
+    ModelRegistry(path).remove("a")
+    assert registry.models() == {}
+
+
+def test_failed_edit_does_not_write(tmp_path):
+    registry = ModelRegistry(tmp_path / "model_list.json")
+    registry.add("a", {"location": "/x/a.gguf"})
+    with pytest.raises(RuntimeError):
+        with registry.edit() as models:
+            models["b"] = {"location": "/x/b.gguf"}
+            raise RuntimeError("interrupted")
+    assert list(ModelRegistry(registry.path).models()) == ["a"]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_concurrent_adds_are_not_lost(tmp_path):
+    path = tmp_path / "model_list.json"
+
+    def add(i):
+        # One registry per writer, like separate CLI and server processes
+        ModelRegistry(path).add(f"model-{i}", {"location": f"/x/{i}.gguf"})
+
+    threads = [threading.Thread(target=add, args=(i,)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(json.loads(path.read_text())) == 16
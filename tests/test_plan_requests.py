@@ -0,0 +1,45 @@
+import random
+
+from nexa.eval.evaluator_utils import plan_requests
+from nexa.eval.nexa_task.instance import Instance
+
+
+def _request(request_type, prompt, idx):
+    return Instance(request_type=request_type, doc={}, arguments=(prompt, f" c{idx}"), idx=idx)
+
+
+def _requests():
+    prompts = [f"few-shot prefix {i % 7}" for i in range(40)]
+    reqs = [_request("loglikelihood", p, i) for i, p in enumerate(prompts)]
+    reqs += [_request("generate_until", p, 40 + i) for i, p in enumerate(prompts[:10])]
+    return list(enumerate(reqs))
+
+
+def test_results_map_back_to_original_order():
+    indexed = _requests()
+    shuffled = indexed[:]
+    random.Random(0).shuffle(shuffled)
+
+    chunks = plan_requests(shuffled, chunk_size=4)
+    # Run the chunks like the evaluator does and collect responses by index
+    resps_by_idx = {}
+    for reqtype, chunk in chunks:
+        assert all(req.request_type == reqtype for _, req in chunk)
+        for idx, req in chunk:
+            assert idx not in resps_by_idx
+            resps_by_idx[idx] = (req.request_type, req.args)
+    assert [resps_by_idx[idx] for idx, _ in indexed] == [
+        (req.request_type, req.args) for _, req in indexed
+    ]
+
+
+def test_requests_sharing_a_prompt_stay_in_one_chunk():
+    chunks = plan_requests(_requests(), chunk_size=3)
+    seen = {}
+    for n, (reqtype, chunk) in enumerate(chunks):
+        prompts = [req.args[0] for _, req in chunk]
+        # Prompts are sorted so that shared prefixes run back to back
+        assert prompts == sorted(prompts)
+        for prompt in prompts:
+            assert seen.setdefault((reqtype, prompt), n) == n
+    assert len(chunks) > 2
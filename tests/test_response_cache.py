@@ -0,0 +1,63 @@
+import hashlib
+import os
+
+from nexa.eval.response_cache import ResponseCache, file_sha256
+
+
+def test_file_sha256_of_file_and_directory(tmp_path):
+    (tmp_path / "b.bin").write_bytes(b"world")
+    (tmp_path / "a.bin").write_bytes(b"hello ")
+    assert file_sha256(tmp_path / "a.bin") == hashlib.sha256(b"hello ").hexdigest()
+    # Directories hash their files in path order
+    assert file_sha256(tmp_path) == hashlib.sha256(b"hello world").hexdigest()
+
+
+def test_responses_survive_reopening(tmp_path):
+    db = tmp_path / "cache" / "responses.sqlite"
+    key = ResponseCache.make_key("abc", "loglikelihood", ("ctx", "cont"), {})
+    cache = ResponseCache(db)
+    assert cache.get(key) is None
+    cache.put_many([(key, (-1.5, True)), ("failed", None)])
+    cache.close()
+
+    cache = ResponseCache(db)
+    # loglikelihood responses come back as tuples
+    assert cache.get(key) == (-1.5, True)
+    assert cache.get("failed") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+    cache.close()
+
+
+def test_make_key_depends_on_every_part():
+    base = ResponseCache.make_key("abc", "generate_until", ("q",), {"temperature": 0})
+    assert base == ResponseCache.make_key("abc", "generate_until", ("q",), {"temperature": 0})
+    assert base != ResponseCache.make_key("abd", "generate_until", ("q",), {"temperature": 0})
+    assert base != ResponseCache.make_key("abc", "loglikelihood", ("q",), {"temperature": 0})
+    assert base != ResponseCache.make_key("abc", "generate_until", ("r",), {"temperature": 0})
+    assert base != ResponseCache.make_key("abc", "generate_until", ("q",), {"temperature": 1})
+
+
+def test_model_hash_is_cached_until_the_file_changes(tmp_path, monkeypatch):
+    model = tmp_path / "model.gguf"
+    model.write_bytes(b"weights v1")
+    cache = ResponseCache(tmp_path / "responses.sqlite")
+
+    calls = []
+    import nexa.eval.response_cache as response_cache
+
+    real_sha256 = response_cache.file_sha256
+    monkeypatch.setattr(
+        response_cache, "file_sha256", lambda path: calls.append(path) or real_sha256(path)
+    )
+    first = cache.model_hash(model)
+    assert cache.model_hash(model) == first
+    assert len(calls) == 1
+
+    model.write_bytes(b"weights version 2")
+    stat = model.stat()
+    os.utime(model, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert cache.model_hash(model) == hashlib.sha256(b"weights version 2").hexdigest()
+    assert len(calls) == 2
+    cache.close()
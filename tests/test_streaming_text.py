@@ -0,0 +1,128 @@
+import random
+from types import SimpleNamespace
+
+from nexa.gguf.llama.llama import StopSequenceMatcher
+from nexa.gguf.llama.llama_tokenizer import (
+    BaseLlamaTokenizer,
+    IncrementalDetokenizer,
+    LlamaTokenizer,
+    incomplete_utf8_suffix,
+)
+
+
+def _first_stop(text, stops):
+    found = [text.find(s) for s in stops if s and text.find(s) >= 0]
+    return min(found) if found else -1
+
+
+def test_stop_sequence_found_across_pieces():
+    matcher = StopSequenceMatcher([b"</s>", b"\n\n"])
+    assert matcher.feed(b"Hello </") == -1
+    assert matcher.partial == 2
+    assert matcher.feed(b"s> world") == 6
+
+
+def test_earliest_overlapping_stop_wins():
+    matcher = StopSequenceMatcher([b"bcd", b"abcdef"])
+    # Only a completed stop counts, not a longer one still in progress
+    assert matcher.feed(b"xabcd") == 2
+    assert matcher.partial == 4
+
+
+def test_partial_is_reset_by_a_mismatch():
+    matcher = StopSequenceMatcher([b"STOP"])
+    matcher.feed(b"ST")
+    assert matcher.partial == 2
+    matcher.feed(b"x")
+    assert matcher.partial == 0
+
+
+def test_stop_matcher_matches_str_find_on_random_text():
+    rnd = random.Random(0)
+    for _ in range(300):
+        stops = [bytes(rnd.choices(b"abc", k=rnd.randint(1, 4))) for _ in range(3)]
+        text = bytes(rnd.choices(b"abcd", k=rnd.randint(0, 30)))
+        matcher = StopSequenceMatcher(stops)
+        found = -1
+        pos = 0
+        while pos < len(text) and found < 0:
+            step = rnd.randint(1, 5)
+            found = matcher.feed(text[pos : pos + step])
+            pos += step
+        assert found == _first_stop(text[:pos], stops)
+
+
+def test_incomplete_utf8_suffix():
+    euro = "€".encode("utf-8")
+    assert incomplete_utf8_suffix(b"abc") == 0
+    assert incomplete_utf8_suffix(b"a" + euro) == 0
+    assert incomplete_utf8_suffix(b"a" + euro[:1]) == 1
+    assert incomplete_utf8_suffix(b"a" + euro[:2]) == 2
+    assert incomplete_utf8_suffix(b"") == 0
+
+
+class FakeModel:
+    """Context-free pieces with a BOS token, like `_LlamaModel`."""
+
+    pieces = {0: b"", 1: b" Hello", 2: b",", 3: b" w", 4: b"orld", 5: "€".encode("utf-8")}
+
+    def token_bos(self):
+        return 0
+
+    def detokenize(self, tokens, special=False):
+        output = b"".join(self.pieces[t] for t in tokens)
+        if tokens and tokens[0] == 0 and output[:1] == b" ":
+            output = output[1:]
+        return output
+
+
+class ContextTokenizer(BaseLlamaTokenizer):
+    """A tokenizer whose pieces depend on the previous token."""
+
+    def tokenize(self, text, add_bos=True, special=True):
+        raise NotImplementedError
+
+    def detokenize(self, tokens, prev_tokens=None, special=False):
+        prev = (prev_tokens or [None])[-1]
+        return b"".join(b"-%d" % t if prev is not None else b"%d" % t for t in tokens)
+
+
+def test_incremental_detokenizer_matches_full_detokenize():
+    model = FakeModel()
+    tokenizer = LlamaTokenizer(SimpleNamespace(_model=model))
+    tokens = [0, 1, 2, 3, 4, 5]
+    detok = IncrementalDetokenizer(tokenizer)
+    for token in tokens:
+        detok.push(token)
+
+    assert bytes(detok.text) == model.detokenize(tokens)
+    assert len(detok) == len(tokens)
+    assert detok.offsets == [0, 0, 5, 6, 8, 12, 15]
+    assert detok.char_offsets == [0, 0, 5, 6, 8, 12, 13]
+    assert detok.incomplete_bytes == 0
+
+
+def test_incremental_detokenizer_reports_incomplete_character():
+    model = FakeModel()
+    model.pieces = dict(model.pieces)
+    euro = "€".encode("utf-8")
+    model.pieces[6] = euro[:2]
+    model.pieces[7] = euro[2:]
+    detok = IncrementalDetokenizer(LlamaTokenizer(SimpleNamespace(_model=model)))
+    detok.push(1)
+    detok.push(6)
+    assert detok.incomplete_bytes == 2
+    detok.push(7)
+    assert detok.incomplete_bytes == 0
+    assert detok.text.decode("utf-8") == " Hello€"
+
+
+def test_incremental_detokenizer_passes_context_to_other_tokenizers():
+    detok = IncrementalDetokenizer(ContextTokenizer(), prev_tokens=[9])
+    assert detok.push(1) == b"-1"
+    assert detok.push(2) == b"-2"
+    assert bytes(detok.text) == b"-1-2"
+
+    fresh = IncrementalDetokenizer(ContextTokenizer())
+    assert fresh.push(1) == b"1"
+    assert fresh.push(2) == b"-2"
@@ -0,0 +1,123 @@
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import nexa.gguf.whisper_batch_scheduler as scheduler_module
+from nexa.gguf.whisper_batch_scheduler import (
+    SAMPLING_RATE,
+    TranscriptionRequest,
+    WhisperBatchScheduler,
+    split_on_speech,
+)
+
+SR = SAMPLING_RATE
+
+
+def _fake_vad(chunks):
+    return lambda audio, options: [{"start": s * SR, "end": e * SR} for s, e in chunks]
+
+
+def test_split_merges_speech_into_windows_of_at_most_30s(monkeypatch):
+    monkeypatch.setattr(
+        scheduler_module, "get_speech_timestamps", _fake_vad([(0, 5), (6, 20), (25, 40), (41, 50)])
+    )
+    assert split_on_speech(np.zeros(50 * SR, dtype=np.float32)) == [
+        (0, 20 * SR),
+        (25 * SR, 50 * SR),
+    ]
+
+
+def test_split_clips_long_speech(monkeypatch):
+    monkeypatch.setattr(scheduler_module, "get_speech_timestamps", _fake_vad([(0, 45)]))
+    assert split_on_speech(np.zeros(45 * SR, dtype=np.float32)) == [(0, 30 * SR)]
+
+
+def test_split_silence_has_no_windows():
+    assert split_on_speech(np.zeros(2 * SR, dtype=np.float32)) == []
+
+
+class FakePipeline:
+    """One segment per clip, from 0.5 s into the clip to its end."""
+
+    def __init__(self, model=None):
+        self.calls = []
+
+    def transcribe(self, audio, clip_timestamps, **kwargs):
+        self.calls.append(clip_timestamps)
+        segments = [
+            SimpleNamespace(start=c["start"] / SR + 0.5, end=c["end"] / SR, text=f" clip{i}")
+            for i, c in enumerate(clip_timestamps)
+        ]
+        return iter(segments), None
+
+
+class FakeModel:
+    def detect_language(self, audio):
+        return "en", 1.0, []
+
+    def transcribe(self, audio, **kwargs):
+        segment = SimpleNamespace(start=0.5, end=len(audio) / SR, text=" direct")
+        return [segment], None
+
+
+def _request(windows, n_sec=60):
+    return TranscriptionRequest(
+        audio=np.zeros(n_sec * SR, dtype=np.float32),
+        options=("transcribe", "en", 5, 0.0),
+        windows=windows,
+        future=Future(),
+    )
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = WhisperBatchScheduler(FakeModel(), batch_size=4, max_wait=0)
+    yield scheduler
+    scheduler.close()
+
+
+def test_segments_are_demuxed_back_to_each_request(scheduler):
+    scheduler.pipeline = FakePipeline()
+    first = _request([(0, 10 * SR), (20 * SR, 45 * SR)])
+    second = _request([(5 * SR, 8 * SR)])
+    batch = [(first, 0), (second, 0), (first, 1)]
+    scheduler._transcribe(batch)
+
+    assert first.segments == [(0.5, 10.0, " clip0"), (20.5, 45.0, " clip2")]
+    assert second.segments == [(5.5, 8.0, " clip1")]
+    # Every window got its own slot in the shared buffer
+    slots = [c["start"] // scheduler_module.SLOT_SAMPLES for c in scheduler.pipeline.calls[0]]
+    assert slots == [0, 1, 2]
+
+
+def test_submit_resolves_with_own_timeline(monkeypatch, scheduler):
+    scheduler.pipeline = FakePipeline()
+    monkeypatch.setattr(scheduler_module, "get_speech_timestamps", _fake_vad([(2, 12), (40, 50)]))
+    future = scheduler.submit(np.zeros(50 * SR, dtype=np.float32))
+    # Both windows are queued at once and decoded in one batch
+    assert future.result(timeout=10) == [(2.5, 12.0, " clip0"), (40.5, 50.0, " clip1")]
+
+
+def test_submit_without_speech_resolves_empty(monkeypatch, scheduler):
+    monkeypatch.setattr(scheduler_module, "get_speech_timestamps", _fake_vad([]))
+    assert scheduler.submit(np.zeros(SR, dtype=np.float32)).result(timeout=1) == []
+
+
+def test_without_batched_pipeline_windows_are_decoded_one_by_one(scheduler):
+    scheduler.pipeline = None
+    request = _request([(0, 10 * SR), (20 * SR, 30 * SR)])
+    scheduler._transcribe([(request, 0), (request, 1)])
+    assert request.segments == [(0.5, 10.0, " direct"), (20.5, 30.0, " direct")]
+
+
+def test_take_batch_groups_by_options(scheduler):
+    english = _request([(0, SR), (SR, 2 * SR)])
+    french = _request([(0, SR)])
+    french.options = ("transcribe", "fr", 5, 0.0)
+    later = _request([(0, SR)])
+    scheduler._pending.extend([english, french, later])
+    batch = scheduler._take_batch()
+    assert batch == [(english, 0), (english, 1), (later, 0)]
+    scheduler._pending.clear()
@@ -0,0 +1,161 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from nexa.gguf.whisper_streaming import (
+    SAMPLING_RATE,
+    AudioRingBuffer,
+    HypothesisBuffer,
+    StreamASRProcessor,
+)
+
+
+class FakeASR:
+    """Returns a fixed list of (start, end, text) words, relative to the buffer."""
+
+    def __init__(self, words=None):
+        self.words = words or (lambda n_samples: [])
+        self.lengths = []
+
+    def transcribe(self, audio, **kwargs):
+        self.lengths.append(len(audio))
+        words = [
+            SimpleNamespace(start=start, end=end, word=text)
+            for start, end, text in self.words(len(audio))
+        ]
+        if not words:
+            return [], None
+        segment = SimpleNamespace(
+            start=words[0].start, end=words[-1].end, words=words, no_speech_prob=0.0
+        )
+        return [segment], None
+
+
+def _stream(processor, seconds, chunk_sec=1.0):
+    chunk = np.zeros(int(chunk_sec * SAMPLING_RATE), dtype=np.float32)
+    results = []
+    for _ in range(int(seconds / chunk_sec)):
+        processor.insert_audio_chunk(chunk)
+        results.append(processor.process_iter())
+    return results
+
+
+def test_silence_keeps_buffer_bounded():
+    asr = FakeASR()
+    processor = StreamASRProcessor(asr, buffer_trimming_sec=5, max_buffer_sec=10)
+    results = _stream(processor, 60)
+
+    assert all(r == (None, None, "") for r in results)
+    assert max(asr.lengths) <= 11 * SAMPLING_RATE
+    assert len(processor.audio) <= 10 * SAMPLING_RATE
+    assert processor.buffer_time_offset > 0
+
+
+def test_disagreeing_hypotheses_keep_buffer_bounded():
+    calls = iter(range(10**6))
+    # Every transcription disagrees with the previous one, so nothing commits
+    asr = FakeASR(lambda n: [(0.5, 1.0, f" word{next(calls)}")])
+    processor = StreamASRProcessor(asr, buffer_trimming_sec=5, max_buffer_sec=10)
+    _stream(processor, 60)
+
+    assert not processor.committed
+    assert max(asr.lengths) <= 11 * SAMPLING_RATE
+
+
+def test_uncommitted_trim_keeps_unstable_hypothesis():
+    processor = StreamASRProcessor(FakeASR(), buffer_trimming_sec=5, max_buffer_sec=10)
+    processor.insert_audio_chunk(np.zeros(12 * SAMPLING_RATE, dtype=np.float32))
+    processor.transcript.buffer = [(3.0, 3.5, " maybe")]
+    processor._trim_uncommitted()
+
+    # The hypothesis starts before the last 5 seconds, keep it in the buffer
+    assert processor.buffer_time_offset == 3.0
+    assert len(processor.audio) == 9 * SAMPLING_RATE
+    assert processor.transcript.buffer == [(3.0, 3.5, " maybe")]
+
+
+def test_agreeing_hypotheses_commit_words():
+    asr = FakeASR(lambda n: [(0.0, 0.5, " hello"), (0.6, 1.0, " world")])
+    processor = StreamASRProcessor(asr)
+    first, second = _stream(processor, 2)
+
+    assert first == (None, None, "")
+    assert second == (0.0, 1.0, " hello world")
+    assert processor.finish() == (None, None, "")
+
+
+def test_hypothesis_buffer_commits_common_prefix():
+    buf = HypothesisBuffer()
+    buf.insert([(0.0, 0.5, " a"), (0.5, 1.0, " b")], offset=0.0)
+    assert buf.flush() == []
+    buf.insert([(0.0, 0.5, " a"), (0.5, 1.0, " c")], offset=0.0)
+    assert buf.flush() == [(0.0, 0.5, " a")]
+    assert buf.complete() == [(0.5, 1.0, " c")]
+    assert buf.last_committed_time == 0.5
+
+
+def test_hypothesis_buffer_drops_repeated_committed_words():
+    buf = HypothesisBuffer()
+    buf.committed_in_buffer = [(0.0, 0.5, " a"), (0.5, 1.0, " b")]
+    buf.last_committed_time = 1.0
+    buf.insert([(0.95, 1.2, " b"), (1.2, 1.5, " c")], offset=0.0)
+    assert buf.new == [(1.2, 1.5, " c")]
+
+    buf.pop_committed(0.5)
+    assert buf.committed_in_buffer == [(0.5, 1.0, " b")]
+
+
+def test_audio_ring_buffer_append_consume_and_grow():
+    ring = AudioRingBuffer(8)
+    ring.append(np.arange(6, dtype=np.float32))
+    ring.consume(4)
+    assert ring.view().tolist() == [4, 5]
+
+    # Fits after moving the live samples to the front
+    ring.append(np.arange(6, 12, dtype=np.float32))
+    assert ring.view().tolist() == [4, 5, 6, 7, 8, 9, 10, 11]
+    assert len(ring.data) == 8
+
+    # Does not fit at all, grows
+    ring.append(np.array([12, 13], dtype=np.float32))
+    assert ring.view().tolist() == list(range(4, 14))
+    assert len(ring.data) >= 10
+
+    ring.consume(100)
+    assert len(ring) == 0
+    ring.clear()
+    assert ring.start == ring.end == 0
+
+
+def test_voice_stream_final_event_has_full_transcript(monkeypatch):
+    import sys
+    import time
+
+    from nexa.gguf.nexa_inference_voice import NexaVoiceInference
+
+    # A new word every two seconds; each is committed once seen twice
+    asr = FakeASR(
+        lambda n: [(float(i), i + 0.5, f" w{i}") for i in range(0, int(n / SAMPLING_RATE) - 1, 2)]
+    )
+    voice = NexaVoiceInference.__new__(NexaVoiceInference)
+    voice.model = asr
+    voice.params = {"task": "transcribe", "language": None, "beam_size": 5}
+    voice.streamer = None
+    audio = np.zeros(8 * SAMPLING_RATE, dtype=np.float32)
+    monkeypatch.setitem(
+        sys.modules, "librosa", SimpleNamespace(load=lambda *a, **k: (audio, SAMPLING_RATE))
+    )
+    clock = iter(range(10**6))
+    monkeypatch.setattr(time, "time", lambda: float(next(clock)))
+    monkeypatch.setattr(time, "sleep", lambda s: None)
+
+    events = list(voice.stream_transcription("speech.wav"))
+    partial = [e for e in events if not e.get("final")]
+    final = events[-1]
+
+    assert final["final"] is True
+    assert sum(e.get("final", False) for e in events) == 1
+    assert final["text"] == "".join(e["text"] for e in partial).strip()
+    assert final["segment_start_ms"] == partial[0]["segment_start_ms"]
+    assert final["segment_end_ms"] == partial[-1]["segment_end_ms"]
+    assert len(partial) > 1